@@ -8,7 +8,8 @@ Features: language detection, deduplication, red-flag identification, probing qu
 """
 import random
 import logging
-from typing import List, Optional
+from typing import List, Optional, Union
+from message_analysis import MessageAnalysis, analyze, register_terms
 from response_dataset import RESPONSE_DB
 from hinglish_dataset import HINGLISH_DB
 
@@ -32,15 +33,15 @@ HINGLISH_WORDS = {
 }
 
 
-def _detect_language(text: str) -> str:
+def _detect_language(text: Union[str, MessageAnalysis]) -> str:
     """Detect if message is English or Hinglish based on content."""
+    analysis = analyze(text)
     # Check for Devanagari script
-    if any(c in HINDI_MARKERS for c in text):
+    if not analysis.chars.isdisjoint(HINDI_MARKERS):
         return "hinglish"
 
     # Check for common Hinglish words
-    words = set(text.lower().split())
-    hinglish_count = len(words & HINGLISH_WORDS)
+    hinglish_count = len(analysis.token_set & HINGLISH_WORDS)
     if hinglish_count >= 2:
         return "hinglish"
 
@@ -90,94 +91,75 @@ SCAM_TYPE_TO_CATEGORY = {
 # Keyword-based category detection (supplements scam_type for precision)
 # ─────────────────────────────────────────────────────────────────────────
 
-def _detect_category(text: str) -> str:
-    """Detect the best response category from message content."""
-    t = text.lower()
-
+# (category, terms) in priority order — each list is one term group in the
+# shared MessageAnalysis scan, so checking all of them costs no extra pass
+_CATEGORY_RULES = [
     # OTP/PIN/CVV — highest priority (most dangerous)
-    if any(w in t for w in ["otp", "pin", "cvv", "password", "code", "one time", "verification code"]):
-        return "otp_fraud"
-
-    # Threats and legal pressure
-    if any(w in t for w in ["arrest", "police", "legal", "court", "jail", "fine", "penalty",
-                             "case filed", "fir", "warrant", "summon"]):
-        return "tax_scam"  # threats usually come from fake govt/police
-
+    ("otp_fraud", ["otp", "pin", "cvv", "password", "code", "one time", "verification code"]),
+    # Threats and legal pressure — usually come from fake govt/police
+    ("tax_scam", ["arrest", "police", "legal", "court", "jail", "fine", "penalty",
+                  "case filed", "fir", "warrant", "summon"]),
     # Investment / crypto
-    if any(w in t for w in ["invest", "bitcoin", "crypto", "trading", "returns", "profit",
-                             "guaranteed", "mutual fund", "stock", "forex", "doubl"]):
-        return "investment_scam"
-
+    ("investment_scam", ["invest", "bitcoin", "crypto", "trading", "returns", "profit",
+                         "guaranteed", "mutual fund", "stock", "forex", "doubl"]),
     # Lottery / prize / reward
-    if any(w in t for w in ["won", "winner", "prize", "lottery", "reward", "congratulat",
-                             "selected", "lucky", "cashback", "gift"]):
-        return "lottery_scam"
-
+    ("lottery_scam", ["won", "winner", "prize", "lottery", "reward", "congratulat",
+                      "selected", "lucky", "cashback", "gift"]),
     # Job / work-from-home
-    if any(w in t for w in ["job", "work from home", "part time", "earn", "hiring",
-                             "vacancy", "resume", "salary", "registration fee"]):
-        return "job_scam"
-
+    ("job_scam", ["job", "work from home", "part time", "earn", "hiring",
+                  "vacancy", "resume", "salary", "registration fee"]),
     # Insurance / policy
-    if any(w in t for w in ["insurance", "policy", "lic", "premium", "maturity",
-                             "claim", "nominee", "endowment", "irda"]):
-        return "insurance_scam"
-
-    # Delivery / courier / customs
-    if any(w in t for w in ["deliver", "courier", "package", "parcel", "customs",
-                             "shipment", "tracking", "dispatch", "consignment",
-                             "seized", "narcotics", "drugs", "ndps"]):
-        return "customs_scam" if any(w in t for w in ["customs", "seized", "narcotics", "ndps"]) else "delivery_scam"
-
+    ("insurance_scam", ["insurance", "policy", "lic", "premium", "maturity",
+                        "claim", "nominee", "endowment", "irda"]),
+    # Delivery / courier / customs (customs_scam if a seizure is mentioned)
+    ("delivery_scam", ["deliver", "courier", "package", "parcel", "customs",
+                       "shipment", "tracking", "dispatch", "consignment",
+                       "seized", "narcotics", "drugs", "ndps"]),
     # Tech support / remote access
-    if any(w in t for w in ["virus", "hack", "malware", "computer", "laptop",
-                             "microsoft", "remote", "teamviewer", "anydesk"]):
-        return "tech_support"
-
+    ("tech_support", ["virus", "hack", "malware", "computer", "laptop",
+                      "microsoft", "remote", "teamviewer", "anydesk"]),
     # Electricity / utility
-    if any(w in t for w in ["electricity", "power", "bijli", "discom", "meter",
-                             "bill overdue", "disconnection", "power cut"]):
-        return "electricity_scam"
-
+    ("electricity_scam", ["electricity", "power", "bijli", "discom", "meter",
+                          "bill overdue", "disconnection", "power cut"]),
     # Government scheme
-    if any(w in t for w in ["government scheme", "pm scheme", "subsidy", "housing scheme",
-                             "pradhan mantri", "ministry", "ration", "aadhar"]):
-        return "govt_scam"
-
+    ("govt_scam", ["government scheme", "pm scheme", "subsidy", "housing scheme",
+                   "pradhan mantri", "ministry", "ration", "aadhar"]),
     # Refund
-    if any(w in t for w in ["refund", "reprocess", "failed transaction", "compensation"]):
-        return "refund_scam"
-
+    ("refund_scam", ["refund", "reprocess", "failed transaction", "compensation"]),
     # Loan / credit
-    if any(w in t for w in ["loan", "credit card", "emi", "cibil", "pre-approved",
-                             "disburse", "sanction", "processing fee"]):
-        return "loan_scam"
-
+    ("loan_scam", ["loan", "credit card", "emi", "cibil", "pre-approved",
+                   "disburse", "sanction", "processing fee"]),
     # Romance / relationship
-    if any(w in t for w in ["dear", "beloved", "love", "marry", "relationship",
-                             "lonely", "heart", "dating", "soul"]):
-        return "romance_scam"
-
+    ("romance_scam", ["dear", "beloved", "love", "marry", "relationship",
+                      "lonely", "heart", "dating", "soul"]),
     # Payment / money transfer
-    if any(w in t for w in ["pay", "send money", "transfer", "amount", "rupee",
-                             "rs ", "rs.", "fee", "charge", "upi", "cashback"]):
-        return "payment_request"
-
+    ("payment_request", ["pay", "send money", "transfer", "amount", "rupee",
+                         "rs ", "rs.", "fee", "charge", "upi", "cashback"]),
     # KYC / verification
-    if any(w in t for w in ["kyc", "verify", "update", "document", "aadhaar",
-                             "pan", "aadhar", "identity"]):
-        return "kyc_fraud"
-
+    ("kyc_fraud", ["kyc", "verify", "update", "document", "aadhaar",
+                   "pan", "aadhar", "identity"]),
     # Phishing links
-    if any(w in t for w in ["click", "link", "url", "website", "download",
-                             "http", "www", "log in", "login"]):
-        return "phishing"
-
+    ("phishing", ["click", "link", "url", "website", "download",
+                  "http", "www", "log in", "login"]),
     # Account block / urgency
-    if any(w in t for w in ["block", "suspend", "urgent", "immediately",
-                             "deactivat", "frozen", "expire", "terminat"]):
-        return "account_threat"
+    ("account_threat", ["block", "suspend", "urgent", "immediately",
+                        "deactivat", "frozen", "expire", "terminat"]),
+]
+_CATEGORY_GROUPS = [
+    (category, register_terms(f"persona.category.{category}", terms))
+    for category, terms in _CATEGORY_RULES
+]
+_CUSTOMS_GROUP = register_terms("persona.category.customs", ["customs", "seized", "narcotics", "ndps"])
 
+
+def _detect_category(text: Union[str, MessageAnalysis]) -> str:
+    """Detect the best response category from message content."""
+    analysis = analyze(text)
+    for category, group in _CATEGORY_GROUPS:
+        if analysis.has(group):
+            if category == "delivery_scam" and analysis.has(_CUSTOMS_GROUP):
+                return "customs_scam"
+            return category
     return "general"
 
 
@@ -195,43 +177,55 @@ def _get_phase(turn_count: int) -> str:
 # Red-flag detection & probing question generation
 # ─────────────────────────────────────────────────────────────────────────
 
-def _detect_red_flag(text: str) -> str:
+# (terms, red flag) in priority order — term groups in the shared MessageAnalysis scan
+_RED_FLAG_RULES = [
+    (["otp", "pin", "cvv", "password"],
+     "Requesting sensitive credentials (OTP/PIN/CVV) — legitimate banks never ask for these"),
+    (["account number", "card number", "16-digit", "debit card", "credit card"],
+     "Requesting account/card number — legitimate banks already have this on file"),
+    (["blocked", "suspended", "deactivated", "frozen"],
+     "Account threat/pressure tactic — creating urgency to bypass rational thinking"),
+    (["urgent", "immediately", "right now", "right away", "within 2 hours", "last chance"],
+     "Artificial time pressure — scammers create urgency to prevent verification"),
+    (["arrest", "police", "legal", "fir", "warrant", "court order"],
+     "Legal intimidation — fake authority threats to coerce compliance"),
+    (["won", "winner", "prize", "lottery", "reward"],
+     "Unsolicited prize — classic advance-fee fraud pattern"),
+    (["invest", "guaranteed", "returns", "profit", "doubl"],
+     "Guaranteed returns promise — no legitimate investment guarantees profits"),
+    (["http", "www", "click", "link"],
+     "Suspicious URL shared — potential phishing link to steal credentials"),
+    (["kyc", "update your", "verify your", "verification required"],
+     "KYC/verification request via phone/message — banks do KYC in-branch only"),
+    (["transfer", "send money", "pay", "fee", "charge", "penalty"],
+     "Requesting money transfer — legitimate services don't ask for upfront payments this way"),
+    (["whatsapp", "telegram", "personal number"],
+     "Moving to personal messaging — attempting to evade official communication channels"),
+    (["reply", "confirm", "submit", "provide", "share your"],
+     "Requesting personal information via unsecured channel — potential social engineering"),
+    (["refund", "cashback", "compensation"],
+     "Refund bait — creating false hope to extract banking credentials"),
+    (["final", "warning", "terminat", "cancel"],
+     "Escalation threat — increasing pressure to force immediate compliance"),
+    (["customs", "seized", "parcel"],
+     "Customs seizure threat — fake authority claim to extort payment"),
+    (["electricity", "power cut", "disconnection"],
+     "Utility disconnection threat — creating urgency around essential services"),
+    (["job", "hiring", "work from home"],
+     "Fake job offer — employment bait requiring upfront registration fees"),
+]
+_RED_FLAG_GROUPS = [
+    (register_terms(f"persona.red_flag.{i}", terms), red_flag)
+    for i, (terms, red_flag) in enumerate(_RED_FLAG_RULES)
+]
+
+
+def _detect_red_flag(text: Union[str, MessageAnalysis]) -> str:
     """Identify the most relevant red flag in the scammer's message."""
-    t = text.lower()
-    if any(w in t for w in ["otp", "pin", "cvv", "password"]):
-        return "Requesting sensitive credentials (OTP/PIN/CVV) — legitimate banks never ask for these"
-    if any(w in t for w in ["account number", "card number", "16-digit", "debit card", "credit card"]):
-        return "Requesting account/card number — legitimate banks already have this on file"
-    if any(w in t for w in ["blocked", "suspended", "deactivated", "frozen"]):
-        return "Account threat/pressure tactic — creating urgency to bypass rational thinking"
-    if any(w in t for w in ["urgent", "immediately", "right now", "right away", "within 2 hours", "last chance"]):
-        return "Artificial time pressure — scammers create urgency to prevent verification"
-    if any(w in t for w in ["arrest", "police", "legal", "fir", "warrant", "court order"]):
-        return "Legal intimidation — fake authority threats to coerce compliance"
-    if any(w in t for w in ["won", "winner", "prize", "lottery", "reward"]):
-        return "Unsolicited prize — classic advance-fee fraud pattern"
-    if any(w in t for w in ["invest", "guaranteed", "returns", "profit", "doubl"]):
-        return "Guaranteed returns promise — no legitimate investment guarantees profits"
-    if any(w in t for w in ["http", "www", "click", "link"]):
-        return "Suspicious URL shared — potential phishing link to steal credentials"
-    if any(w in t for w in ["kyc", "update your", "verify your", "verification required"]):
-        return "KYC/verification request via phone/message — banks do KYC in-branch only"
-    if any(w in t for w in ["transfer", "send money", "pay", "fee", "charge", "penalty"]):
-        return "Requesting money transfer — legitimate services don't ask for upfront payments this way"
-    if any(w in t for w in ["whatsapp", "telegram", "personal number"]):
-        return "Moving to personal messaging — attempting to evade official communication channels"
-    if any(w in t for w in ["reply", "confirm", "submit", "provide", "share your"]):
-        return "Requesting personal information via unsecured channel — potential social engineering"
-    if any(w in t for w in ["refund", "cashback", "compensation"]):
-        return "Refund bait — creating false hope to extract banking credentials"
-    if any(w in t for w in ["final", "warning", "terminat", "cancel"]):
-        return "Escalation threat — increasing pressure to force immediate compliance"
-    if any(w in t for w in ["customs", "seized", "parcel"]):
-        return "Customs seizure threat — fake authority claim to extort payment"
-    if any(w in t for w in ["electricity", "power cut", "disconnection"]):
-        return "Utility disconnection threat — creating urgency around essential services"
-    if any(w in t for w in ["job", "hiring", "work from home"]):
-        return "Fake job offer — employment bait requiring upfront registration fees"
+    analysis = analyze(text)
+    for group, red_flag in _RED_FLAG_GROUPS:
+        if analysis.has(group):
+            return red_flag
     return ""
 
 
@@ -291,7 +285,7 @@ _PROBE_QUESTIONS = (
 )
 
 
-def _get_probing_question(text: str, turn_count: int,
+def _get_probing_question(text: Union[str, MessageAnalysis], turn_count: int,
                           previous_replies: Optional[List[str]] = None) -> str:
     """Context-aware probe: cycles email→phone→upi→account→identity→location."""
     previous_replies = previous_replies or []
@@ -349,7 +343,7 @@ def _select_unique_response(pool: list, previous_replies: List[str], max_attempt
 # Public API
 # ─────────────────────────────────────────────────────────────────────────
 
-def generate_honeypot_response(current_message: str, turn_count: int = 1,
+def generate_honeypot_response(current_message: Union[str, MessageAnalysis], turn_count: int = 1,
                                 scam_type: str = None,
                                 previous_replies: List[str] = None,
                                 **kwargs) -> tuple:
@@ -357,7 +351,7 @@ def generate_honeypot_response(current_message: str, turn_count: int = 1,
     Generate a context-aware honeypot response.
 
     Args:
-        current_message: The scammer's current message
+        current_message: The scammer's current message (text or its MessageAnalysis)
         turn_count: Which turn we're on (1-based)
         scam_type: Detected scam type from scam_detector (optional)
         previous_replies: Previous agent replies for deduplication
@@ -366,6 +360,7 @@ def generate_honeypot_response(current_message: str, turn_count: int = 1,
         Tuple of (reply_text, red_flag_description, probing_question)
     """
     previous_replies = previous_replies or []
+    current_message = analyze(current_message)
 
     # 1. Determine category: use scam_type mapping first, fallback to keyword detection
     category = None
@@ -471,11 +466,12 @@ def generate_honeypot_response(current_message: str, turn_count: int = 1,
     return response, red_flag, probe
 
 
-def generate_confused_response(message: str, previous_replies: List[str] = None) -> tuple:
+def generate_confused_response(message: Union[str, MessageAnalysis], previous_replies: List[str] = None) -> tuple:
     """Generate a confused/clarifying response for non-scam messages.
     Returns: Tuple of (reply_text, red_flag_description, probing_question)
     """
     previous_replies = previous_replies or []
+    message = analyze(message)
     language = _detect_language(message)
     pool = _get_pool("general", "early", language)
     response = _select_unique_response(pool, previous_replies)
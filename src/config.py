@@ -6,10 +6,102 @@ load_dotenv()
 # API Authentication Key (for securing your endpoint)
 MY_API_KEY = os.getenv("API_KEY", "sentinal-hackathon-2026")
 
+# Max turns accepted by POST /analyze/batch in one request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# Archive replay (POST /analyze/replay, src/replay.py): turns in flight / live sessions kept
+REPLAY_CONCURRENCY = int(os.getenv("REPLAY_CONCURRENCY", "16"))
+REPLAY_MAX_OPEN_SESSIONS = int(os.getenv("REPLAY_MAX_OPEN_SESSIONS", "1000"))
+
+# Session store (src/session_store.py): memory | sqlite | redis
+# memory keeps sessions per process (single worker); sqlite/redis share them
+# across uvicorn workers on one host / across hosts.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "./sessions.db")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))  # idle sessions deleted after this
+
 # GUVI Callback URL
-GUVI_CALLBACK_URL = "https://hackathon.guvi.in/api/updateHoneyPotFinalResult"
+GUVI_CALLBACK_URL = os.getenv("GUVI_CALLBACK_URL", "https://hackathon.guvi.in/api/updateHoneyPotFinalResult")
+
+# Callback dispatcher (src/guvi_callback.py): worker pool, queue bound, retries, circuit breaker
+CALLBACK_WORKERS = int(os.getenv("CALLBACK_WORKERS", "4"))
+CALLBACK_QUEUE_SIZE = int(os.getenv("CALLBACK_QUEUE_SIZE", "1000"))  # distinct sessions waiting
+CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", "5"))  # seconds per HTTP attempt
+CALLBACK_MAX_RETRIES = int(os.getenv("CALLBACK_MAX_RETRIES", "3"))
+CALLBACK_BACKOFF_BASE = float(os.getenv("CALLBACK_BACKOFF_BASE", "0.5"))  # 0.5s, 1s, 2s, ... (jittered)
+CALLBACK_BACKOFF_MAX = float(os.getenv("CALLBACK_BACKOFF_MAX", "8"))
+CALLBACK_BREAKER_THRESHOLD = int(os.getenv("CALLBACK_BREAKER_THRESHOLD", "5"))  # consecutive failures
+CALLBACK_BREAKER_COOLDOWN = float(os.getenv("CALLBACK_BREAKER_COOLDOWN", "30"))  # seconds open
 
 # ── SLM (Small Language Model) Configuration ──────────────────────────
 USE_SLM = os.getenv("USE_SLM", "false").lower() in ("true", "1", "yes")
 SLM_MODEL_PATH = os.getenv("SLM_MODEL_PATH", "./SmolLM2-135M-Instruct")
 SLM_TIMEOUT = int(os.getenv("SLM_TIMEOUT", "8"))  # seconds
+# Generation length and sampling: SLM_TEMPERATURE 0 decodes greedily; SLM_TOP_P 1.0 keeps
+# the whole distribution (tests/benchmark_slm_sweep.py measures the trade-offs)
+SLM_MAX_NEW_TOKENS = int(os.getenv("SLM_MAX_NEW_TOKENS", "200"))
+SLM_TEMPERATURE = float(os.getenv("SLM_TEMPERATURE", "0.7"))
+SLM_TOP_P = float(os.getenv("SLM_TOP_P", "1.0"))
+# Deadlines: an /analyze request must be answered SLM_DEADLINE_SECONDS after it arrives
+# (or sooner, per its X-Deadline-Ms header); the SLM sizes max_new_tokens to the time
+# left from measured tokens/s, or skips generation (see slm_budget.py)
+SLM_DEADLINE_AWARE = os.getenv("SLM_DEADLINE_AWARE", "true").lower() in ("true", "1", "yes")
+SLM_DEADLINE_SECONDS = float(os.getenv("SLM_DEADLINE_SECONDS", str(SLM_TIMEOUT)))
+# Micro-batching: concurrent SLM requests wait up to SLM_BATCH_WAIT_MS for
+# company, then run as one padded generate() of at most SLM_BATCH_MAX_SIZE prompts
+SLM_BATCH_MAX_SIZE = int(os.getenv("SLM_BATCH_MAX_SIZE", "8"))
+SLM_BATCH_WAIT_MS = float(os.getenv("SLM_BATCH_WAIT_MS", "10"))
+# Encode the fixed persona/task/schema prompt prefix once at warmup and reuse its KV cache
+SLM_PREFIX_CACHE = os.getenv("SLM_PREFIX_CACHE", "true").lower() in ("true", "1", "yes")
+# Inference backend: "torch" (fp32), "int8" (dynamic-quantized Linear layers, CPU only)
+# or "onnx" (ONNX Runtime via optimum; the exported graph is cached in SLM_ONNX_CACHE_DIR)
+SLM_BACKEND = os.getenv("SLM_BACKEND", "torch").lower()
+SLM_ONNX_CACHE_DIR = os.getenv("SLM_ONNX_CACHE_DIR", "/tmp/.cache/sentinal-onnx")
+# Constrain generation to the JSON object _parse_output reads (forced keys, capped strings, early stop)
+SLM_CONSTRAINED_JSON = os.getenv("SLM_CONSTRAINED_JSON", "true").lower() in ("true", "1", "yes")
+# Per-turn prompt (after the cached prefix) held to this many tokens, counted with the
+# model's tokenizer: empty sections dropped, history condensed by relevance (slm_prompt.py)
+SLM_PROMPT_TOKEN_BUDGET = int(os.getenv("SLM_PROMPT_TOKEN_BUDGET", "224"))
+# What an SLM call does: "generate" (sampled JSON: confidence, scam type, entities, reply),
+# "score" (one forward pass: confidence + ranked scam types from next-token logits, see
+# slm_scoring.py; no reply) or "both" (generate, with confidence and type from the scores)
+SLM_MODE = os.getenv("SLM_MODE", "generate").lower()
+# Deferred SLM: the rule reply goes out at once and the SLM call runs in the background;
+# its entities, confidence, scam type and insight merge into the session for the next
+# turn's response and callback, and its reply is kept as the next turn's candidate
+SLM_DEFERRED = os.getenv("SLM_DEFERRED", "false").lower() in ("true", "1", "yes")
+# Gating: call the SLM only on turns where it can still change the outcome (see slm_gate.py)
+SLM_GATE_ENABLED = os.getenv("SLM_GATE_ENABLED", "true").lower() in ("true", "1", "yes")
+SLM_GATE_CONF_HIGH = float(os.getenv("SLM_GATE_CONF_HIGH", "0.6"))  # detected scams start at 0.5, rarely pass 0.75
+SLM_GATE_COOLDOWN_SECONDS = float(os.getenv("SLM_GATE_COOLDOWN_SECONDS", "15"))  # per session
+SLM_GATE_MAX_QUEUE = int(os.getenv("SLM_GATE_MAX_QUEUE", "16"))  # SLM requests queued + running
+SLM_GATE_EARLY_TURNS = int(os.getenv("SLM_GATE_EARLY_TURNS", "1"))  # turns before missing intel counts
+# Result cache: repeated contexts (same message, scam type, phase, history) skip generation
+SLM_CACHE_ENABLED = os.getenv("SLM_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+SLM_CACHE_SIZE = int(os.getenv("SLM_CACHE_SIZE", "1024"))
+SLM_CACHE_TTL_SECONDS = float(os.getenv("SLM_CACHE_TTL_SECONDS", "3600"))
+SLM_CACHE_PATH = os.getenv("SLM_CACHE_PATH", "")  # SQLite file to persist/share entries; empty = memory only
+# Worker processes: 0 runs the SLM inside the API process; N > 0 hosts it in N
+# supervised worker processes (see slm_worker.py) and the API process only does IPC
+SLM_WORKERS = int(os.getenv("SLM_WORKERS", "0"))
+SLM_WORKER_HANG_SECONDS = float(os.getenv("SLM_WORKER_HANG_SECONDS", "60"))  # no answer → kill + respawn
+SLM_WORKER_NICE = int(os.getenv("SLM_WORKER_NICE", "10"))  # worker niceness: rule-only requests win shared cores
+# CPU plan (see slm_cpu.py): SLM_RESERVED_CORES of the cores this process may use stay with
+# the API process, worker processes get disjoint slices of the rest (pinned with
+# SLM_PIN_CORES), and at load a short calibration generation picks the torch thread count
+# (and, in a worker, pinned vs floating). SLM_THREADS > 0 fixes the thread count instead
+SLM_THREADS = int(os.getenv("SLM_THREADS", "0"))
+SLM_RESERVED_CORES = int(os.getenv("SLM_RESERVED_CORES", "1"))
+SLM_PIN_CORES = os.getenv("SLM_PIN_CORES", "true").lower() in ("true", "1", "yes")
+SLM_AUTOTUNE_TOKENS = int(os.getenv("SLM_AUTOTUNE_TOKENS", "16"))  # calibration generation length
+SLM_AUTOTUNE_TOLERANCE = float(os.getenv("SLM_AUTOTUNE_TOLERANCE", "0.1"))  # fewer threads win within 10% of the fastest
+# Where SLM batches run (see slm_inference.py): "local" (this process), "workers"
+# (SLM_WORKERS processes) or "http" (an OpenAI-compatible completion server, e.g.
+# llama.cpp's llama-server, at SLM_HTTP_URL). Unset: "workers" if SLM_WORKERS > 0, else "local"
+SLM_INFERENCE = os.getenv("SLM_INFERENCE", "workers" if SLM_WORKERS > 0 else "local").lower()
+SLM_HTTP_URL = os.getenv("SLM_HTTP_URL", "http://127.0.0.1:8080/v1").rstrip("/")
+SLM_HTTP_MODEL = os.getenv("SLM_HTTP_MODEL", "")  # empty = the first model the server lists
+SLM_HTTP_API_KEY = os.getenv("SLM_HTTP_API_KEY", "")  # sent as a Bearer token if set
+SLM_HTTP_POOL_SIZE = int(os.getenv("SLM_HTTP_POOL_SIZE", "8"))  # keep-alive connections = rows in flight
+SLM_INFERENCE_LATENCY_WINDOW = int(os.getenv("SLM_INFERENCE_LATENCY_WINDOW", "1024"))  # batches kept for p50/p95
@@ -15,7 +15,9 @@ Why native Python?
 import math
 import logging
 import re
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Tuple, Union
+
+from message_analysis import MessageAnalysis, analyze, register_terms
 
 logger = logging.getLogger(__name__)
 
@@ -206,6 +208,14 @@ SCAM_TO_TX_TYPE = {
     "purchase":      "PURCHASE",
 }
 
+# Term groups in the shared MessageAnalysis scan
+_TX_TYPE_GROUP = register_terms("fraud.tx_type", list(SCAM_TO_TX_TYPE))
+_BENE_COUNTRY_GROUPS = [
+    (register_terms("fraud.bene.nigeria", ["nigeria", "comoros", "myanmar", "ghana"]), "NIGERIA"),
+    (register_terms("fraud.bene.crypto", ["crypto", "bitcoin", "binance", "usdt"]), "COMOROS"),  # Crypto scam corridors
+    (register_terms("fraud.bene.customs", ["customs", "parcel", "package", "courier"]), "MYANMAR"),
+]
+
 # High-risk bene countries associated with common scam corridors
 SCAM_BENE_COUNTRIES = [
     "NIGERIA", "COMOROS", "MYANMAR", "CAMBODIA", "SRI-LANKA",
@@ -213,9 +223,10 @@ SCAM_BENE_COUNTRIES = [
 ]
 
 
-def extract_usd_amount_from_text(text: str) -> float:
+def extract_usd_amount_from_text(text: Union[str, MessageAnalysis]) -> float:
     """Extract the largest mentioned rupee/dollar amount from text."""
-    text_lower = text.lower()
+    analysis = analyze(text)
+    text, text_lower = analysis.text, analysis.lower
 
     # Lakhs pattern: "5 lakh", "50000"
     lakh_match = re.search(r'(\d+(?:\.\d+)?)\s*lakh', text_lower)
@@ -243,7 +254,7 @@ def extract_usd_amount_from_text(text: str) -> float:
 
 
 def analyze_message_fraud_risk(
-    message_text: str,
+    message_text: Union[str, MessageAnalysis],
     scam_type: Optional[str] = None,
     conversation_history: Optional[list] = None,
 ) -> Dict:
@@ -261,32 +272,27 @@ def analyze_message_fraud_risk(
         - breakdown: per-feature risk contribution
         - riskLevel: 'LOW' / 'MEDIUM' / 'HIGH' / 'CRITICAL'
     """
-    text_lower = (message_text or "").lower()
+    analysis = analyze(message_text)
 
     # 1. Sender country: India is the most common honeypot origin
     sender_country = "INDIA"
 
     # 2. Bene country: infer from scam context
     #    High-risk corridors for money mule operations
-    if any(w in text_lower for w in ["nigeria", "comoros", "myanmar", "ghana"]):
-        bene_country = "NIGERIA"
-    elif any(w in text_lower for w in ["crypto", "bitcoin", "binance", "usdt"]):
-        bene_country = "COMOROS"  # Crypto scam corridors
-    elif any(w in text_lower for w in ["customs", "parcel", "package", "courier"]):
-        bene_country = "MYANMAR"
-    else:
-        # Default: same high-risk region (scam money typically moves to risk zones)
-        bene_country = "SRI-LANKA"
+    bene_country = "SRI-LANKA"  # Default: same high-risk region (scam money typically moves to risk zones)
+    for group, country in _BENE_COUNTRY_GROUPS:
+        if analysis.has(group):
+            bene_country = country
+            break
 
     # 3. USD amount
-    usd_amount = extract_usd_amount_from_text(message_text)
+    usd_amount = extract_usd_amount_from_text(analysis)
 
-    # 4. Transaction type
+    # 4. Transaction type — first SCAM_TO_TX_TYPE keyword (in dict order) present
     tx_type = "MOVE-FUNDS"  # Default for honeypot messages
-    for keyword, mapped_type in SCAM_TO_TX_TYPE.items():
-        if keyword in text_lower:
-            tx_type = mapped_type
-            break
+    tx_keywords = analysis.terms(_TX_TYPE_GROUP)
+    if tx_keywords:
+        tx_type = SCAM_TO_TX_TYPE[tx_keywords[0]]
 
     # 5. Boost amount if multi-turn context shows escalation
     if conversation_history and len(conversation_history) > 3:
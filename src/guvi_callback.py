@@ -1,68 +1,335 @@
 """
-Callback to GUVI evaluation endpoint — fire-and-forget.
+Callback to GUVI evaluation endpoint — queued, pooled, fire-and-forget.
 Sends the latest session intelligence + metrics + rich agentNotes after each turn.
+
+CallbackDispatcher:
+  - bounded queue drained by a fixed pool of CALLBACK_WORKERS threads
+  - one keep-alive requests.Session shared by the pool (no per-call TLS handshake)
+  - a session with a callback already queued is coalesced: every payload is the
+    cumulative state, so only the newest one is worth sending
+  - retries with exponential backoff + jitter on network errors, 429 and 5xx
+  - circuit breaker: after CALLBACK_BREAKER_THRESHOLD consecutive failures the
+    pool holds off for CALLBACK_BREAKER_COOLDOWN seconds, then lets one probe through
+  - stats(): queue depth, outcome counters, send / end-to-end latency percentiles
 """
 import logging
+import random
 import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional
+
 import requests
-from config import GUVI_CALLBACK_URL
+from requests.adapters import HTTPAdapter
+
+from config import (
+    GUVI_CALLBACK_URL, CALLBACK_WORKERS, CALLBACK_QUEUE_SIZE, CALLBACK_TIMEOUT,
+    CALLBACK_MAX_RETRIES, CALLBACK_BACKOFF_BASE, CALLBACK_BACKOFF_MAX,
+    CALLBACK_BREAKER_THRESHOLD, CALLBACK_BREAKER_COOLDOWN,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def build_callback_payload(session) -> dict:
+    """Snapshot of the session in the GUVI final-result format."""
+    metrics = session.get_engagement_metrics()
+    intel = session.intelligence
+    return {
+        "sessionId": session.session_id,
+        "scamDetected": True,
+        "totalMessagesExchanged": metrics["totalMessagesExchanged"],
+        "extractedIntelligence": {
+            "phoneNumbers": list(intel.phoneNumbers),
+            "bankAccounts": list(intel.bankAccounts),
+            "upiIds": list(intel.upiIds),
+            "phishingLinks": list(intel.phishingLinks),
+            "emailAddresses": list(intel.emailAddresses),
+            "suspiciousKeywords": list(intel.suspiciousKeywords),
+            "caseIds": list(intel.caseIds),
+            "policyNumbers": list(intel.policyNumbers),
+            "orderNumbers": list(intel.orderNumbers),
+        },
+        "engagementMetrics": metrics,
+        "agentNotes": session.get_notes_string(),
+    }
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "p50": round(ordered[(n - 1) // 2], 1),
+        "p95": round(ordered[min(n - 1, int(n * 0.95))], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+# ── Circuit breaker ────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """closed → (threshold consecutive failures) → open → (cooldown) → half_open → closed/open."""
+
+    def __init__(self, threshold: int = CALLBACK_BREAKER_THRESHOLD, cooldown: float = CALLBACK_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = "closed"
+        self.trips = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """0 if a call may go ahead now, else seconds to wait before asking again."""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probe_in_flight:
+                return min(1.0, self.cooldown)  # one probe at a time while half-open
+            self.state = "half_open"
+            self._probe_in_flight = True
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("[CALLBACK] Circuit closed — GUVI endpoint recovered")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                if self.state == "closed":
+                    self.trips += 1
+                    logger.warning(
+                        f"[CALLBACK] Circuit open after {self.failures} failures — "
+                        f"pausing sends for {self.cooldown:.0f}s"
+                    )
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+# ── Dispatcher ─────────────────────────────────────────────────────────
+
+class CallbackDispatcher:
+    """Bounded queue + fixed worker pool delivering callback payloads."""
+
+    def __init__(
+        self,
+        url: str = GUVI_CALLBACK_URL,
+        workers: int = CALLBACK_WORKERS,
+        queue_size: int = CALLBACK_QUEUE_SIZE,
+        timeout: float = CALLBACK_TIMEOUT,
+        max_retries: int = CALLBACK_MAX_RETRIES,
+        backoff_base: float = CALLBACK_BACKOFF_BASE,
+        backoff_max: float = CALLBACK_BACKOFF_MAX,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.url = url
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.http = requests.Session()
+        self.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+        self.http.headers["Content-Type"] = "application/json"
+
+        # FIFO of session ids; the newest payload + waiters per id live in _pending
+        self._order: Deque[str] = deque()
+        self._pending: Dict[str, dict] = {}
+        self._cond = threading.Condition()
+        self._in_progress = 0
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+
+        self.counters = {
+            "submitted": 0, "coalesced": 0, "dropped": 0,
+            "sent": 0, "failed": 0, "retries": 0,
+        }
+        self._send_ms: Deque[float] = deque(maxlen=1024)   # one HTTP attempt
+        self._total_ms: Deque[float] = deque(maxlen=1024)  # enqueue → delivered/failed
+
+    # ── Producer side ──
+
+    def submit(self, session) -> Future:
+        """Queue the session's current state. Never blocks; the Future resolves to True/False."""
+        payload = build_callback_payload(session)
+        future: Future = Future()
+        sid = payload["sessionId"]
+        with self._cond:
+            self._ensure_workers()
+            self.counters["submitted"] += 1
+            entry = self._pending.get(sid)
+            if entry is not None:
+                entry["payload"] = payload
+                entry["futures"].append(future)
+                self.counters["coalesced"] += 1
+                return future
+            if len(self._order) >= self.queue_size:
+                self.counters["dropped"] += 1
+                logger.warning(f"[CALLBACK] Queue full ({self.queue_size}) — dropped callback for {sid}")
+                future.set_result(False)
+                return future
+            self._pending[sid] = {"payload": payload, "futures": [future], "queued_at": time.perf_counter()}
+            self._order.append(sid)
+            self._cond.notify()
+        return future
+
+    def _ensure_workers(self):
+        # Called with _cond held; threads start on first use, not at import
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"guvi-callback-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # ── Worker side ──
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._order and not self._stopping.is_set():
+                    self._cond.wait()
+                if not self._order:
+                    return
+                sid = self._order.popleft()
+                entry = self._pending.pop(sid)
+                self._in_progress += 1
+            # Waiters that gave up (cancelled) are skipped; the send still happens
+            futures = [f for f in entry["futures"] if f.set_running_or_notify_cancel()]
+            try:
+                ok = self._deliver(entry["payload"])
+            except Exception as e:  # never let a worker die
+                logger.error(f"[CALLBACK] Session {sid} dispatcher error: {e}")
+                ok = False
+            with self._cond:
+                self.counters["sent" if ok else "failed"] += 1
+                self._total_ms.append((time.perf_counter() - entry["queued_at"]) * 1000)
+                self._in_progress -= 1
+                self._cond.notify_all()
+            for future in futures:
+                future.set_result(ok)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, payload: dict) -> bool:
+        sid = payload["sessionId"]
+        attempt = 0
+        while True:
+            wait = self.breaker.wait_time()
+            while wait > 0:
+                if self._stopping.wait(wait):
+                    return False
+                wait = self.breaker.wait_time()
+
+            started = time.perf_counter()
+            retryable = True
+            try:
+                response = self.http.post(self.url, json=payload, timeout=self.timeout)
+                ok = response.status_code in (200, 201)
+                retryable = response.status_code == 429 or response.status_code >= 500
+                outcome = f"status={response.status_code}"
+            except requests.RequestException as e:
+                ok = False
+                outcome = f"error={e}"
+            self._send_ms.append((time.perf_counter() - started) * 1000)
+
+            if ok:
+                self.breaker.record_success()
+                logger.info(
+                    f"[CALLBACK] Session {sid}: {outcome}, "
+                    f"msgs={payload['totalMessagesExchanged']}, attempt={attempt + 1}"
+                )
+                return True
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # endpoint is up; the request itself was rejected
+            if not retryable or attempt >= self.max_retries:
+                logger.error(f"[CALLBACK] Session {sid} failed after {attempt + 1} attempt(s): {outcome}")
+                return False
+            with self._cond:
+                self.counters["retries"] += 1
+            if self._stopping.wait(self._backoff(attempt)):
+                return False
+            attempt += 1
+
+    # ── Introspection / lifecycle ──
+
+    def queue_depth(self) -> int:
+        return len(self._order)
+
+    def stats_counters(self) -> dict:
+        with self._cond:
+            return dict(self.counters)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queueDepth": len(self._order),
+                "inProgress": self._in_progress,
+                "queueSize": self.queue_size,
+                "workers": self.workers,
+                **self.counters,
+                "circuit": self.breaker.state,
+                "circuitTrips": self.breaker.trips,
+                "sendLatencyMs": _percentiles(list(self._send_ms)),
+                "endToEndLatencyMs": _percentiles(list(self._total_ms)),
+            }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the queue is empty and no send is in flight. True if drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._order or self._in_progress:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Drain what can be sent within timeout, then stop the workers."""
+        self.flush(timeout)
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self.http.close()
+
+
+# Global dispatcher used by the API and the session cleanup thread
+dispatcher = CallbackDispatcher()
+
+
+def send_callback_async(session) -> Future:
+    """Queue a callback for the session's current state (non-blocking)."""
+    return dispatcher.submit(session)
+
+
 def send_callback_to_guvi(session) -> bool:
     """
-    Send session data to GUVI callback endpoint.
-    Returns True on success, False on failure.
+    Send session data to GUVI callback endpoint and wait for the outcome.
+    Returns True on success, False on failure. Blocking — not for the event loop.
     """
-    try:
-        metrics = session.get_engagement_metrics()
-        notes = session.get_notes_string()
-
-        payload = {
-            "sessionId": session.session_id,
-            "scamDetected": True,
-            "totalMessagesExchanged": metrics["totalMessagesExchanged"],
-            "extractedIntelligence": {
-                "phoneNumbers": session.intelligence.phoneNumbers,
-                "bankAccounts": session.intelligence.bankAccounts,
-                "upiIds": session.intelligence.upiIds,
-                "phishingLinks": session.intelligence.phishingLinks,
-                "emailAddresses": session.intelligence.emailAddresses,
-                "suspiciousKeywords": session.intelligence.suspiciousKeywords,
-                "caseIds": session.intelligence.caseIds,
-                "policyNumbers": session.intelligence.policyNumbers,
-                "orderNumbers": session.intelligence.orderNumbers,
-            },
-            "engagementMetrics": metrics,
-            "agentNotes": notes,
-        }
-
-        response = requests.post(
-            GUVI_CALLBACK_URL,
-            json=payload,
-            timeout=5,
-            headers={"Content-Type": "application/json"},
-        )
-
-        logger.info(
-            f"[CALLBACK] Session {session.session_id}: "
-            f"status={response.status_code}, "
-            f"msgs={metrics['totalMessagesExchanged']}, "
-            f"intel_count={session.get_intel_count()}"
-        )
-        return response.status_code in (200, 201)
-
-    except Exception as e:
-        logger.error(f"[CALLBACK] Session {session.session_id} failed: {e}")
-        return False
-
-
-def send_callback_async(session):
-    """Fire-and-forget callback in a separate thread."""
-    thread = threading.Thread(
-        target=send_callback_to_guvi,
-        args=(session,),
-        daemon=True,
-    )
-    thread.start()
+    return dispatcher.submit(session).result()
@@ -1,7 +1,9 @@
 import re
 import logging
-from typing import List
+from typing import Dict, List, Union
 from models import ExtractedIntelligence
+from keyword_matcher import KeywordMatcher
+from message_analysis import MessageAnalysis, analyze
 
 logger = logging.getLogger(__name__)
 
@@ -61,8 +63,9 @@ SAFE_DOMAINS = {'google.com', 'youtube.com', 'facebook.com', 'wikipedia.org', 'g
 
 # Case/Reference IDs: REF-2024-123, Case #12345, FIR-123, etc.
 # Requires word boundary on keywords and at least one digit in captured ID
+CASE_ID_KEYWORDS = ("case", "ref", "reference", "fir", "complaint", "ticket", "incident", "badge", "verification")
 CASE_ID_PATTERN = re.compile(
-    r'\b(?:case|ref|reference|fir|complaint|ticket|incident|badge|verification)'
+    r'\b(?:' + '|'.join(CASE_ID_KEYWORDS) + r')'
     r'[\s#:_-]+'
     r'([A-Z0-9][A-Z0-9\-_]{2,20})',
     re.IGNORECASE
@@ -74,8 +77,9 @@ STANDALONE_ID_PATTERN = re.compile(
 
 # Policy numbers: LIC-987654, Policy: 123456, POL-xxx, etc.
 # ID MUST contain at least one digit (prevents capturing words like 'matured', 'bonus')
+POLICY_KEYWORDS = ("policy", "insurance", "lic", "plan", "premium", "pol")
 POLICY_PATTERN = re.compile(
-    r'\b(?:policy|insurance|lic|plan|premium|pol)'
+    r'\b(?:' + '|'.join(POLICY_KEYWORDS) + r')'
     r'[\s#:_-]+'
     r'([A-Z0-9]*\d[A-Z0-9\-_]{2,20})',
     re.IGNORECASE
@@ -83,8 +87,9 @@ POLICY_PATTERN = re.compile(
 
 # Order numbers: AMZ-12345, Order #123, ORD-xxx, etc.
 # Requires word boundary and separator between keyword and ID
+ORDER_KEYWORDS = ("order", "transaction", "txn", "invoice", "shipment", "tracking", "delivery", "awb", "consignment")
 ORDER_PATTERN = re.compile(
-    r'\b(?:order|transaction|txn|invoice|shipment|tracking|delivery|awb|consignment)'
+    r'\b(?:' + '|'.join(ORDER_KEYWORDS) + r')'
     r'[\s#:_-]+'
     r'([A-Z0-9][A-Z0-9\-_]{3,20})',
     re.IGNORECASE
@@ -95,10 +100,11 @@ IFSC_PATTERN = re.compile(r'\b([A-Z]{4}0[A-Z0-9]{6})\b')
 
 
 # ── Extractors ─────────────────────────────────────────────────────────
+# Each extractor is split into the raw regex matches (findall) and the
+# filtering applied to them, so extract_all_intelligence() can feed the same
+# filters from the single-pass scan_entities() instead of one sweep per pattern.
 
-def extract_phone_numbers(text: str) -> List[str]:
-    """Extract Indian phone numbers. Returns both raw and +91 prefixed forms."""
-    raw_numbers = PHONE_PATTERN.findall(text)
+def _phone_numbers(raw_numbers: List[str]) -> List[str]:
     result = set()
     for digits in raw_numbers:
         # digits is always the 10-digit capture group
@@ -108,11 +114,14 @@ def extract_phone_numbers(text: str) -> List[str]:
     return list(result)
 
 
-def extract_bank_accounts(text: str) -> List[str]:
-    """Extract bank account numbers (9-18 digits), excluding phone numbers and timestamps."""
-    matches = BANK_ACCOUNT_PATTERN.findall(text)
+def extract_phone_numbers(text: str) -> List[str]:
+    """Extract Indian phone numbers. Returns both raw and +91 prefixed forms."""
+    return _phone_numbers(PHONE_PATTERN.findall(text))
+
+
+def _bank_accounts(matches: List[str], raw_phones: List[str]) -> List[str]:
     # Get all phone numbers to exclude
-    phone_digits = set(PHONE_PATTERN.findall(text))
+    phone_digits = set(raw_phones)
 
     filtered = []
     for m in matches:
@@ -132,6 +141,11 @@ def extract_bank_accounts(text: str) -> List[str]:
     return list(set(filtered))
 
 
+def extract_bank_accounts(text: str) -> List[str]:
+    """Extract bank account numbers (9-18 digits), excluding phone numbers and timestamps."""
+    return _bank_accounts(BANK_ACCOUNT_PATTERN.findall(text), PHONE_PATTERN.findall(text))
+
+
 # Known email handles to exclude from generic UPI matching
 _EMAIL_HANDLES = {
     'gmail', 'yahoo', 'outlook', 'hotmail', 'live', 'protonmail',
@@ -140,11 +154,10 @@ _EMAIL_HANDLES = {
 }
 
 
-def extract_upi_ids(text: str) -> List[str]:
-    """Extract UPI IDs (name@bankhandle) — tries specific handles first, then generic."""
-    upi_ids = set(UPI_PATTERN.findall(text))
+def _upi_ids(specific: List[str], generic: List[str]) -> List[str]:
+    upi_ids = set(specific)
     # Also try generic @word pattern (catches new/unknown bank handles)
-    for m in UPI_GENERIC_PATTERN.findall(text):
+    for m in generic:
         handle = m.split('@')[1].lower()
         # Exclude if it looks like a real email (has a TLD-like extension)
         if '.' not in handle and handle not in _EMAIL_HANDLES:
@@ -152,60 +165,73 @@ def extract_upi_ids(text: str) -> List[str]:
     return list(upi_ids)
 
 
-def extract_phishing_links(text: str) -> List[str]:
-    """Extract suspicious URLs — all URLs are suspicious in scam context."""
+def extract_upi_ids(text: str) -> List[str]:
+    """Extract UPI IDs (name@bankhandle) — tries specific handles first, then generic."""
+    return _upi_ids(UPI_PATTERN.findall(text), UPI_GENERIC_PATTERN.findall(text))
+
+
+def _phishing_links(raw_urls: List[str]) -> List[str]:
     urls = set()
-    for url in URL_PATTERN.findall(text):
+    for url in raw_urls:
         # Strip trailing punctuation that regex may capture
         urls.add(url.rstrip('.,;:!?)\'"'))
     return list(urls)
 
 
-def extract_email_addresses(text: str) -> List[str]:
-    """Extract email addresses — standard + contextual (email: word@word)."""
+def extract_phishing_links(text: str) -> List[str]:
+    """Extract suspicious URLs — all URLs are suspicious in scam context."""
+    return _phishing_links(URL_PATTERN.findall(text))
+
+
+def _email_addresses(standard: List[str], contextual: List[str], upi_ids: List[str]) -> List[str]:
     all_emails = set()
-    for e in EMAIL_PATTERN.findall(text):
+    for e in standard:
         all_emails.add(e.rstrip('.,;:!?)\'"'))
     # Contextual: 'email scammer.fraud@fakebank' (no TLD)
-    for e in CONTEXTUAL_EMAIL_PATTERN.findall(text):
+    for e in contextual:
         all_emails.add(e.rstrip('.,;:!?)\'"'))
-    upi_ids = set(extract_upi_ids(text))
-    return list(all_emails - upi_ids)
+    return list(all_emails - set(upi_ids))
 
 
-def extract_case_ids(text: str) -> List[str]:
-    """Extract case/reference IDs and standalone alphanumeric IDs."""
+def extract_email_addresses(text: str) -> List[str]:
+    """Extract email addresses — standard + contextual (email: word@word)."""
+    return _email_addresses(
+        EMAIL_PATTERN.findall(text), CONTEXTUAL_EMAIL_PATTERN.findall(text), extract_upi_ids(text),
+    )
+
+
+def _case_ids(case_matches: List[str], standalone: List[str]) -> List[str]:
     ids = set()
-    for m in CASE_ID_PATTERN.findall(text):
+    for m in case_matches:
         # Real IDs always contain at least one digit
         if any(c.isdigit() for c in m):
             ids.add(m)
     # Also find standalone ABC-12345 style IDs
-    for m in STANDALONE_ID_PATTERN.findall(text):
+    for m in standalone:
         # Skip IFSC codes and known patterns
         if not re.match(r'^[A-Z]{4}0', m):
             ids.add(m)
     return list(ids)
 
 
+def extract_case_ids(text: str) -> List[str]:
+    """Extract case/reference IDs and standalone alphanumeric IDs."""
+    return _case_ids(CASE_ID_PATTERN.findall(text), STANDALONE_ID_PATTERN.findall(text))
+
+
+def _with_digit(matches: List[str]) -> List[str]:
+    # Real policy/order numbers always contain at least one digit
+    return list({m for m in matches if any(c.isdigit() for c in m)})
+
+
 def extract_policy_numbers(text: str) -> List[str]:
     """Extract policy/insurance numbers (must contain at least one digit)."""
-    results = set()
-    for m in POLICY_PATTERN.findall(text):
-        # Double-check: ID must actually have a digit
-        if any(c.isdigit() for c in m):
-            results.add(m)
-    return list(results)
+    return _with_digit(POLICY_PATTERN.findall(text))
 
 
 def extract_order_numbers(text: str) -> List[str]:
     """Extract order/transaction numbers."""
-    results = set()
-    for m in ORDER_PATTERN.findall(text):
-        # Real order numbers always contain at least one digit
-        if any(c.isdigit() for c in m):
-            results.add(m)
-    return list(results)
+    return _with_digit(ORDER_PATTERN.findall(text))
 
 
 def extract_ifsc_codes(text: str) -> List[str]:
@@ -213,27 +239,156 @@ def extract_ifsc_codes(text: str) -> List[str]:
     return list(set(IFSC_PATTERN.findall(text)))
 
 
-def extract_all_intelligence(text: str) -> ExtractedIntelligence:
-    """Extract all intelligence from a single message."""
+# ── Single-pass scanner ────────────────────────────────────────────────
+# One sweep finds candidate anchors — digit runs, '@' signs, URL starts, "mail"
+# and word starts that begin a keyword-prefixed or uppercase ID. Each entity
+# pattern is then tried only at the anchors that can start one of its matches,
+# honouring findall's left-to-right, non-overlapping order, so the results
+# equal findall() exactly.
+#
+# The sweep begins with a character class so the regex engine skips ordinary
+# letters without entering the pattern; word starts are found through the
+# non-word character in front of them.
+
+_ID_START = (
+    r'(?=(?i:' + '|'.join(CASE_ID_KEYWORDS + POLICY_KEYWORDS + ORDER_KEYWORDS) + r')'
+    r'|[A-Z]{2,5}-[0-9]|[A-Z]{4}0)'
+)
+_ANCHOR_PATTERN = re.compile(
+    r'[\W\dhwmM]'
+    r'(?:(?<=@)(?P<at>)(?P<at_id>' + _ID_START + r')?'   # UPI / email, maybe an ID right after
+    r'|(?<=(?<!\d)\d)(?P<digits>\d*)'                    # digit run — phones, bank accounts
+    r'|(?<=h)(?P<http>)(?=ttps?://)'                     # phishing links
+    r'|(?<=w)(?P<www>)(?=ww\.)'
+    r'|(?<=[mM])(?P<mail>)(?=(?i:ail))'                  # contextual email
+    r'|(?<=\W)(?P<id>)' + _ID_START + r')'               # keyword-prefixed / uppercase ID next
+)
+_ID_START_PATTERN = re.compile(_ID_START)
+
+# Characters the local part (before '@') of each @-pattern accepts — with
+# IGNORECASE, [a-zA-Z] also matches 'İ', 'ı', 'ſ' and the Kelvin sign.
+_UPI_LOCAL_CHARS = frozenset(
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._-\u0130\u0131\u017f\u212a'
+)
+_EMAIL_LOCAL_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-')
+
+# name, pattern, local chars before '@', needs \b at match start
+_AT_PATTERNS = (
+    ("upi", UPI_PATTERN, _UPI_LOCAL_CHARS, False),
+    ("upi_generic", UPI_GENERIC_PATTERN, _UPI_LOCAL_CHARS, True),
+    ("email", EMAIL_PATTERN, _EMAIL_LOCAL_CHARS, False),
+)
+_ID_PATTERNS = (
+    ("case", CASE_ID_PATTERN),
+    ("standalone", STANDALONE_ID_PATTERN),
+    ("policy", POLICY_PATTERN),
+    ("order", ORDER_PATTERN),
+    ("ifsc", IFSC_PATTERN),
+)
+_is_word_char = KeywordMatcher._is_word_char  # same \b notion of a word char as the keyword scan
+
+
+def scan_entities(text: str) -> Dict[str, List[str]]:
+    """
+    Raw matches of every entity pattern in one sweep over text.
+    Returns {name: matches} where matches equals PATTERN.findall(text) for
+    phone, bank, upi, upi_generic, email, contextual_email, url, case,
+    standalone, policy, order and ifsc.
+    """
+    found: Dict[str, List[str]] = {
+        name: [] for name in (
+            "phone", "bank", "upi", "upi_generic", "email", "contextual_email",
+            "url", "case", "standalone", "policy", "order", "ifsc",
+        )
+    }
+    resume = dict.fromkeys(found, 0)  # findall continues after the previous match
+
+    def attempt(name: str, pattern, pos: int) -> bool:
+        if pos < resume[name]:
+            return False
+        m = pattern.match(text, pos)
+        if m is None:
+            return False
+        found[name].append(m.group(1) if pattern.groups else m.group())
+        resume[name] = m.end()
+        return True
+
+    def ids_at(pos: int):
+        for name, pattern in _ID_PATTERNS:
+            attempt(name, pattern, pos)
+
+    if _ID_START_PATTERN.match(text):
+        ids_at(0)  # a word start with no non-word char before it
+
+    for anchor in _ANCHOR_PATTERN.finditer(text):
+        pos = anchor.start()
+        kind = anchor.lastgroup
+
+        if kind == "digits":
+            # A phone match starts at the run or at a '+' right before it
+            if pos > 0 and text[pos - 1] == "+":
+                attempt("phone", PHONE_PATTERN, pos - 1)
+            attempt("phone", PHONE_PATTERN, pos)
+            attempt("bank", BANK_ACCOUNT_PATTERN, pos)
+
+        elif kind in ("at", "at_id"):
+            # Every @-match ends its local part at this '@', and whether the rest
+            # matches does not depend on where it started — so only the leftmost
+            # admissible start needs trying.
+            for name, pattern, local_chars, word_start in _AT_PATTERNS:
+                start = pos
+                while start > 0 and text[start - 1] in local_chars:
+                    start -= 1
+                start = max(start, resume[name])
+                if word_start:
+                    while start < pos and not (
+                        (start > 0 and _is_word_char(text[start - 1])) != _is_word_char(text[start])
+                    ):
+                        start += 1
+                if start < pos:
+                    attempt(name, pattern, start)
+            if kind == "at_id":
+                ids_at(pos + 1)
+
+        elif kind in ("http", "www"):
+            attempt("url", URL_PATTERN, pos)
+
+        elif kind == "mail":
+            # 'e-mail', 'email…' and 'mail' start 2, 1 and 0 chars before it
+            for start in range(max(pos - 2, 0), pos + 1):
+                attempt("contextual_email", CONTEXTUAL_EMAIL_PATTERN, start)
+
+        else:
+            ids_at(pos + 1)
+
+    return found
+
+
+def extract_all_intelligence(text: Union[str, MessageAnalysis]) -> ExtractedIntelligence:
+    """Extract all intelligence from a single message (text or its MessageAnalysis)."""
+    analysis = analyze(text)
+    raw = scan_entities(analysis.text)
+
     # Get IFSC codes and add them to bank accounts for extra intel
-    ifsc_codes = extract_ifsc_codes(text)
-    bank_accts = extract_bank_accounts(text)
+    ifsc_codes = list(set(raw["ifsc"]))
+    bank_accts = _bank_accounts(raw["bank"], raw["phone"])
     # IFSC codes are valuable bank intelligence
     bank_accts = list(set(bank_accts + ifsc_codes))
 
     # Extract suspicious keywords using scam_detector
     from scam_detector import extract_suspicious_keywords
-    suspicious_kw = extract_suspicious_keywords(text)
+    suspicious_kw = extract_suspicious_keywords(analysis)
 
+    upi_ids = _upi_ids(raw["upi"], raw["upi_generic"])
     return ExtractedIntelligence(
-        phoneNumbers=extract_phone_numbers(text),
+        phoneNumbers=_phone_numbers(raw["phone"]),
         bankAccounts=bank_accts,
-        upiIds=extract_upi_ids(text),
-        phishingLinks=extract_phishing_links(text),
-        emailAddresses=extract_email_addresses(text),
-        caseIds=extract_case_ids(text),
-        policyNumbers=extract_policy_numbers(text),
-        orderNumbers=extract_order_numbers(text),
+        upiIds=upi_ids,
+        phishingLinks=_phishing_links(raw["url"]),
+        emailAddresses=_email_addresses(raw["email"], raw["contextual_email"], upi_ids),
+        caseIds=_case_ids(raw["case"], raw["standalone"]),
+        policyNumbers=_with_digit(raw["policy"]),
+        orderNumbers=_with_digit(raw["order"]),
         suspiciousKeywords=suspicious_kw,
     )
 
@@ -0,0 +1,123 @@
+"""
+Keyword Matcher — Aho-Corasick multi-pattern automaton.
+
+Compiles category keyword lists once into a DFA; one pass over the text finds
+every keyword occurrence (overlapping ones included) with its categories and
+offsets. Cost is linear in text length no matter how many keywords/categories
+are loaded — substring semantics match `keyword in text` exactly.
+
+Usage:
+    matcher = KeywordMatcher({"threat": ["blocked", "police"], ...})
+    matcher.find_all("your account is blocked")     → [KeywordHit(...)]
+    matcher.match("...", whole_words=True)          → {category: [keywords]}
+"""
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+
+class KeywordHit(NamedTuple):
+    keyword: str
+    category: str
+    start: int  # offset of first char in the scanned text
+    end: int    # offset one past the last char
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over {category: [keywords]}. Patterns are matched case-sensitively —
+    pass lower-cased text for the lower-case keyword lists used across the repo."""
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        # Entries keep the caller's (category, keyword) order — match() reports in this order
+        self.entries: List[tuple] = []
+        entry_ids: Dict[str, List[int]] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                if not keyword:
+                    continue
+                entry_ids.setdefault(keyword, []).append(len(self.entries))
+                self.entries.append((category, keyword))
+
+        # 1. Trie
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[str]] = [[]]
+        for keyword in entry_ids:
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(keyword)
+
+        # 2. Failure links (BFS) folded into a full DFA over the keyword alphabet:
+        #    delta[state][ch] is the next state; chars outside it return to root.
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(t) for t in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for ch, nxt in delta[fail[state]].items():
+                delta[state].setdefault(ch, nxt)
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(nxt)
+
+        self._delta = delta
+        self._step = [d.get for d in delta]  # bound lookups — the scan loop is the hot path
+        self._outputs = [tuple(o) for o in outputs]
+        self._entry_ids = entry_ids
+
+    @staticmethod
+    def _is_word_char(ch: str) -> bool:
+        return ch.isalnum() or ch == "_"
+
+    @classmethod
+    def is_whole_word(cls, text: str, keyword: str, start: int, end: int) -> bool:
+        """True if the occurrence text[start:end] of keyword is not glued to adjacent word chars."""
+        if start > 0 and cls._is_word_char(text[start - 1]) and cls._is_word_char(keyword[0]):
+            return False
+        if end < len(text) and cls._is_word_char(text[end]) and cls._is_word_char(keyword[-1]):
+            return False
+        return True
+
+    def scan(self, text: str, whole_words: bool = False):
+        """Yield (keyword, start, end) for every occurrence — a single pass."""
+        step, outputs = self._step, self._outputs
+        state = 0
+        end = 0
+        for ch in text:
+            end += 1
+            state = step[state](ch, 0)
+            if outputs[state]:
+                for keyword in outputs[state]:
+                    start = end - len(keyword)
+                    if whole_words and not self.is_whole_word(text, keyword, start, end):
+                        continue
+                    yield keyword, start, end
+
+    def find_all(self, text: str, whole_words: bool = False) -> List[KeywordHit]:
+        """Every occurrence of every keyword, one KeywordHit per (category, occurrence)."""
+        hits = []
+        for keyword, start, end in self.scan(text, whole_words):
+            for entry_id in self._entry_ids[keyword]:
+                hits.append(KeywordHit(keyword, self.entries[entry_id][0], start, end))
+        return hits
+
+    def categorize(self, keywords: Iterable[str]) -> Dict[str, List[str]]:
+        """{category: [keywords]} for keywords found by scan(), in declaration order."""
+        found: Set[int] = set()
+        for keyword in set(keywords):
+            found.update(self._entry_ids[keyword])
+        result: Dict[str, List[str]] = {}
+        for entry_id in sorted(found):
+            category, keyword = self.entries[entry_id]
+            result.setdefault(category, []).append(keyword)
+        return result
+
+    def match(self, text: str, whole_words: bool = False) -> Dict[str, List[str]]:
+        """{category: [keywords present]} in declaration order — like nested `kw in text` loops."""
+        return self.categorize(keyword for keyword, _, _ in self.scan(text, whole_words))
@@ -9,20 +9,27 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.datastructures import MutableHeaders
+import asyncio
 import logging
 import time
 import json
+from typing import Awaitable, Callable, Dict, Optional
 
-from config import MY_API_KEY, USE_SLM
+from config import MY_API_KEY, USE_SLM, SLM_DEFERRED, SLM_DEADLINE_SECONDS, SLM_TIMEOUT, BATCH_MAX_ITEMS
 from models import AnalyzeRequest, ExtractedIntelligence, FraudAnalysis
 from scam_detector import detect_scam, get_scam_type, calculate_confidence, extract_suspicious_keywords
 from intelligence import extract_all_intelligence, derive_missing_intelligence
 from agent_persona import generate_honeypot_response, generate_confused_response
-from session_manager import session_manager
-from guvi_callback import send_callback_async
+from session_manager import SLM_ENTITY_FIELDS, session_manager
+from guvi_callback import send_callback_async, dispatcher as callback_dispatcher
 from fraud_model import analyze_message_fraud_risk
+from message_analysis import MessageAnalysis
 from slm_engine import slm_engine
+from slm_gate import slm_gate
+from replay import replay_spooled
+from metrics import StageTimer, register_gauge, render_prometheus
 
 # ── Logging ────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -39,9 +46,14 @@ app = FastAPI(
 )
 
 
+_started = False  # set once startup ran — the rule path needs nothing else
+
+
 @app.on_event("startup")
 def startup_event():
     """Warm up SLM model — non-blocking for Leapcell's 9.8s cold-start limit."""
+    global _started
+    _started = True
     if USE_SLM:
         import threading
         logger.info("[STARTUP] SLM enabled — loading model in background thread...")
@@ -61,13 +73,134 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start = time.perf_counter()
-    response = await call_next(request)
-    elapsed_ms = (time.perf_counter() - start) * 1000
-    response.headers["X-Process-Time-Ms"] = f"{elapsed_ms:.1f}"
-    return response
+class ProcessTimeMiddleware:
+    """
+    Adds X-Process-Time-Ms (time until the response starts).
+    Pure ASGI on purpose: @app.middleware("http") re-wraps every response in a
+    StreamingResponse that also reads receive(), which steals request-body
+    chunks from endpoints that stream their input (/analyze/replay).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+
+        async def send_with_process_time(message):
+            if message["type"] == "http.response.start":
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                MutableHeaders(scope=message).append("X-Process-Time-Ms", f"{elapsed_ms:.1f}")
+            await send(message)
+
+        await self.app(scope, receive, send_with_process_time)
+
+
+app.add_middleware(ProcessTimeMiddleware)
+
+
+# ── Metrics (scraped at GET /metrics) ──────────────────────────────────
+
+register_gauge("honeypot_active_sessions", "Sessions held in the session store.",
+               lambda: len(session_manager.store))
+register_gauge("honeypot_callback_queue_depth", "GUVI callbacks waiting for a dispatcher worker.",
+               callback_dispatcher.queue_depth)
+register_gauge("honeypot_callback_in_progress", "GUVI callbacks being sent right now.",
+               lambda: callback_dispatcher.stats()["inProgress"])
+register_gauge("honeypot_callbacks_total", "GUVI callbacks finished, by terminal outcome.",
+               lambda: {outcome: count for outcome, count in callback_dispatcher.stats_counters().items()
+                        if outcome in ("sent", "failed", "dropped")}, kind="counter", label="outcome")
+register_gauge("honeypot_callback_submissions_total", "GUVI callbacks submitted (one per turn that sends one).",
+               lambda: callback_dispatcher.stats_counters()["submitted"], kind="counter")
+register_gauge("honeypot_callback_coalesced_total", "GUVI callbacks folded into one already queued for the session.",
+               lambda: callback_dispatcher.stats_counters()["coalesced"], kind="counter")
+register_gauge("honeypot_callback_retries_total", "GUVI callback HTTP attempts retried.",
+               lambda: callback_dispatcher.stats_counters()["retries"], kind="counter")
+register_gauge("honeypot_callback_circuit_open", "1 while the callback circuit breaker is open or half-open.",
+               lambda: int(callback_dispatcher.breaker.state != "closed"))
+register_gauge("honeypot_slm_enabled", "1 if USE_SLM is on.", lambda: int(USE_SLM))
+register_gauge("honeypot_slm_ready", "1 once the SLM is loaded and serving.", lambda: int(slm_engine.ready))
+register_gauge("honeypot_slm_batches_total", "Batched SLM generate() calls.",
+               lambda: slm_engine.batcher.stats["batches"], kind="counter")
+register_gauge("honeypot_slm_batched_requests_total", "SLM requests served through batches.",
+               lambda: slm_engine.batcher.stats["requests"], kind="counter")
+register_gauge("honeypot_slm_expired_total", "SLM requests that timed out before their batch started.",
+               lambda: slm_engine.batcher.stats["expired"], kind="counter")
+register_gauge("honeypot_slm_abandoned_total", "SLM calls given up by their caller while pending, by reason.",
+               lambda: slm_engine.abandoned, kind="counter", label="reason")
+register_gauge("honeypot_slm_cancelled_generations_total",
+               "SLM generations stopped early because their caller gave up.",
+               lambda: slm_engine.cancelled_generations, kind="counter")
+register_gauge("honeypot_slm_deadline_rows_total",
+               "SLM generations sized down or skipped to meet their request's deadline.",
+               lambda: slm_engine.deadline_rows, kind="counter", label="outcome")
+register_gauge("honeypot_slm_seconds_per_token", "Measured SLM decode time per token, one row (moving average).",
+               lambda: (slm_engine.rate.estimate() or (0.0, 0.0))[1])
+register_gauge("honeypot_slm_gate_runs_total", "Turns the SLM gate sent to the SLM, by reason.",
+               lambda: slm_gate.stats()["runs"], kind="counter", label="reason")
+register_gauge("honeypot_slm_gate_skips_total", "Turns the SLM gate kept on the rule path, by reason.",
+               lambda: slm_gate.stats()["skips"], kind="counter", label="reason")
+register_gauge("honeypot_slm_cache_lookups_total", "SLM result cache lookups.",
+               lambda: {"hit": slm_engine.cache.counters["hits"], "miss": slm_engine.cache.counters["misses"]}
+               if slm_engine.cache else {}, kind="counter", label="result")
+register_gauge("honeypot_slm_cache_entries", "Entries in the in-memory SLM result cache.",
+               lambda: len(slm_engine.cache) if slm_engine.cache else 0)
+register_gauge("honeypot_slm_cache_hit_ratio", "SLM result cache hits / lookups since start.",
+               lambda: slm_engine.cache.stats()["hitRate"] if slm_engine.cache else 0.0)
+register_gauge("honeypot_slm_backend_info", "Loaded SLM inference backend (torch, int8, onnx or http).",
+               lambda: {slm_engine.backend: 1} if slm_engine.backend else {}, label="backend")
+register_gauge("honeypot_slm_load_seconds", "Time taken to load the SLM.", lambda: slm_engine.load_seconds)
+register_gauge("honeypot_slm_load_phase_seconds", "SLM load time by phase.",
+               lambda: slm_engine.load_phases, label="phase")
+register_gauge("honeypot_slm_weights_mmapped", "1 if the SLM weights are memory-mapped from the safetensors file.",
+               lambda: int(slm_engine.weights_mmapped))
+register_gauge("honeypot_slm_model_resident_megabytes", "Resident memory added since the SLM started loading.",
+               lambda: slm_engine.stats()["modelRssMb"])
+register_gauge("honeypot_slm_generated_tokens_total", "Tokens generated by the SLM.",
+               lambda: slm_engine.generated_tokens, kind="counter")
+register_gauge("honeypot_slm_tokens_per_second", "Average SLM generation throughput since start.",
+               lambda: slm_engine.stats()["tokensPerSecond"])
+register_gauge("honeypot_slm_scored_total", "Messages scored by SLM logit scoring (SLM_MODE=score|both).",
+               lambda: slm_engine.scored, kind="counter")
+register_gauge("honeypot_slm_score_seconds_total", "Time spent in SLM logit scoring batches.",
+               lambda: slm_engine.score_seconds, kind="counter")
+register_gauge("honeypot_slm_deferred_total", "Deferred (background) SLM calls by outcome (SLM_DEFERRED).",
+               lambda: _deferred_stats, kind="counter", label="outcome")
+register_gauge("honeypot_slm_deferred_in_flight", "Deferred SLM calls still running.", lambda: len(_deferred))
+register_gauge("honeypot_slm_workers_alive", "SLM worker processes loaded and serving (SLM_WORKERS > 0).",
+               lambda: slm_engine.pool.alive() if slm_engine.pool else 0)
+register_gauge("honeypot_slm_worker_failures_total", "SLM worker processes killed by the supervisor, by reason.",
+               lambda: {"crash": slm_engine.pool.counters["crashes"], "hang": slm_engine.pool.counters["hangs"]}
+               if slm_engine.pool else {}, kind="counter", label="reason")
+register_gauge("honeypot_slm_worker_restarts_total", "SLM worker processes respawned by the supervisor.",
+               lambda: slm_engine.pool.counters["restarts"] if slm_engine.pool else 0, kind="counter")
+register_gauge("honeypot_slm_inference_info", "Where SLM batches run (SLM_INFERENCE: local, workers or http).",
+               lambda: {slm_engine.inference.kind: 1} if slm_engine.inference else {}, label="kind")
+register_gauge("honeypot_slm_inference_batches_total", "SLM batches run, by operation.",
+               lambda: {op: latency.calls for op, latency in slm_engine.inference.latency.items()}
+               if slm_engine.inference else {}, kind="counter", label="op")
+register_gauge("honeypot_slm_inference_errors_total", "SLM batches that failed, by operation.",
+               lambda: {op: latency.errors for op, latency in slm_engine.inference.latency.items()}
+               if slm_engine.inference else {}, kind="counter", label="op")
+register_gauge("honeypot_slm_inference_batch_p95_seconds", "95th percentile duration of recent SLM batches, by operation.",
+               lambda: {op: latency.percentile(0.95) for op, latency in slm_engine.inference.latency.items()}
+               if slm_engine.inference else {}, label="op")
+
+
+def _slm_cpu_plans() -> Dict[str, dict]:
+    """CPU plan (slm_cpu.py) of each process running the SLM: "api" in-process, else the worker index."""
+    if slm_engine.pool is not None:
+        return {str(w.index): w.info["cpu"] for w in slm_engine.pool.workers if w.alive and w.info.get("cpu")}
+    return {"api": slm_engine.cpu} if slm_engine.cpu else {}
+
+
+register_gauge("honeypot_slm_threads", "Torch intra-op threads of each process running the SLM (autotuned at load).",
+               lambda: {process: plan["threads"] for process, plan in _slm_cpu_plans().items()}, label="process")
+register_gauge("honeypot_slm_cores", "CPU cores each process running the SLM may use (its worker slice if pinned).",
+               lambda: {process: len(plan["cores"]) for process, plan in _slm_cpu_plans().items()}, label="process")
 
 
 # ── Helpers ────────────────────────────────────────────────────────────
@@ -264,6 +397,52 @@ def _build_error_response(session_id):
     }
 
 
+# ── Deferred SLM enrichment ────────────────────────────────────────────
+# SLM_DEFERRED: the turn answers with the rule reply and the SLM call runs as a
+# background task. Its result is queued in the session store and merged by the
+# session's next turn (in whichever worker runs it), inside that turn's own
+# load → save, so it never overwrites a turn or is overwritten by one (or by
+# SessionManager.apply_deferred before a timeout or forced callback). The
+# one-call-per-session marker lives in the store too.
+
+_DEFERRED_CLAIM_SECONDS = 3 * SLM_TIMEOUT  # calls end within SLM_TIMEOUT; frees the claim of a worker that died
+_deferred: Dict[str, asyncio.Task] = {}  # session_id → background SLM call started by this process
+_deferred_stats = {"stored": 0, "empty": 0, "error": 0}  # finished background calls by outcome
+
+
+async def _enrich_later(session_id: str, turn: int, slm_call: dict):
+    """Background SLM call for one turn; its result is queued for the session's next turn."""
+    try:
+        slm_result = await slm_engine.smart_process(**slm_call)
+        if not slm_result.get("slm_used"):
+            _deferred_stats["empty"] += 1
+            return
+        session_manager.push_deferred(session_id, {"turn": turn, "result": {
+            key: slm_result[key] for key in
+            ("refined_confidence", "refined_scam_type", "missed_entities", "refined_reply", "insight")
+            if key in slm_result
+        }})
+        _deferred_stats["stored"] += 1
+        logger.info(f"[{session_id}] Deferred SLM result for turn {turn} queued for the next turn")
+    except Exception as e:
+        _deferred_stats["error"] += 1
+        logger.error(f"[{session_id}] Deferred SLM error: {e}")
+    finally:
+        session_manager.release_deferred(session_id)
+        _deferred.pop(session_id, None)
+
+
+async def _await_deferred(session_id: str, timeout: float = SLM_TIMEOUT):
+    """Wait (up to timeout) for the session's deferred SLM call still in flight, in this worker or another."""
+    task = _deferred.get(session_id)
+    if task is not None:
+        await asyncio.wait([task], timeout=timeout)
+        return
+    waited_until = time.monotonic() + timeout
+    while session_manager.deferred_claimed(session_id) and time.monotonic() < waited_until:
+        await asyncio.sleep(0.05)
+
+
 # ── Endpoints ──────────────────────────────────────────────────────────
 
 @app.get("/")
@@ -276,27 +455,195 @@ async def health():
     return {"status": "healthy", "timestamp": int(time.time() * 1000)}
 
 
+def _sessions_readiness() -> dict:
+    store = session_manager.store
+    return {"store": store.name, "shared": store.shared, "fallbackFrom": store.fallback_from}
+
+
+def _rules_ready() -> bool:
+    """The rule path can serve: startup ran and the configured session store answers."""
+    if not _started or session_manager.store.fallback_from:
+        return False  # a memory stand-in for a shared store would give each worker private sessions
+    try:
+        session_manager.store.load("__ready_probe__")
+        return True
+    except Exception as e:
+        logger.warning(f"[READY] Session store unavailable: {e}")
+        return False
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness for routing: 200 once rule-based analysis can serve; the SLM's state is reported alongside."""
+    rules = _rules_ready()
+    return JSONResponse(
+        status_code=200 if rules else 503,
+        content={"rules": rules, "sessions": _sessions_readiness(), "slm": slm_engine.readiness()},
+    )
+
+
+@app.get("/ready/slm")
+async def ready_slm():
+    """200 only while the SLM is loaded and serving (503 while loading, failed, disabled or all workers down)."""
+    slm = slm_engine.readiness()
+    return JSONResponse(status_code=200 if slm["ready"] else 503, content=slm)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape: per-stage latency histograms, sessions, callback queue, SLM readiness."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _get_session_id(raw_body) -> str:
+    """Session ID from any of the accepted field names."""
+    return raw_body.get("sessionId") or raw_body.get("session_id") or "unknown"
+
+
+def _request_deadline(arrived: float, deadline_ms: Optional[str]) -> float:
+    """time.monotonic() by which the response is due: SLM_DEADLINE_SECONDS, or sooner per X-Deadline-Ms."""
+    budget = SLM_DEADLINE_SECONDS
+    try:
+        if deadline_ms is not None and float(deadline_ms) > 0:
+            budget = min(budget, float(deadline_ms) / 1000)
+    except ValueError:
+        logger.debug(f"Ignoring malformed X-Deadline-Ms: {deadline_ms!r}")
+    return arrived + budget
+
+
 @app.post("/analyze")
 @app.post("/api/analyze")
 async def analyze_message(
     request: Request,
     x_api_key: str = Header(None, alias="x-api-key"),
+    x_deadline_ms: Optional[str] = Header(None, alias="x-deadline-ms"),
 ):
     """
     Main endpoint — detects scams, extracts intelligence, engages scammer.
     Returns rubric-compliant JSON. No LLM — guaranteed sub-10ms.
     """
+    deadline = _request_deadline(time.monotonic(), x_deadline_ms)
     # ── Auth ───────────────────────────────────────────────────────────
     if x_api_key != MY_API_KEY:
         logger.warning(f"Invalid API key attempt")
         raise HTTPException(status_code=401, detail="Invalid API key")
 
+    try:
+        raw_body = await request.json()
+    except Exception as e:
+        logger.error(f"Invalid request body: {e}")
+        return JSONResponse(content=_build_error_response(None))
+
+    timer = StageTimer()
+    response = await _analyze_turn(raw_body, timer=timer, is_disconnected=request.is_disconnected,
+                                   deadline=deadline)
+    return JSONResponse(content=response, headers={"Server-Timing": timer.server_timing()})
+
+
+@app.post("/analyze/batch")
+@app.post("/api/analyze/batch")
+async def analyze_batch(
+    request: Request,
+    x_api_key: str = Header(None, alias="x-api-key"),
+):
+    """
+    Batch endpoint — many AnalyzeRequest-shaped turns in one HTTP round trip.
+    Body: a JSON array of turns, or {"items": [...]}.
+    Turns of different sessions run concurrently; turns of the same session run
+    strictly in the order given. Results come back in input order, and a failing
+    item gets the same fallback as /analyze instead of failing the batch.
+    """
+    if x_api_key != MY_API_KEY:
+        logger.warning(f"Invalid API key attempt")
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+    try:
+        raw_body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+
+    items = raw_body.get("items", raw_body.get("requests")) if isinstance(raw_body, dict) else raw_body
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of analyze requests")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {BATCH_MAX_ITEMS} items)")
+
+    # Group item indexes by session, preserving arrival order within each session
+    by_session: dict = {}
+    for idx, item in enumerate(items):
+        sid = _get_session_id(item) if isinstance(item, dict) else None
+        by_session.setdefault(sid, []).append(idx)
+
+    results: list = [None] * len(items)
+
+    async def run_session(indexes):
+        for idx in indexes:
+            item = items[idx]
+            if isinstance(item, dict):
+                results[idx] = await _analyze_turn(item)
+            else:
+                results[idx] = _build_error_response(None)
+
+    await asyncio.gather(*(run_session(indexes) for indexes in by_session.values()))
+
+    logger.info(f"[BATCH] {len(items)} items across {len(by_session)} sessions")
+    return JSONResponse(content={"status": "success", "count": len(results), "results": results})
+
+
+class _NDJSONReplayResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator reads the request body while streaming.
+    Starlette's default __call__ runs a disconnect listener that also consumes
+    receive() and would swallow request-body chunks; here only request.stream()
+    reads it (a client disconnect surfaces there as ClientDisconnect).
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/analyze/replay")
+@app.post("/api/analyze/replay")
+async def analyze_replay(
+    request: Request,
+    x_api_key: str = Header(None, alias="x-api-key"),
+):
+    """
+    Bulk backfill — NDJSON in, NDJSON out (see replay.py).
+    Body: one /analyze request per line, read as it arrives. Each turn's result is
+    streamed back as soon as it completes; the last line is a throughput summary.
+    No GUVI callbacks; finished sessions are dropped from session_manager.
+    """
+    if x_api_key != MY_API_KEY:
+        logger.warning(f"Invalid API key attempt")
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+    return _NDJSONReplayResponse(replay_spooled(
+        request.stream(), lambda body: _analyze_turn(body, send_callback=False),
+    ))
+
+
+async def _analyze_turn(raw_body: dict, send_callback: bool = True, timer: Optional[StageTimer] = None,
+                        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                        deadline: Optional[float] = None) -> dict:
+    """
+    Run one conversation turn through the full pipeline and return the response dict.
+    Never raises — any failure returns _build_error_response() for the session.
+    send_callback=False skips the GUVI callback (archive replay).
+    Stage latencies go to timer (a fresh one if not given) and the /metrics histograms.
+    is_disconnected (Request.is_disconnected) lets a pending SLM call stop early.
+    deadline (time.monotonic()) is when the response is due; the SLM call fits in what is left.
+    """
     session_id = None
+    session = None
+    timer = timer or StageTimer()
 
     try:
         # ── Parse raw body FIRST (always works) ────────────────────────
-        raw_body = await request.json()
-        session_id = raw_body.get("sessionId") or raw_body.get("session_id") or "unknown"
+        session_id = _get_session_id(raw_body)
 
         # Extract raw history from ALL possible field names
         raw_history = (
@@ -334,31 +681,38 @@ async def analyze_message(
 
         logger.info(f"[{session_id}] Processing: {message_text[:80]}")
 
+        # One shared scan of the message — every stage below reads from it
+        analysis = MessageAnalysis(message_text)
+        timer.mark("parse")
+
         # ── Session (single source of truth) ───────────────────────────
         session = session_manager.get_or_create(session_id)
+        if SLM_DEFERRED:
+            session_manager.apply_deferred(session)  # what the previous turn's background call found
 
         # ── Update message count and duration from conversation history ──
+        # Only the unseen suffix of the resent history is normalized and timed;
+        # a diverged history falls back to a full rescan inside sync_history().
         effective_history_count = max(len(raw_history), len(parsed_history))
         session.update_message_count_from_history(effective_history_count)
-        session.update_duration_from_history(raw_history)
+        new_history = session.sync_history(raw_history)
+        conversation_history = session.conversation_history
 
         # ── Behavioral tracking ────────────────────────────────────────
-        session.track_manipulation(message_text)
-        session.track_escalation(message_text)
+        session.track_manipulation(analysis)
+        session.track_escalation(analysis)
+        timer.mark("session")
 
         # ── Scam Detection ─────────────────────────────────────────────
-        # Build history dicts from raw data (most tolerant)
-        conversation_history = []
-        for item in raw_history:
-            if isinstance(item, dict):
-                conversation_history.append({
-                    "sender": item.get("sender", item.get("role", "")),
-                    "text": item.get("text", item.get("content", "")),
-                    "timestamp": item.get("timestamp", 0),
-                })
+        if new_history:
+            new_history_text = " ".join(h.get("text", "") for h in new_history)
+            _, new_history_keywords, _ = detect_scam(new_history_text)
+            session.history_keywords.update(new_history_keywords)
 
         # ALWAYS run detection to extract keywords
-        scam_detected_now, keywords, scam_score = detect_scam(message_text, conversation_history)
+        scam_detected_now, keywords, scam_score = detect_scam(
+            analysis, history_keywords=session.history_keywords,
+        )
 
         # Count categories hit for confidence calculation
         categories_hit = len(set(
@@ -403,33 +757,32 @@ async def analyze_message(
 
             # Classify from full history for better accuracy
             if scam_detected and scam_type == "GENERAL_FRAUD" and conversation_history:
-                all_history_text = " ".join(h.get("text", "") for h in conversation_history)
-                _, history_keywords, _ = detect_scam(all_history_text)
-                history_type = get_scam_type(history_keywords)
+                history_type = get_scam_type(list(session.history_keywords))
                 if history_type != "GENERAL_FRAUD":
                     scam_type = history_type
 
-        # ── Intelligence Extraction (current message + full history) ───
+        timer.mark("detect")
+
+        # ── Intelligence Extraction (current message + new history) ────
+        # Earlier history items were already merged into session.intelligence.
         try:
-            current_intel = extract_all_intelligence(message_text)
-
-            # Extract from ALL raw history items
-            for item in raw_history:
-                if isinstance(item, dict):
-                    item_text = item.get("text", item.get("content", ""))
-                    if item_text:
-                        item_intel = extract_all_intelligence(item_text)
-                        current_intel = ExtractedIntelligence(
-                            phoneNumbers=list(set(current_intel.phoneNumbers + item_intel.phoneNumbers)),
-                            bankAccounts=list(set(current_intel.bankAccounts + item_intel.bankAccounts)),
-                            upiIds=list(set(current_intel.upiIds + item_intel.upiIds)),
-                            phishingLinks=list(set(current_intel.phishingLinks + item_intel.phishingLinks)),
-                            emailAddresses=list(set(current_intel.emailAddresses + item_intel.emailAddresses)),
-                            caseIds=list(set(current_intel.caseIds + item_intel.caseIds)),
-                            policyNumbers=list(set(current_intel.policyNumbers + item_intel.policyNumbers)),
-                            orderNumbers=list(set(current_intel.orderNumbers + item_intel.orderNumbers)),
-                            suspiciousKeywords=list(set(current_intel.suspiciousKeywords + item_intel.suspiciousKeywords)),
-                        )
+            current_intel = extract_all_intelligence(analysis)
+
+            for item in new_history:
+                item_text = item.get("text", "")
+                if item_text:
+                    item_intel = extract_all_intelligence(item_text)
+                    current_intel = ExtractedIntelligence(
+                        phoneNumbers=list(set(current_intel.phoneNumbers + item_intel.phoneNumbers)),
+                        bankAccounts=list(set(current_intel.bankAccounts + item_intel.bankAccounts)),
+                        upiIds=list(set(current_intel.upiIds + item_intel.upiIds)),
+                        phishingLinks=list(set(current_intel.phishingLinks + item_intel.phishingLinks)),
+                        emailAddresses=list(set(current_intel.emailAddresses + item_intel.emailAddresses)),
+                        caseIds=list(set(current_intel.caseIds + item_intel.caseIds)),
+                        policyNumbers=list(set(current_intel.policyNumbers + item_intel.policyNumbers)),
+                        orderNumbers=list(set(current_intel.orderNumbers + item_intel.orderNumbers)),
+                        suspiciousKeywords=list(set(current_intel.suspiciousKeywords + item_intel.suspiciousKeywords)),
+                    )
         except Exception as e:
             logger.error(f"[{session_id}] Intelligence extraction error: {e}")
             current_intel = ExtractedIntelligence()
@@ -445,6 +798,7 @@ async def analyze_message(
         session.scam_type = scam_type or session.scam_type
         session.merge_intelligence(current_intel)
         session.record_turn()  # +1 turn = +2 messages
+        timer.mark("intel")
 
         # ── Derive missing intelligence from existing data ────────────
         try:
@@ -454,13 +808,14 @@ async def analyze_message(
 
         if keywords:
             session.add_note(f"Turn {session._turn_count}: {', '.join(keywords[:5])}")
+        timer.mark("derive")
 
         # ── GaussianNB Fraud Model (JP Morgan) ─────────────────────────
         fraud_result = {}
         fraud_analysis_obj = FraudAnalysis()
         try:
             fraud_result = analyze_message_fraud_risk(
-                message_text=message_text,
+                message_text=analysis,
                 scam_type=scam_type or session.scam_type,
                 conversation_history=conversation_history,
             )
@@ -480,6 +835,7 @@ async def analyze_message(
             )
         except Exception as e:
             logger.error(f"[{session_id}] FraudModel error: {e}")
+        timer.mark("fraud")
 
         # Use accumulated keywords for rich agent notes
         all_keywords = session.accumulated_keywords if session.accumulated_keywords else keywords
@@ -490,77 +846,84 @@ async def analyze_message(
         try:
             if scam_detected:
                 reply, red_flag, probe = generate_honeypot_response(
-                    current_message=message_text,
+                    current_message=analysis,
                     turn_count=session._turn_count,
                     scam_type=scam_type or session.scam_type,
                     previous_replies=session.previous_replies,
                 )
             else:
                 reply, red_flag, probe = generate_confused_response(
-                    message_text,
+                    analysis,
                     previous_replies=session.previous_replies,
                 )
         except Exception as e:
             logger.error(f"[{session_id}] Response generation error: {e}")
             reply = "Sorry ji, network problem. Can you repeat what you said?"
+        timer.mark("reply")
 
         # ── Layer 4D: SLM Refinement (async, toggle-safe) ──────────────
         slm_insight = ""
-        if USE_SLM:
+        if SLM_DEFERRED:
+            # What the previous turn's background call left on the session
+            slm_insight, session.slm_insight = session.slm_insight, ""
+            candidate, session.slm_reply_candidate = session.slm_reply_candidate, ""
+            if (candidate and session.slm_reply_turn == session._turn_count - 1
+                    and not session.is_duplicate_reply(candidate)):
+                reply = candidate
+                logger.info(f"[{session_id}] Deferred SLM reply used ({len(candidate)} chars)")
+        if USE_SLM and slm_engine.ready:
+            run_slm, gate_reason = slm_gate.decide(
+                session, scam_detected, slm_engine.batcher.depth() + slm_engine.scorer.depth(),
+                in_flight=SLM_DEFERRED and session_manager.deferred_claimed(session_id),
+                # atomic in the store: one deferred call per session across workers
+                claim=(lambda: session_manager.claim_deferred(session_id, _DEFERRED_CLAIM_SECONDS))
+                if SLM_DEFERRED else None,
+            )
+            if not run_slm:
+                logger.debug(f"[{session_id}] SLM skipped: {gate_reason}")
+        else:
+            run_slm = False
+        if run_slm:
             try:
-                rule_intel_dict = {
-                    "phoneNumbers": session.intelligence.phoneNumbers,
-                    "upiIds": session.intelligence.upiIds,
-                    "bankAccounts": session.intelligence.bankAccounts,
-                    "emailAddresses": session.intelligence.emailAddresses,
-                    "phishingLinks": session.intelligence.phishingLinks,
-                }
-                slm_result = await slm_engine.smart_process(
+                slm_call = dict(
                     message_text=message_text,
-                    conversation_history=conversation_history,
+                    conversation_history=list(conversation_history),
                     scam_type=scam_type or session.scam_type or "UNKNOWN",
                     turn_count=session._turn_count,
                     rule_detected=scam_detected,
                     rule_confidence=session.confidence_level,
-                    rule_intel=rule_intel_dict,
+                    rule_intel={
+                        field: list(getattr(session.intelligence, field)) for field in SLM_ENTITY_FIELDS
+                    },
                     rule_reply=reply,
                 )
-
-                if slm_result.get("slm_used"):
-                    # Merge confidence: take the higher
-                    slm_conf = slm_result.get("refined_confidence", 0.0)
-                    if slm_conf > session.confidence_level:
-                        session.confidence_level = slm_conf
-                        logger.info(f"[{session_id}] SLM boosted confidence → {slm_conf:.2f}")
-
-                    # Merge scam type if SLM found a better one
-                    slm_type = slm_result.get("refined_scam_type", "")
-                    if slm_type and slm_type != "UNKNOWN" and (not session.scam_type or session.scam_type == "GENERAL_FRAUD"):
-                        session.scam_type = slm_type
-                        scam_type = slm_type
-
-                    # Merge missed entities into session intelligence
-                    missed = slm_result.get("missed_entities", {})
-                    for field in ["phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks"]:
-                        new_vals = missed.get(field, [])
-                        if new_vals:
-                            existing = getattr(session.intelligence, field)
-                            for v in new_vals:
-                                if v and v not in existing:
-                                    existing.append(v)
-                            logger.info(f"[{session_id}] SLM added {len(new_vals)} {field}")
-
-                    # Use SLM reply if it's valid and non-empty
-                    slm_reply = slm_result.get("refined_reply", "")
-                    if slm_reply and len(slm_reply) > 15:
-                        reply = slm_reply
-                        logger.info(f"[{session_id}] SLM reply used ({len(slm_reply)} chars)")
-
-                    # Capture insight for agentNotes
-                    slm_insight = slm_result.get("insight", "")
+                if SLM_DEFERRED:
+                    # Starts once this turn has returned (no awaits below) and its session is saved
+                    _deferred[session_id] = asyncio.create_task(
+                        _enrich_later(session_id, session._turn_count, slm_call),
+                    )
+                else:
+                    slm_result = await slm_engine.smart_process(
+                        **slm_call, is_disconnected=is_disconnected, deadline=deadline,
+                    )
+                    if slm_result.get("slm_used"):
+                        if session_manager.merge_slm_result(session, slm_result):
+                            scam_type = session.scam_type
+
+                        # Use SLM reply if it's valid and non-empty
+                        slm_reply = slm_result.get("refined_reply", "")
+                        if slm_reply and len(slm_reply) > 15:
+                            reply = slm_reply
+                            logger.info(f"[{session_id}] SLM reply used ({len(slm_reply)} chars)")
+
+                        # Capture insight for agentNotes
+                        slm_insight = slm_result.get("insight", "")
 
             except Exception as e:
                 logger.error(f"[{session_id}] SLM Layer 4D error: {e}")
+                if SLM_DEFERRED and session_id not in _deferred:
+                    session_manager.release_deferred(session_id)  # claimed, but no call started
+            timer.mark("slm")
 
         # Track response for dedup
         session.add_reply(reply)
@@ -585,19 +948,27 @@ async def analyze_message(
             f"bank={len(session.intelligence.bankAccounts)}"
         )
 
+        timer.mark("build")
+
         # ── Callback to GUVI (every turn — always send latest data) ──────
-        if session.scam_detected and session.has_intelligence():
+        if send_callback and session.scam_detected and session.has_intelligence():
             session._last_rich_notes = _build_agent_notes(
                 session, scam_detected, scam_type or session.scam_type,
                 all_keywords, session.intelligence,
             )
             send_callback_async(session)
 
-        return JSONResponse(content=response)
+        session_manager.save(session)
+        timer.mark("finalize")
+        timer.finish()
+        return response
 
     except Exception as e:
         logger.error(f"[{session_id}] Error: {e}", exc_info=True)
-        return JSONResponse(content=_build_error_response(session_id))
+        if session is not None:
+            session_manager.save(session)
+        timer.finish(error=True)
+        return _build_error_response(session_id)
 
 
 # ── Debug Endpoints ────────────────────────────────────────────────────
@@ -626,6 +997,9 @@ async def get_session_debug(
     }
 
 
+FORCE_CALLBACK_WAIT = 10  # seconds; the send itself keeps going in the pool
+
+
 @app.post("/callback/force/{session_id}")
 async def force_callback(
     session_id: str,
@@ -633,10 +1007,31 @@ async def force_callback(
 ):
     if x_api_key != MY_API_KEY:
         raise HTTPException(status_code=401, detail="Invalid API key")
+    if SLM_DEFERRED:
+        await _await_deferred(session_id)  # the last turn's SLM result belongs in this callback
     session = session_manager.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    from guvi_callback import send_callback_to_guvi
-    success = send_callback_to_guvi(session)
+    if SLM_DEFERRED:
+        session_manager.apply_deferred(session)
+    # Goes through the dispatcher pool; the event loop only awaits the outcome
+    try:
+        success = await asyncio.wait_for(
+            asyncio.wrap_future(send_callback_async(session)), timeout=FORCE_CALLBACK_WAIT,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"[CALLBACK] Forced callback for {session_id} still queued after {FORCE_CALLBACK_WAIT}s")
+        success = False
     session.callback_sent = True
+    session_manager.save(session)
     return {"status": "success", "callback_triggered": True, "guvi_response": success}
+
+
+@app.post("/debug/callbacks")
+async def callback_stats(
+    x_api_key: str = Header(None, alias="x-api-key"),
+):
+    """Callback dispatcher queue depth, outcome counters and latency percentiles."""
+    if x_api_key != MY_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return callback_dispatcher.stats()
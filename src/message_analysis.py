@@ -0,0 +1,121 @@
+"""
+Message Analysis — one shared scan of a message, reused by every pipeline stage.
+
+Built once per turn in _analyze_turn and handed to scam_detector, agent_persona,
+SessionData tracking, ml_detector and fraud_model instead of the raw string.
+Holds the normalized (lower-cased) text, tokens, a keyword-hit bitmap over every
+registered term group, and the shared URL / phone / UPI regex matches.
+
+Stages declare the substring term lists they test at import time:
+
+    OTP_GROUP = register_terms("persona.red_flag.otp", ["otp", "pin", "cvv"])
+    ...
+    analysis = analyze(text)            # str or an existing MessageAnalysis
+    if analysis.has(OTP_GROUP): ...
+
+All groups compile into ONE Aho-Corasick automaton (keyword_matcher), so a new
+stage adds patterns to the same pass instead of another scan of the message.
+"""
+import re
+from collections import Counter
+from functools import cached_property
+from typing import Dict, List, Optional, Set, Union
+
+from keyword_matcher import KeywordMatcher
+
+URL_PATTERN = re.compile(r'https?://[^\s]+')
+PHONE_HINT_PATTERN = re.compile(r'[\+]?[0-9]{10,12}')
+UPI_HINT_PATTERN = re.compile(r'[a-zA-Z0-9._-]+@[a-zA-Z]+')
+
+# ── Term group registry ────────────────────────────────────────────────
+
+_TERM_GROUPS: Dict[str, List[str]] = {}
+_GROUP_BITS: Dict[str, int] = {}
+_matcher: Optional[KeywordMatcher] = None
+
+
+def register_terms(group: str, terms: List[str]) -> str:
+    """Add (or replace) a named substring term group. Returns the group name."""
+    global _matcher
+    _TERM_GROUPS[group] = list(terms)
+    _GROUP_BITS.setdefault(group, 1 << len(_GROUP_BITS))
+    _matcher = None  # recompiled on next analysis
+    return group
+
+
+def _get_matcher() -> KeywordMatcher:
+    global _matcher
+    matcher = _matcher
+    if matcher is None:
+        matcher = _matcher = KeywordMatcher(_TERM_GROUPS)
+    return matcher
+
+
+# ── Analysis object ────────────────────────────────────────────────────
+
+class MessageAnalysis:
+    """Everything the pipeline derives from a message's text, computed once."""
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.lower = self.text.lower()
+        self.tokens: List[str] = self.lower.split()
+
+        self._matcher = _get_matcher()
+        self._occurrences = list(self._matcher.scan(self.lower))
+        # {group: [terms present]} in registration order, plus one bit per group hit
+        self.matches: Dict[str, List[str]] = self._matcher.categorize(
+            keyword for keyword, _, _ in self._occurrences
+        )
+        self.hits = 0
+        for group in self.matches:
+            self.hits |= _GROUP_BITS[group]
+
+    def has(self, group: str) -> bool:
+        """True if any term of the group occurs in the message (substring semantics)."""
+        return bool(self.hits & _GROUP_BITS[group])
+
+    def terms(self, group: str, whole_words: bool = False) -> List[str]:
+        """Terms of the group present in the message, in registration order."""
+        if whole_words:
+            return self._whole_word_matches.get(group, [])
+        return self.matches.get(group, [])
+
+    @cached_property
+    def _whole_word_matches(self) -> Dict[str, List[str]]:
+        # Filter the recorded occurrences — no second scan of the text
+        return self._matcher.categorize(
+            keyword for keyword, start, end in self._occurrences
+            if KeywordMatcher.is_whole_word(self.lower, keyword, start, end)
+        )
+
+    @cached_property
+    def token_set(self) -> Set[str]:
+        return set(self.tokens)
+
+    @cached_property
+    def token_counts(self) -> Counter:
+        return Counter(self.tokens)
+
+    @cached_property
+    def chars(self) -> Set[str]:
+        return set(self.text)
+
+    @cached_property
+    def has_url(self) -> bool:
+        return URL_PATTERN.search(self.lower) is not None
+
+    @cached_property
+    def has_phone(self) -> bool:
+        return PHONE_HINT_PATTERN.search(self.text) is not None
+
+    @cached_property
+    def has_upi(self) -> bool:
+        return UPI_HINT_PATTERN.search(self.lower) is not None
+
+
+def analyze(message: Union[str, MessageAnalysis]) -> MessageAnalysis:
+    """Return message as a MessageAnalysis — stages accept either form."""
+    if isinstance(message, MessageAnalysis):
+        return message
+    return MessageAnalysis(message)
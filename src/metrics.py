@@ -0,0 +1,149 @@
+"""
+Metrics — per-stage pipeline latency histograms in Prometheus text format.
+
+Each /analyze turn carries a StageTimer; the pipeline calls timer.mark(stage)
+as it leaves each stage (one perf_counter() per stage), and timer.finish()
+folds the durations into the histograms under a single lock. The same
+durations go back to the client as a Server-Timing header.
+
+Gauges (active sessions, callback queue depth, SLM readiness, ...) are
+registered as callables and read at scrape time. All values are per process —
+with several uvicorn workers each one reports its own.
+
+    GET /metrics  →  render_prometheus()
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds — rule stages sit in the sub-millisecond buckets, SLM in the top ones
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Pipeline stages of _analyze_turn, in order (Server-Timing keeps this order)
+STAGES = (
+    "parse",     # body parsing + shared MessageAnalysis
+    "session",   # session load, history sync, behavioral tracking
+    "detect",    # detect_scam + scam type / confidence
+    "intel",     # extract_all_intelligence + merge into session
+    "derive",    # derive_missing_intelligence
+    "fraud",     # GaussianNB fraud model
+    "reply",     # rule-based reply generation
+    "slm",       # SLM refinement (USE_SLM only)
+    "build",     # reply tracking + response building
+    "finalize",  # callback queueing + session save
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics) for one label set."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+_lock = threading.Lock()
+_stage_histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES + ("total",)}
+_counters: Dict[str, int] = {"turns": 0, "turn_errors": 0}
+_gauges: List[Tuple[str, str, str, Callable, Optional[str]]] = []
+
+
+class StageTimer:
+    """Stage durations of one turn."""
+
+    __slots__ = ("_start", "_last", "stages")
+
+    def __init__(self):
+        self._start = self._last = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def mark(self, stage: str):
+        """Close the stage that just ran."""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def finish(self, error: bool = False):
+        """Record this turn's stages into the process-wide histograms."""
+        total = time.perf_counter() - self._start
+        with _lock:
+            for stage, seconds in self.stages:
+                _stage_histograms[stage].observe(seconds)
+            _stage_histograms["total"].observe(total)
+            _counters["turns"] += 1
+            if error:
+                _counters["turn_errors"] += 1
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in ms."""
+        parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages]
+        parts.append(f"total;dur={(self._last - self._start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def register_gauge(name: str, help_text: str, fn: Callable, kind: str = "gauge", label: Optional[str] = None):
+    """
+    Expose fn() at scrape time. fn returns a number, or {label_value: number}
+    when label is given. kind is the Prometheus type ("gauge" or "counter").
+    """
+    _gauges.append((name, help_text, kind, fn, label))
+
+
+def _fmt(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = [
+        "# HELP honeypot_stage_duration_seconds Time spent in each /analyze pipeline stage.",
+        "# TYPE honeypot_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        snapshot = {
+            stage: (list(h.counts), h.total, h.count) for stage, h in _stage_histograms.items()
+        }
+        counters = dict(_counters)
+    for stage, (counts, total, count) in snapshot.items():
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, counts):
+            cumulative += n
+            lines.append(f'honeypot_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'honeypot_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'honeypot_stage_duration_seconds_sum{{stage="{stage}"}} {total!r}')
+        lines.append(f'honeypot_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+    lines += [
+        "# HELP honeypot_turns_total Conversation turns processed.",
+        "# TYPE honeypot_turns_total counter",
+        f"honeypot_turns_total {counters['turns']}",
+        "# HELP honeypot_turn_errors_total Turns that fell back to the error response.",
+        "# TYPE honeypot_turn_errors_total counter",
+        f"honeypot_turn_errors_total {counters['turn_errors']}",
+    ]
+
+    for name, help_text, kind, fn, label in _gauges:
+        try:
+            value = fn()
+        except Exception:
+            continue  # a broken collector must not break the scrape
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if label:
+            for label_value, v in value.items():
+                lines.append(f'{name}{{{label}="{label_value}"}} {_fmt(v)}')
+        else:
+            lines.append(f"{name} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
@@ -7,72 +7,80 @@ This is a supplementary classifier that runs alongside the rule-based detector.
 """
 import os
 import math
-import re
-from typing import Tuple, List
+from typing import Tuple, List, Union
+
+from message_analysis import MessageAnalysis, analyze
 
 USE_ML = os.getenv("USE_ML", "false").lower() == "true"
 
 
-def extract_features(text: str) -> dict:
+URGENCY_WORDS = {
+    "urgent", "immediately", "now", "hurry", "fast", "quick",
+    "asap", "warning", "alert", "critical",
+}
+THREAT_WORDS = {
+    "blocked", "suspended", "arrested", "police", "court",
+    "legal", "penalty", "frozen", "terminated",
+}
+FINANCIAL_WORDS = {
+    "bank", "account", "upi", "payment", "transfer", "money",
+    "otp", "pin", "cvv", "kyc", "verify", "atm",
+}
+REWARD_WORDS = {
+    "won", "winner", "prize", "lottery", "reward", "free",
+    "cashback", "gift", "bonus", "profit",
+}
+ACTION_WORDS = {
+    "click", "call", "send", "share", "provide", "enter",
+    "download", "install", "pay", "submit",
+}
+
+
+def extract_features(text: Union[str, MessageAnalysis]) -> dict:
     """Extract numerical features from text for classification."""
-    text_lower = text.lower()
-    words = text_lower.split()
-    word_count = len(words)
+    analysis = analyze(text)
+    text = analysis.text
+    counts = analysis.token_counts
 
     features = {
-        "word_count": word_count,
+        "word_count": len(analysis.tokens),
         "char_count": len(text),
 
         # Urgency indicators
-        "urgency_count": sum(1 for w in words if w in {
-            "urgent", "immediately", "now", "hurry", "fast", "quick",
-            "asap", "warning", "alert", "critical",
-        }),
+        "urgency_count": sum(counts[w] for w in URGENCY_WORDS),
 
         # Threat indicators
-        "threat_count": sum(1 for w in words if w in {
-            "blocked", "suspended", "arrested", "police", "court",
-            "legal", "penalty", "frozen", "terminated",
-        }),
+        "threat_count": sum(counts[w] for w in THREAT_WORDS),
 
         # Financial keywords
-        "financial_count": sum(1 for w in words if w in {
-            "bank", "account", "upi", "payment", "transfer", "money",
-            "otp", "pin", "cvv", "kyc", "verify", "atm",
-        }),
+        "financial_count": sum(counts[w] for w in FINANCIAL_WORDS),
 
         # Reward/greed bait
-        "reward_count": sum(1 for w in words if w in {
-            "won", "winner", "prize", "lottery", "reward", "free",
-            "cashback", "gift", "bonus", "profit",
-        }),
+        "reward_count": sum(counts[w] for w in REWARD_WORDS),
 
         # URL presence
-        "has_url": 1 if re.search(r'https?://[^\s]+', text_lower) else 0,
+        "has_url": 1 if analysis.has_url else 0,
 
         # Phone number presence
-        "has_phone": 1 if re.search(r'[\+]?[0-9]{10,12}', text) else 0,
+        "has_phone": 1 if analysis.has_phone else 0,
 
         # UPI pattern presence
-        "has_upi": 1 if re.search(r'[a-zA-Z0-9._-]+@[a-zA-Z]+', text_lower) else 0,
+        "has_upi": 1 if analysis.has_upi else 0,
 
         # Exclamation marks (urgency signal)
         "exclamation_count": text.count("!"),
 
         # Caps ratio (shouting = urgency)
-        "caps_ratio": sum(1 for c in text if c.isupper()) / max(len(text), 1),
+        "caps_ratio": sum(map(str.isupper, text)) / max(len(text), 1),
 
         # Request action words
-        "action_count": sum(1 for w in words if w in {
-            "click", "call", "send", "share", "provide", "enter",
-            "download", "install", "pay", "submit",
-        }),
+        "action_count": sum(counts[w] for w in ACTION_WORDS),
     }
 
     return features
 
 
-def classify_text(text: str) -> Tuple[float, str, dict]:
+def classify_text(text: Union[str, MessageAnalysis]) -> Tuple[float, str, dict]:
     """
     Classify text using weighted feature scoring.
 
@@ -119,7 +127,7 @@ def classify_text(text: str) -> Tuple[float, str, dict]:
     return probability, predicted_type, features
 
 
-def ml_detect(text: str, conversation_history: List[dict] = None) -> Tuple[bool, float, str]:
+def ml_detect(text: Union[str, MessageAnalysis], conversation_history: List[dict] = None) -> Tuple[bool, float, str]:
     """
     Run ML detection on text.
     Returns: (is_scam: bool, confidence: float, predicted_type: str)
@@ -0,0 +1,317 @@
+"""
+Bulk Replay — stream archived scam conversations through the /analyze pipeline.
+
+Input:  NDJSON, one /analyze request body per line (sessionId, message,
+        optional conversationHistory). Add "final": true on a session's last
+        turn to free it immediately; otherwise it is freed when evicted or at EOF.
+Output: NDJSON, one {"line", "sessionId", "result"} record per turn as soon as
+        it completes, then a {"summary": {...}} record with turns/s.
+
+Memory stays bounded: input is read lazily, at most REPLAY_CONCURRENCY turns are
+in flight, and at most REPLAY_MAX_OPEN_SESSIONS replayed sessions are kept in
+session_manager — finished sessions are removed, never left for the cleanup thread.
+Turns of one session run in file order; different sessions overlap.
+
+Replayed sessions live under their own ids, replay:<run-id>:<sessionId>, so a
+replay never touches (removes, or marks as reported) a live session of the same
+id, nor another replay's; output records carry the archive's sessionId.
+
+CLI:
+    python src/replay.py archive.ndjson > results.ndjson            # in-process
+    python src/replay.py archive.ndjson --url http://localhost:8000  # via POST /analyze/replay
+"""
+import asyncio
+import json
+import logging
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict
+
+from config import REPLAY_CONCURRENCY, REPLAY_MAX_OPEN_SESSIONS
+from session_manager import session_manager
+
+logger = logging.getLogger(__name__)
+
+
+async def _iter_lines(chunks) -> AsyncIterator[bytes]:
+    """Re-split a (sync or async) stream of byte/str chunks into lines."""
+    buffer = b""
+
+    async def _chunks():
+        if hasattr(chunks, "__aiter__"):
+            async for chunk in chunks:
+                yield chunk
+        else:
+            for chunk in chunks:
+                yield chunk
+
+    async for chunk in _chunks():
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def replay_stream(
+    chunks,
+    process_turn: Callable[[dict], Awaitable[dict]],
+    concurrency: int = REPLAY_CONCURRENCY,
+    max_open_sessions: int = REPLAY_MAX_OPEN_SESSIONS,
+) -> AsyncIterator[dict]:
+    """
+    Replay NDJSON turns through process_turn (the /analyze pipeline).
+    Yields one record per turn as it completes, then a summary record.
+    """
+    started = time.perf_counter()
+    turns = errors = sessions_seen = 0
+    namespace = f"replay:{uuid.uuid4().hex[:12]}:"  # this run's session ids
+
+    in_flight: set = set()
+    session_tail: Dict[str, asyncio.Task] = {}    # last queued turn per session
+    pending: Dict[str, int] = {}                  # queued-but-unfinished turns per session
+    open_sessions: "OrderedDict[str, None]" = OrderedDict()  # LRU of live sessions
+    finished: set = set()                         # sessions to drop once drained
+
+    def release(sid: str):
+        session_manager.remove(namespace + sid)
+        session_tail.pop(sid, None)
+        pending.pop(sid, None)
+        open_sessions.pop(sid, None)
+        finished.discard(sid)
+
+    def finish(sid: str):
+        if pending.get(sid):
+            finished.add(sid)
+        else:
+            release(sid)
+
+    async def run_turn(line_no: int, sid: str, body: dict, previous) -> dict:
+        if previous is not None:
+            await asyncio.wait([previous])  # keep per-session order
+        key = namespace + sid
+        try:
+            result = await process_turn({**body, "sessionId": key})
+        except Exception as e:
+            logger.error(f"[REPLAY] line {line_no} ({sid}) failed: {e}")
+            return {"line": line_no, "sessionId": sid, "error": str(e)}
+        if isinstance(result, dict) and result.get("sessionId") == key:
+            result = {**result, "sessionId": sid}
+        session = session_manager.get(key)
+        if session:
+            # Archived conversation — never report it to GUVI from the cleanup thread
+            session.callback_sent = True
+            session_manager.save(session)
+        return {"line": line_no, "sessionId": sid, "result": result}
+
+    def collect(done) -> list:
+        nonlocal errors
+        records = []
+        for task in done:
+            in_flight.discard(task)
+            record = task.result()
+            if "error" in record:
+                errors += 1
+            sid = record["sessionId"]
+            if sid in pending:
+                pending[sid] -= 1
+                if pending[sid] == 0 and sid in finished:
+                    release(sid)
+            records.append(record)
+        records.sort(key=lambda r: r["line"])  # done is a set — keep file order within a batch
+        return records
+
+    line_no = 0
+    async for raw_line in _iter_lines(chunks):
+        line_no += 1
+        if not raw_line.strip():
+            continue
+        turns += 1
+        try:
+            body = json.loads(raw_line)
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            errors += 1
+            yield {"line": line_no, "sessionId": None, "error": "invalid JSON object"}
+            continue
+
+        sid = body.get("sessionId") or body.get("session_id") or "unknown"
+        if sid not in open_sessions:
+            sessions_seen += 1
+        open_sessions[sid] = None
+        open_sessions.move_to_end(sid)
+        finished.discard(sid)
+
+        task = asyncio.ensure_future(run_turn(line_no, sid, body, session_tail.get(sid)))
+        session_tail[sid] = task
+        pending[sid] = pending.get(sid, 0) + 1
+        in_flight.add(task)
+
+        if body.get("final"):
+            finish(sid)
+        while len(open_sessions) > max_open_sessions:
+            oldest = next(iter(open_sessions))
+            open_sessions.pop(oldest)
+            finish(oldest)
+
+        # Backpressure: stop reading input while the window is full
+        while len(in_flight) >= concurrency:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for record in collect(done):
+                yield record
+
+    while in_flight:
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for record in collect(done):
+            yield record
+    for sid in list(open_sessions) + list(finished):
+        release(sid)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "turns": turns,
+        "sessions": sessions_seen,
+        "errors": errors,
+        "elapsedSeconds": round(elapsed, 3),
+        "turnsPerSecond": round(turns / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    logger.info(f"[REPLAY] {summary}")
+    yield {"summary": summary}
+
+
+async def replay_spooled(
+    chunks,
+    process_turn: Callable[[dict], Awaitable[dict]],
+    read_size: int = 64 * 1024,
+) -> AsyncIterator[bytes]:
+    """
+    replay_stream() as NDJSON bytes for an HTTP response.
+
+    Most HTTP/1.1 clients (requests, curl) finish uploading before they read
+    the response. Yielding results straight from replay_stream() would then
+    block on a full socket and stop the upload — a deadlock. Here a producer
+    task keeps consuming the request and appends results to an on-disk spool,
+    while this generator streams the spool out as fast as the client reads it.
+    """
+    spool = tempfile.TemporaryFile()
+    written = 0
+    done = False
+    wake = asyncio.Event()
+
+    async def produce():
+        nonlocal written, done
+        try:
+            async for record in replay_stream(chunks, process_turn):
+                data = (json.dumps(record) + "\n").encode("utf-8")
+                spool.seek(0, 2)
+                spool.write(data)
+                written += len(data)
+                wake.set()
+        finally:
+            done = True
+            wake.set()
+
+    producer = asyncio.ensure_future(produce())
+    pos = 0
+    try:
+        while True:
+            if pos < written:
+                spool.seek(pos)
+                data = spool.read(min(read_size, written - pos))
+                pos += len(data)
+                yield data
+                continue
+            if done:
+                break
+            wake.clear()
+            await wake.wait()
+        await producer  # surface producer errors
+    finally:
+        producer.cancel()
+        spool.close()
+
+
+# ── CLI ────────────────────────────────────────────────────────────────
+
+def _print_summary(record: dict):
+    import sys
+    s = record["summary"]
+    print(
+        f"[REPLAY] {s['turns']} turns, {s['sessions']} sessions, {s['errors']} errors "
+        f"in {s['elapsedSeconds']}s — {s['turnsPerSecond']} turns/s",
+        file=sys.stderr,
+    )
+
+
+def _replay_local(path: str, out):
+    from main import _analyze_turn
+
+    logging.getLogger().setLevel(logging.WARNING)  # per-turn INFO logs dominate otherwise
+
+    async def run():
+        with open(path, "rb") as f:
+            async for record in replay_stream(f, lambda body: _analyze_turn(body, send_callback=False)):
+                out.write(json.dumps(record) + "\n")
+                if "summary" in record:
+                    _print_summary(record)
+
+    asyncio.run(run())
+
+
+def _replay_remote(path: str, out, url: str, api_key: str):
+    """Stream the file to a running server's POST /analyze/replay."""
+    import requests
+
+    def body():
+        with open(path, "rb") as f:
+            for line in f:
+                yield line
+
+    with requests.post(
+        f"{url.rstrip('/')}/analyze/replay",
+        data=body(),
+        headers={"x-api-key": api_key, "Content-Type": "application/x-ndjson"},
+        stream=True,
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            out.write(line.decode("utf-8") + "\n")
+            record = json.loads(line)
+            if "summary" in record:
+                _print_summary(record)
+
+
+def main():
+    import argparse
+    import sys
+
+    from config import MY_API_KEY
+
+    parser = argparse.ArgumentParser(description="Replay archived NDJSON conversations through the honeypot pipeline")
+    parser.add_argument("input", help="NDJSON file, one /analyze request body per line")
+    parser.add_argument("-o", "--output", help="write NDJSON results here (default: stdout)")
+    parser.add_argument("--url", help="stream to a running server's /analyze/replay instead of in-process")
+    parser.add_argument("--api-key", default=MY_API_KEY)
+    args = parser.parse_args()
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.url:
+            _replay_remote(args.input, out, args.url, args.api_key)
+        else:
+            _replay_local(args.input, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-import re
 import math
-from typing import List, Tuple, Dict, Set
+from typing import List, Tuple, Dict, Set, Union
+
+from message_analysis import MessageAnalysis, analyze, register_terms
 
 # ── Scam indicator keyword lists ───────────────────────────────────────
 
@@ -63,6 +64,13 @@ CATEGORY_NAMES = {
     "social_engineering": SOCIAL_ENGINEERING_KEYWORDS,
 }
 
+# Term groups in the shared MessageAnalysis automaton — one linear pass per text,
+# however long the lists grow
+CATEGORY_GROUPS = {
+    category_name: register_terms(f"scam.{category_name}", keyword_list)
+    for category_name, keyword_list in CATEGORY_NAMES.items()
+}
+
 CATEGORY_SCORES = {
     "urgency": 2,
     "threat": 3,
@@ -88,38 +96,65 @@ COMBO_BONUSES = {
 }
 
 
-def detect_scam(text: str, conversation_history: List[dict] = None) -> Tuple[bool, List[str], int]:
+def history_score(history_keywords: Set[str]) -> int:
+    """
+    Score the conversation-history boost from keywords already seen in history.
+    Keywords can be accumulated turn by turn, so history is never re-scanned.
+    """
+    score = 0
+    financial_mentions = sum(1 for kw in FINANCIAL_KEYWORDS if kw in history_keywords)
+    if financial_mentions >= 2:
+        score += 2
+    # Cross-category history boost
+    history_categories = set()
+    for cat_name, kw_list in CATEGORY_NAMES.items():
+        if any(kw in history_keywords for kw in kw_list):
+            history_categories.add(cat_name)
+    if len(history_categories) >= 3:
+        score += 3
+    elif len(history_categories) >= 2:
+        score += 2
+    return score
+
+
+def detect_scam(text: Union[str, MessageAnalysis], conversation_history: List[dict] = None,
+                history_keywords: Set[str] = None,
+                whole_words: bool = False) -> Tuple[bool, List[str], int]:
     """
     Analyze text for scam indicators with combo scoring.
     Returns (is_scam, list_of_detected_keywords, scam_score).
     Threshold = 1 (aggressive — all eval scenarios are scams).
+
+    history_keywords: keywords already detected in the conversation history
+    (accumulated per session). When given, conversation_history is not re-scanned.
+    whole_words: only count keywords on word boundaries ("fir" no longer hits "first").
     """
-    text_lower = text.lower()
+    analysis = analyze(text)
     detected_keywords = []
     scam_score = 0
     categories_hit: Dict[str, List[str]] = {}
 
-    # Check each category
-    for category_name, keyword_list in CATEGORY_NAMES.items():
-        for keyword in keyword_list:
-            if keyword in text_lower:
-                detected_keywords.append(keyword)
-                scam_score += CATEGORY_SCORES[category_name]
-                categories_hit.setdefault(category_name, []).append(keyword)
+    # Check each category — hits come from the shared single-pass scan
+    for category_name, group in CATEGORY_GROUPS.items():
+        keywords = analysis.terms(group, whole_words)
+        if keywords:
+            detected_keywords.extend(keywords)
+            scam_score += CATEGORY_SCORES[category_name] * len(keywords)
+            categories_hit[category_name] = list(keywords)
 
     # Check for URLs
-    if re.search(r'https?://[^\s]+', text_lower):
+    if analysis.has_url:
         detected_keywords.append("contains_url")
         scam_score += 2
         categories_hit.setdefault("action", []).append("contains_url")
 
     # Check for phone numbers
-    if re.search(r'[\+]?[0-9]{10,12}', text):
+    if analysis.has_phone:
         detected_keywords.append("contains_phone")
         scam_score += 1
 
     # Check for UPI patterns
-    if re.search(r'[a-zA-Z0-9._-]+@[a-zA-Z]+', text_lower):
+    if analysis.has_upi:
         detected_keywords.append("contains_upi")
         scam_score += 2
         categories_hit.setdefault("financial", []).append("contains_upi")
@@ -131,26 +166,26 @@ def detect_scam(text: str, conversation_history: List[dict] = None) -> Tuple[boo
             scam_score += bonus
 
     # Analyze conversation history
-    if conversation_history:
-        history_text = " ".join([msg.get("text", "") for msg in conversation_history]).lower()
-        financial_mentions = sum(1 for kw in FINANCIAL_KEYWORDS if kw in history_text)
-        if financial_mentions >= 2:
-            scam_score += 2
-        # Cross-category history boost
-        history_categories = set()
-        for cat_name, kw_list in CATEGORY_NAMES.items():
-            if any(kw in history_text for kw in kw_list):
-                history_categories.add(cat_name)
-        if len(history_categories) >= 3:
-            scam_score += 3
-        elif len(history_categories) >= 2:
-            scam_score += 2
+    if history_keywords is None and conversation_history:
+        history_text = " ".join([msg.get("text", "") for msg in conversation_history])
+        _, history_hits, _ = detect_scam(history_text, whole_words=whole_words)
+        history_keywords = set(history_hits)
+    if history_keywords:
+        scam_score += history_score(history_keywords)
 
     # Threshold = 1 (aggressive)
     is_scam = scam_score >= 1
     return is_scam, list(set(detected_keywords)), scam_score
 
 
+# Every label get_scam_type can return, in its priority order
+SCAM_TYPES = (
+    "OTP_FRAUD", "LOTTERY_SCAM", "INVESTMENT_SCAM", "JOB_SCAM", "INSURANCE_SCAM",
+    "TAX_SCAM", "CUSTOMS_SCAM", "ELECTRICITY_SCAM", "REFUND_SCAM", "ACCOUNT_THREAT",
+    "PHISHING", "UPI_FRAUD", "KYC_FRAUD", "BANK_FRAUD", "GOVT_SCAM", "GENERAL_FRAUD",
+)
+
+
 def get_scam_type(keywords: List[str]) -> str:
     """Determine the type of scam based on detected keywords.
     Priority order: specific indicators first, generic ones last.
@@ -220,12 +255,12 @@ def calculate_confidence(scam_score: int, keyword_count: int,
     return round(max(0.05, min(0.99, confidence)), 3)
 
 
-def extract_suspicious_keywords(text: str) -> List[str]:
+def extract_suspicious_keywords(text: Union[str, MessageAnalysis], whole_words: bool = False) -> List[str]:
     """Extract the most relevant suspicious keywords from text for the intelligence report."""
-    text_lower = text.lower()
+    analysis = analyze(text)
     found = []
-    for category_name, keyword_list in CATEGORY_NAMES.items():
-        for keyword in keyword_list:
-            if keyword in text_lower and keyword not in found:
+    for group in CATEGORY_GROUPS.values():
+        for keyword in analysis.terms(group, whole_words):
+            if keyword not in found:
                 found.append(keyword)
     return found[:15]  # Cap at 15 most relevant
@@ -1,6 +1,12 @@
 import time
-from typing import Dict, Optional, List
+import hashlib
+import json
+import zlib
+from typing import Optional, List, Set, Union
 from models import ExtractedIntelligence, BehavioralIntelligence
+from message_analysis import MessageAnalysis, analyze, register_terms
+from config import SESSION_TTL_SECONDS
+from session_store import create_session_store
 import logging
 from datetime import datetime
 
@@ -9,6 +15,31 @@ logger = logging.getLogger(__name__)
 # Each conversation turn realistically takes ~20s (human reading + thinking + typing)
 REALISTIC_SECONDS_PER_TURN = 20
 
+# Intelligence fields an SLM result's missed_entities can add to
+SLM_ENTITY_FIELDS = ("phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks")
+
+# Behavioral cues — term groups in the shared MessageAnalysis scan
+_MANIPULATION_GROUPS = [
+    (m_type, register_terms(f"session.manipulation.{m_type}", terms))
+    for m_type, terms in [
+        ("urgency", ["urgent", "immediately", "now", "fast", "hurry"]),
+        ("fear", ["blocked", "suspended", "arrest", "police", "legal", "court"]),
+        ("authority", ["official", "government", "rbi", "officer", "inspector"]),
+        ("greed", ["won", "prize", "reward", "profit", "returns", "free"]),
+        ("credential_theft", ["otp", "pin", "cvv", "password"]),
+        ("impersonation", ["kyc", "verify", "update"]),
+    ]
+]
+_ESCALATION_GROUPS = [
+    (register_terms(f"session.escalation.{i}", terms), weight)
+    for i, (terms, weight) in enumerate([
+        (["final", "last", "warning"], 0.3),
+        (["arrest", "police", "jail", "court"], 0.4),
+        (["immediately", "now", "2 hours", "within"], 0.2),
+        (["won't", "cannot", "impossible", "too late"], 0.1),
+    ])
+]
+
 
 class SessionData:
     """Single source of truth for all session state."""
@@ -28,12 +59,25 @@ class SessionData:
         self.created_at = datetime.now()
         self.last_activity = datetime.now()
         self.start_time = time.time()
+        self.last_slm_at = 0.0  # time.time() of the last SLM call (slm_gate cooldown)
+        # Deferred SLM (SLM_DEFERRED): merged after the turn, shown on the next one
+        self.slm_insight = ""
+        self.slm_reply_candidate = ""
+        self.slm_reply_turn = 0  # turn the candidate reply was generated for
 
         # Message tracking
         self._turn_count = 0
         self._history_message_count = 0  # from conversationHistory
         self._history_duration = 0  # seconds from GUVI conversation timestamps
 
+        # === Incremental history: only the unseen suffix is processed per turn ===
+        self.conversation_history: List[dict] = []  # normalized history absorbed so far
+        self.history_keywords: Set[str] = set()     # detect_scam keywords seen in history
+        self._history_cursor = 0                    # raw history items already absorbed
+        self._history_digest = ""                   # rolling digest of the absorbed items
+        self._history_ts_min: Optional[int] = None
+        self._history_ts_max: Optional[int] = None
+
         # === NEW: Response deduplication ===
         self.previous_replies: List[str] = []
 
@@ -65,10 +109,74 @@ class SessionData:
         if total > self._history_message_count:
             self._history_message_count = total
 
+    @staticmethod
+    def _history_item_digest(item) -> str:
+        """Short fingerprint of one raw history item (sender + text + timestamp)."""
+        if not isinstance(item, dict):
+            return repr(item)
+        key = "\x1f".join(str(item.get(k, "")) for k in
+                           ("sender", "role", "text", "content", "timestamp"))
+        return hashlib.blake2b(key.encode("utf-8", "replace"), digest_size=8).hexdigest()
+
+    @classmethod
+    def _history_chain(cls, raw_items: list, digest: str = "") -> str:
+        """Rolling digest: each item's digest is hashed into the one before it."""
+        for item in raw_items:
+            link = (digest + cls._history_item_digest(item)).encode("utf-8", "replace")
+            digest = hashlib.blake2b(link, digest_size=8).hexdigest()
+        return digest
+
+    def _reset_history(self):
+        """Forget everything derived from conversationHistory (client history diverged)."""
+        self.conversation_history = []
+        self.history_keywords = set()
+        self._history_cursor = 0
+        self._history_digest = ""
+        self._history_ts_min = None
+        self._history_ts_max = None
+
+    def sync_history(self, raw_history: list) -> List[dict]:
+        """
+        Absorb conversationHistory incrementally and return ONLY the new items.
+
+        GUVI-style clients resend the full history every turn. We keep a cursor
+        plus a rolling digest of the absorbed prefix (every item chained in);
+        if the resent history still starts with that prefix, only the suffix is
+        normalized, timed and returned for extraction/detection. If it diverged
+        (shorter, rewritten, new conversation) the history state is reset and
+        the whole history is returned for a full rescan.
+        """
+        cursor = self._history_cursor
+        if cursor:
+            if len(raw_history) < cursor or self._history_chain(raw_history[:cursor]) != self._history_digest:
+                logger.info(f"Session {self.session_id}: history diverged — full rescan")
+                self._reset_history()
+                cursor = 0
+
+        new_raw = raw_history[cursor:]
+        if not new_raw:
+            return []
+
+        new_items = []
+        for item in new_raw:
+            if isinstance(item, dict):
+                new_items.append({
+                    "sender": item.get("sender", item.get("role", "")),
+                    "text": item.get("text", item.get("content", "")),
+                    "timestamp": item.get("timestamp", 0),
+                })
+        self.conversation_history.extend(new_items)
+        self.update_duration_from_history(new_raw)
+
+        self._history_cursor = len(raw_history)
+        self._history_digest = self._history_chain(new_raw, self._history_digest)
+        return new_items
+
     def update_duration_from_history(self, raw_history: list):
         """
         Calculate REAL engagement duration from GUVI's conversation timestamps.
         Finds the time span between the earliest and latest message timestamps.
+        The span is accumulated, so callers only pass history items not seen before.
         """
         timestamps = []
         for item in raw_history:
@@ -95,10 +203,16 @@ class SessionData:
                 except Exception:
                     pass
 
-        if len(timestamps) >= 2:
-            duration = max(timestamps) - min(timestamps)
-            if duration > self._history_duration:
-                self._history_duration = duration
+        if not timestamps:
+            return
+        if self._history_ts_min is not None:
+            timestamps.extend((self._history_ts_min, self._history_ts_max))
+        self._history_ts_min = min(timestamps)
+        self._history_ts_max = max(timestamps)
+
+        duration = self._history_ts_max - self._history_ts_min
+        if duration > self._history_duration:
+            self._history_duration = duration
 
     def get_engagement_metrics(self) -> dict:
         """
@@ -213,38 +327,20 @@ class SessionData:
         if question and question not in self._probing_questions:
             self._probing_questions.append(question)
 
-    def track_manipulation(self, message_text: str):
+    def track_manipulation(self, message_text: Union[str, MessageAnalysis]):
         """Detect and track manipulation types from scammer's message."""
-        t = message_text.lower()
-        types = []
-        if any(w in t for w in ["urgent", "immediately", "now", "fast", "hurry"]):
-            types.append("urgency")
-        if any(w in t for w in ["blocked", "suspended", "arrest", "police", "legal", "court"]):
-            types.append("fear")
-        if any(w in t for w in ["official", "government", "rbi", "officer", "inspector"]):
-            types.append("authority")
-        if any(w in t for w in ["won", "prize", "reward", "profit", "returns", "free"]):
-            types.append("greed")
-        if any(w in t for w in ["otp", "pin", "cvv", "password"]):
-            types.append("credential_theft")
-        if any(w in t for w in ["kyc", "verify", "update"]):
-            types.append("impersonation")
-        for m_type in types:
-            if m_type not in self._manipulation_types:
+        analysis = analyze(message_text)
+        for m_type, group in _MANIPULATION_GROUPS:
+            if analysis.has(group) and m_type not in self._manipulation_types:
                 self._manipulation_types.append(m_type)
 
-    def track_escalation(self, message_text: str):
+    def track_escalation(self, message_text: Union[str, MessageAnalysis]):
         """Score escalation level of current message."""
-        t = message_text.lower()
+        analysis = analyze(message_text)
         score = 0.0
-        if any(w in t for w in ["final", "last", "warning"]):
-            score += 0.3
-        if any(w in t for w in ["arrest", "police", "jail", "court"]):
-            score += 0.4
-        if any(w in t for w in ["immediately", "now", "2 hours", "within"]):
-            score += 0.2
-        if any(w in t for w in ["won't", "cannot", "impossible", "too late"]):
-            score += 0.1
+        for group, weight in _ESCALATION_GROUPS:
+            if analysis.has(group):
+                score += weight
         self._escalation_scores.append(min(score, 1.0))
 
     def get_escalation_pattern(self) -> str:
@@ -310,16 +406,95 @@ class SessionData:
                 len(i.phishingLinks) + len(i.emailAddresses) +
                 len(i.caseIds) + len(i.policyNumbers) + len(i.orderNumbers))
 
+    # ── Serialization (shared session stores) ──────────────────────────
+    # Only attributes that differ from a fresh SessionData are written, as
+    # compact JSON; blobs over _COMPRESS_OVER bytes (long histories) are zlib'd.
+    # First byte is the format tag, so the codec can change without a migration.
+
+    _FORMAT_JSON = b"j"
+    _FORMAT_ZLIB = b"z"
+    _COMPRESS_OVER = 512
+
+    @staticmethod
+    def _encode_value(name: str, value):
+        if name == "intelligence":
+            return value.model_dump(exclude_defaults=True)
+        if isinstance(value, datetime):
+            return value.timestamp()
+        if isinstance(value, set):
+            return sorted(value)
+        if isinstance(value, tuple):
+            return list(value)
+        return value
+
+    @staticmethod
+    def _decode_value(name: str, value):
+        if name == "intelligence":
+            return ExtractedIntelligence(**value)
+        if name in ("created_at", "last_activity"):
+            return datetime.fromtimestamp(value)
+        if name == "history_keywords":
+            return set(value)
+        return value
+
+    def to_state(self) -> dict:
+        """JSON-safe dict of the attributes that differ from a new session."""
+        defaults = _fresh_state()
+        state = {}
+        for name, value in vars(self).items():
+            encoded = self._encode_value(name, value)
+            if name not in defaults or defaults[name] != encoded:
+                state[name] = encoded
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SessionData":
+        session = cls(state["session_id"])
+        for name, value in state.items():
+            setattr(session, name, cls._decode_value(name, value))
+        return session
+
+    def to_bytes(self) -> bytes:
+        data = json.dumps(self.to_state(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        if len(data) > self._COMPRESS_OVER:
+            return self._FORMAT_ZLIB + zlib.compress(data, 1)
+        return self._FORMAT_JSON + data
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "SessionData":
+        tag, data = blob[:1], blob[1:]
+        if tag == cls._FORMAT_ZLIB:
+            data = zlib.decompress(data)
+        elif tag != cls._FORMAT_JSON:
+            raise ValueError(f"unknown session format {tag!r}")
+        return cls.from_state(json.loads(data))
+
+
+_FRESH_STATE: Optional[dict] = None
+
+
+def _fresh_state() -> dict:
+    """Encoded attributes of a brand-new SessionData (timestamps excluded)."""
+    global _FRESH_STATE
+    if _FRESH_STATE is None:
+        fresh = SessionData("")
+        _FRESH_STATE = {
+            name: SessionData._encode_value(name, value)
+            for name, value in vars(fresh).items()
+            if name not in ("session_id", "created_at", "last_activity", "start_time")
+        }
+    return _FRESH_STATE
+
 
 class SessionManager:
-    """Manages all active sessions. Singleton."""
+    """Manages all active sessions through the configured SessionStore. Singleton."""
 
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.sessions: Dict[str, SessionData] = {}
+            cls._instance.store = create_session_store()
             cls._instance._start_cleanup()
         return cls._instance
 
@@ -337,30 +512,142 @@ class SessionManager:
         threading.Thread(target=cleanup_worker, daemon=True).start()
 
     def _cleanup_stale_sessions(self):
-        from guvi_callback import send_callback_to_guvi
+        from guvi_callback import send_callback_async
 
         now = datetime.now()
-        for sid in list(self.sessions.keys()):
-            session = self.sessions.get(sid)
-            if not session:
-                continue
+        for session in self.store.idle_sessions(300):
+            sid = session.session_id
             elapsed = (now - session.last_activity).total_seconds()
             # 5 min timeout: send final callback if not sent
             if elapsed > 300 and session.scam_detected and not session.callback_sent:
                 logger.info(f"Session {sid} timed out. Sending final callback.")
-                send_callback_to_guvi(session)
+                self.apply_deferred(session)  # the last turn's background SLM result
+                # Mark first so other workers sharing the store skip it
                 session.callback_sent = True
-            # 1 hour: delete session
-            if elapsed > 3600:
-                del self.sessions[sid]
+                self.save(session)
+                send_callback_async(session)  # queued — the cleanup pass never waits on GUVI
+            # Idle past the TTL: delete session
+            if elapsed > SESSION_TTL_SECONDS:
+                self.store.delete(sid)
 
     def get_or_create(self, session_id: str) -> SessionData:
-        if session_id not in self.sessions:
-            self.sessions[session_id] = SessionData(session_id)
-        return self.sessions[session_id]
+        session = self.get(session_id)
+        if session is None:
+            session = SessionData(session_id)
+            self.save(session)
+        return session
 
     def get(self, session_id: str) -> Optional[SessionData]:
-        return self.sessions.get(session_id)
+        try:
+            return self.store.load(session_id)
+        except Exception as e:
+            logger.error(f"[SESSIONS] load {session_id} failed: {e}")
+            return None
+
+    def save(self, session: SessionData):
+        """Write the session back after a turn (a no-op copy for the memory store)."""
+        try:
+            self.store.save(session)
+        except Exception as e:
+            logger.error(f"[SESSIONS] save {session.session_id} failed: {e}")
+
+    def remove(self, session_id: str):
+        """Drop a finished session (e.g. after an archive replay)."""
+        try:
+            self.store.delete(session_id)
+        except Exception as e:
+            logger.error(f"[SESSIONS] delete {session_id} failed: {e}")
+
+    # ── SLM results ────────────────────────────────────────────────────
+
+    @staticmethod
+    def merge_slm_result(session: SessionData, slm_result: dict) -> bool:
+        """Merge SLM confidence, scam type and missed entities into the session. True if the scam type changed."""
+        session_id = session.session_id
+        # Merge confidence: take the higher
+        slm_conf = slm_result.get("refined_confidence", 0.0)
+        if slm_conf > session.confidence_level:
+            session.confidence_level = slm_conf
+            logger.info(f"[{session_id}] SLM boosted confidence → {slm_conf:.2f}")
+
+        # Merge scam type if SLM found a better one
+        type_changed = False
+        slm_type = slm_result.get("refined_scam_type", "")
+        if slm_type and slm_type != "UNKNOWN" and (not session.scam_type or session.scam_type == "GENERAL_FRAUD"):
+            session.scam_type = slm_type
+            type_changed = True
+
+        # Merge missed entities into session intelligence
+        missed = slm_result.get("missed_entities", {})
+        for field in SLM_ENTITY_FIELDS:
+            new_vals = missed.get(field, [])
+            if new_vals:
+                existing = getattr(session.intelligence, field)
+                for v in new_vals:
+                    if v and v not in existing:
+                        existing.append(v)
+                logger.info(f"[{session_id}] SLM added {len(new_vals)} {field}")
+        return type_changed
+
+    def apply_deferred(self, session: SessionData) -> int:
+        """
+        Merge the session's queued deferred SLM results into it (the caller saves
+        it): at the start of a turn, and before a timeout or forced callback so the
+        last turn's result is not lost. Returns how many were merged.
+        """
+        records = self.pop_deferred(session.session_id)
+        for record in records:
+            turn, slm_result = record["turn"], record["result"]
+            self.merge_slm_result(session, slm_result)
+            slm_reply = slm_result.get("refined_reply") or ""
+            if len(slm_reply) > 15:
+                session.slm_reply_candidate, session.slm_reply_turn = slm_reply, turn
+            insight = slm_result.get("insight") or ""
+            if insight:
+                session.slm_insight = insight
+                session.add_note(f"SLM (turn {turn}): {insight}")  # reaches the next callback's agentNotes
+                if session._last_rich_notes:  # a callback before the next turn rebuilds them
+                    session._last_rich_notes += f" | SLM Insight: {insight}"
+            logger.info(f"[{session.session_id}] Deferred SLM result for turn {turn} merged")
+        return len(records)
+
+    # ── Deferred SLM results (see session_store.py) ───────────────────
+
+    def claim_deferred(self, session_id: str, ttl_seconds: float) -> bool:
+        """True if this caller may start the session's deferred SLM call (none in flight in any worker)."""
+        try:
+            return self.store.claim_deferred(session_id, ttl_seconds)
+        except Exception as e:
+            logger.error(f"[SESSIONS] claim deferred {session_id} failed: {e}")
+            return False
+
+    def deferred_claimed(self, session_id: str) -> bool:
+        try:
+            return self.store.deferred_claimed(session_id)
+        except Exception as e:
+            logger.error(f"[SESSIONS] deferred check {session_id} failed: {e}")
+            return True  # can't tell — don't start another call
+
+    def release_deferred(self, session_id: str):
+        try:
+            self.store.release_deferred(session_id)
+        except Exception as e:
+            logger.error(f"[SESSIONS] release deferred {session_id} failed: {e}")
+
+    def push_deferred(self, session_id: str, record: dict):
+        """Queue a deferred SLM result (JSON-safe dict) for the session's next turn."""
+        try:
+            self.store.push_deferred(session_id, json.dumps(record, separators=(",", ":")).encode("utf-8"))
+        except Exception as e:
+            logger.error(f"[SESSIONS] push deferred {session_id} failed: {e}")
+
+    def pop_deferred(self, session_id: str) -> List[dict]:
+        """Every queued deferred result of the session, oldest first ([] on errors)."""
+        try:
+            return [json.loads(blob) for blob in self.store.pop_deferred(session_id)]
+        except Exception as e:
+            logger.error(f"[SESSIONS] pop deferred {session_id} failed: {e}")
+            return []
 
 
 # Global singleton
@@ -0,0 +1,427 @@
+"""
+Session Stores — where SessionManager keeps SessionData between turns.
+
+    memory  (default) process-local dict of live objects — one uvicorn worker
+    sqlite  WAL-mode SQLite file shared by every worker process on one host
+    redis   any Redis-protocol server (Redis, Valkey, KeyDB, ...) shared across hosts
+
+Shared backends hold SessionData.to_bytes() blobs: get_or_create() loads a
+fresh copy for the turn and the turn ends with session_manager.save(session).
+Concurrent turns of the SAME session in different workers are last-writer-wins
+(GUVI waits for each reply before sending the next turn).
+
+Deferred SLM results (SLM_DEFERRED) never write the session itself: they are
+pushed to a per-session list that the next turn pops and merges inside its own
+load → save, and the at-most-one-call-per-session marker is a claim with a TTL
+— both kept in the store, so every worker sees them.
+
+Selected with SESSION_STORE; see config.py for the backend settings.
+"""
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import unquote, urlparse
+
+from config import SESSION_STORE, SESSION_SQLITE_PATH, SESSION_REDIS_URL, SESSION_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(blob: bytes):
+    from session_manager import SessionData
+    return SessionData.from_bytes(blob)
+
+
+class SessionStore:
+    """Interface: SessionData by session id."""
+
+    name = "base"
+    shared = False  # True when other processes see this store's writes
+    fallback_from: Optional[str] = None  # configured shared backend that could not be opened
+
+    def load(self, session_id: str):
+        raise NotImplementedError
+
+    def save(self, session):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def session_ids(self) -> List[str]:
+        raise NotImplementedError
+
+    def claim_deferred(self, session_id: str, ttl_seconds: float) -> bool:
+        """Mark a deferred SLM call in flight for the session; False if one already is."""
+        raise NotImplementedError
+
+    def deferred_claimed(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def release_deferred(self, session_id: str):
+        raise NotImplementedError
+
+    def push_deferred(self, session_id: str, blob: bytes):
+        """Queue a deferred SLM result for the session's next turn."""
+        raise NotImplementedError
+
+    def pop_deferred(self, session_id: str) -> List[bytes]:
+        """Take every queued deferred result of the session, oldest first."""
+        raise NotImplementedError
+
+    def idle_sessions(self, idle_seconds: float) -> Iterator:
+        """Sessions with no activity in the last idle_seconds (cleanup thread)."""
+        cutoff = time.time() - idle_seconds
+        for session_id in self.session_ids():
+            session = self.load(session_id)
+            if session is not None and session.last_activity.timestamp() < cutoff:
+                yield session
+
+    def __len__(self) -> int:
+        return len(self.session_ids())
+
+    def close(self):
+        pass
+
+
+# ── In-memory ──────────────────────────────────────────────────────────
+
+class InMemorySessionStore(SessionStore):
+    """Live SessionData objects in a dict — load() returns the same object every turn."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._sessions: Dict[str, object] = {}
+        self._claims: Dict[str, float] = {}  # session_id → claim expiry (time.time())
+        self._pending: Dict[str, List[bytes]] = {}
+
+    def load(self, session_id: str):
+        return self._sessions.get(session_id)
+
+    def save(self, session):
+        self._sessions[session.session_id] = session
+
+    def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    def session_ids(self) -> List[str]:
+        return list(self._sessions)
+
+    def claim_deferred(self, session_id: str, ttl_seconds: float) -> bool:
+        if self.deferred_claimed(session_id):
+            return False
+        self._claims[session_id] = time.time() + ttl_seconds
+        return True
+
+    def deferred_claimed(self, session_id: str) -> bool:
+        return self._claims.get(session_id, 0.0) > time.time()
+
+    def release_deferred(self, session_id: str):
+        self._claims.pop(session_id, None)
+
+    def push_deferred(self, session_id: str, blob: bytes):
+        self._pending.setdefault(session_id, []).append(blob)
+
+    def pop_deferred(self, session_id: str) -> List[bytes]:
+        return self._pending.pop(session_id, [])
+
+    def idle_sessions(self, idle_seconds: float) -> Iterator:
+        cutoff = time.time() - idle_seconds
+        for session in list(self._sessions.values()):
+            if session.last_activity.timestamp() < cutoff:
+                yield session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# ── SQLite (WAL) ───────────────────────────────────────────────────────
+
+class SQLiteSessionStore(SessionStore):
+    """
+    One row per session in a WAL-mode SQLite file. WAL lets every worker read
+    while one writes; each thread gets its own connection.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str = SESSION_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " last_activity REAL NOT NULL,"
+            " data BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions (last_activity)")
+        conn.execute("CREATE TABLE IF NOT EXISTS deferred_claims (id TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS deferred_results ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT NOT NULL,"
+            " data BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS deferred_results_id ON deferred_results (id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; fine for session state
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str):
+        row = self._conn().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def save(self, session):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (id, last_activity, data) VALUES (?, ?, ?)",
+            (session.session_id, session.last_activity.timestamp(), session.to_bytes()),
+        )
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        conn.execute("DELETE FROM deferred_results WHERE id = ?", (session_id,))
+
+    def session_ids(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT id FROM sessions")]
+
+    def claim_deferred(self, session_id: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(  # one statement: insert, or take over an expired claim
+            "INSERT INTO deferred_claims (id, expires) VALUES (?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET expires = excluded.expires WHERE deferred_claims.expires < ?",
+            (session_id, now + ttl_seconds, now),
+        )
+        return cursor.rowcount == 1
+
+    def deferred_claimed(self, session_id: str) -> bool:
+        row = self._conn().execute("SELECT expires FROM deferred_claims WHERE id = ?", (session_id,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def release_deferred(self, session_id: str):
+        self._conn().execute("DELETE FROM deferred_claims WHERE id = ?", (session_id,))
+
+    def push_deferred(self, session_id: str, blob: bytes):
+        self._conn().execute("INSERT INTO deferred_results (id, data) VALUES (?, ?)", (session_id, blob))
+
+    def pop_deferred(self, session_id: str) -> List[bytes]:
+        rows = self._conn().execute(
+            "DELETE FROM deferred_results WHERE id = ? RETURNING seq, data", (session_id,),
+        ).fetchall()
+        return [blob for _, blob in sorted(rows)]
+
+    def idle_sessions(self, idle_seconds: float) -> Iterator:
+        cutoff = time.time() - idle_seconds
+        rows = self._conn().execute("SELECT data FROM sessions WHERE last_activity < ?", (cutoff,)).fetchall()
+        for (blob,) in rows:
+            yield _decode(blob)
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ── Redis protocol ─────────────────────────────────────────────────────
+
+class RedisProtocolError(Exception):
+    """Error reply (-ERR ...) from the server."""
+
+
+class RESPConnection:
+    """Minimal RESP2 client — just what the session store needs, no redis package."""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        path = (parsed.path or "").lstrip("/")
+        self.db = int(path) if path else 0
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            auth = ("AUTH", self.username, self.password) if self.username else ("AUTH", self.password)
+            self._roundtrip(auth)
+        if self.db:
+            self._roundtrip(("SELECT", self.db))
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif not isinstance(arg, bytes):
+                arg = str(arg).encode("ascii")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisProtocolError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("connection closed by server")
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"bad RESP reply type {kind!r}")
+
+    def _roundtrip(self, args):
+        self._sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """Send one command and return its reply; reconnects once on a dropped connection."""
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(args)
+                except (ConnectionError, OSError):
+                    self.close()
+                    if attempt == 2:
+                        raise
+
+
+class RedisSessionStore(SessionStore):
+    """
+    One key per session on a Redis-protocol server. Keys carry a TTL of
+    SESSION_TTL_SECONDS, so abandoned sessions expire server-side.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = SESSION_REDIS_URL, prefix: str = "sentinal:session:",
+                 ttl_seconds: int = SESSION_TTL_SECONDS, deferred_prefix: str = "sentinal:deferred:"):
+        self.conn = RESPConnection(url)
+        self.prefix = prefix
+        self.deferred_prefix = deferred_prefix  # outside prefix, so session_ids() never lists these keys
+        self.ttl_seconds = ttl_seconds
+        self.conn.execute("PING")
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def load(self, session_id: str):
+        blob = self.conn.execute("GET", self._key(session_id))
+        return _decode(blob) if blob is not None else None
+
+    def save(self, session):
+        self.conn.execute("SET", self._key(session.session_id), session.to_bytes(), "EX", self.ttl_seconds)
+
+    def delete(self, session_id: str):
+        self.conn.execute("DEL", self._key(session_id))
+        self.conn.execute("DEL", self.deferred_prefix + "results:" + session_id)
+
+    def session_ids(self) -> List[str]:
+        ids, cursor = [], "0"
+        while True:
+            cursor, keys = self.conn.execute("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            ids.extend(key.decode("utf-8")[len(self.prefix):] for key in keys)
+            cursor = cursor.decode("ascii") if isinstance(cursor, bytes) else str(cursor)
+            if cursor == "0":
+                return ids
+
+    def claim_deferred(self, session_id: str, ttl_seconds: float) -> bool:
+        key = self.deferred_prefix + "claim:" + session_id
+        return self.conn.execute("SET", key, "1", "NX", "EX", max(1, int(ttl_seconds))) is not None
+
+    def deferred_claimed(self, session_id: str) -> bool:
+        return bool(self.conn.execute("EXISTS", self.deferred_prefix + "claim:" + session_id))
+
+    def release_deferred(self, session_id: str):
+        self.conn.execute("DEL", self.deferred_prefix + "claim:" + session_id)
+
+    def push_deferred(self, session_id: str, blob: bytes):
+        key = self.deferred_prefix + "results:" + session_id
+        self.conn.execute("RPUSH", key, blob)
+        self.conn.execute("EXPIRE", key, self.ttl_seconds)
+
+    def pop_deferred(self, session_id: str) -> List[bytes]:
+        key, blobs = self.deferred_prefix + "results:" + session_id, []
+        while True:  # LPOP one at a time: each is atomic, so two workers never take the same result
+            blob = self.conn.execute("LPOP", key)
+            if blob is None:
+                return blobs
+            blobs.append(blob)
+
+    def close(self):
+        self.conn.close()
+
+
+# ── Factory ────────────────────────────────────────────────────────────
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    """
+    Build the configured backend. An unreachable shared backend falls back to
+    memory with fallback_from set: /ready then reports 503, since workers would
+    each keep private sessions.
+    """
+    kind = (kind or "memory").lower()
+    try:
+        if kind == "sqlite":
+            store = SQLiteSessionStore()
+        elif kind == "redis":
+            store = RedisSessionStore()
+        else:
+            if kind != "memory":
+                logger.warning(f"[SESSIONS] Unknown SESSION_STORE={kind!r} — using memory")
+            store = InMemorySessionStore()
+    except Exception as e:
+        logger.error(f"[SESSIONS] {kind} store unavailable ({e}) — falling back to memory, NOT READY: "
+                     f"sessions are not shared between workers")
+        store = InMemorySessionStore()
+        store.fallback_from = kind
+    logger.info(f"[SESSIONS] Using {store.name} session store")
+    return store
@@ -0,0 +1,98 @@
+"""
+Deadline-aware SLM generation length.
+
+With one fixed SLM_TIMEOUT, a request that had already waited in the queue
+still asked for the full _MAX_NEW_TOKENS, ran out of time mid-generation and
+its work was thrown away. Each /analyze request now carries a deadline
+(SLM_DEADLINE_SECONDS after it arrived, or sooner if the client sends
+X-Deadline-Ms) down to the batch that serves it:
+
+  - TokenRate keeps moving averages of prefill time and seconds per decode
+    step over recent generate() calls, per batch size (timed by StepClock)
+  - when a batch starts, each row gets the tokens that fit before its own
+    deadline; constrained JSON decoding closes that row's object within them
+    (slm_json.py), so a late request gets a shorter reply instead of a timeout
+  - a row that cannot fit a useful object is not generated at all
+
+No torch import: the API process consults the rate with remote inference too.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+_ALPHA = 0.3     # weight of the newest run in the moving averages
+_SAFETY = 0.85   # plan to finish with 15% of the remaining time to spare
+
+
+class TokenRate:
+    """Moving averages of prefill seconds and seconds per decode step, per batch size."""
+
+    def __init__(self, alpha: float = _ALPHA, safety: float = _SAFETY):
+        self.alpha = alpha
+        self.safety = safety
+        self._sizes: Dict[int, List[float]] = {}  # batch size → [prefill seconds, step seconds, runs]
+        self._lock = threading.Lock()
+
+    def observe(self, batch_size: int, prefill_seconds: float, steps: int, decode_seconds: float):
+        """One generate() of batch_size rows: time to the first token, then decode_seconds over steps more."""
+        step = decode_seconds / steps if steps > 0 else 0.0
+        with self._lock:
+            entry = self._sizes.get(batch_size)
+            if entry is None:
+                self._sizes[batch_size] = [prefill_seconds, step, 1]
+                return
+            entry[0] += self.alpha * (prefill_seconds - entry[0])
+            if step:
+                entry[1] = entry[1] + self.alpha * (step - entry[1]) if entry[1] else step
+            entry[2] += 1
+
+    def estimate(self, batch_size: int = 1) -> Optional[Tuple[float, float]]:
+        """(prefill seconds, seconds per step) for a batch; None until a run has been timed."""
+        with self._lock:
+            known = {size: entry for size, entry in self._sizes.items() if entry[1] > 0}
+        if not known:
+            return None
+        # From the nearest measured size (the larger on ties): prefill grows with the
+        # rows, a decode step far less (about with their square root on CPU)
+        size = min(known, key=lambda m: (abs(m - batch_size), -m))
+        scale = max(1.0, batch_size / size)
+        return known[size][0] * scale, known[size][1] * scale ** 0.5
+
+    def tokens_within(self, seconds: float, batch_size: int = 1) -> Optional[int]:
+        """New tokens one generate() can produce in seconds; None until a run has been timed."""
+        estimate = self.estimate(batch_size)
+        if estimate is None:
+            return None
+        prefill, step = estimate
+        return max(0, int((seconds * self.safety - prefill) / step))
+
+    def snapshot(self) -> Dict[int, List[float]]:
+        with self._lock:
+            return {size: list(entry) for size, entry in self._sizes.items()}
+
+    def adopt(self, snapshot: Dict[int, List[float]]):
+        """Take over another process's estimates (an SLM worker's, after each batch)."""
+        with self._lock:
+            self._sizes = {int(size): list(entry) for size, entry in snapshot.items()}
+
+
+class StepClock:
+    """generate() logits processor that only records when each token step starts."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.first = self.last = None
+        self.calls = 0
+
+    def __call__(self, input_ids, scores):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.calls += 1
+        return scores
+
+    def report(self, rate: TokenRate, batch_size: int):
+        """Feed this run's timings to rate (the first call comes right after the prefill)."""
+        if self.first is not None:
+            rate.observe(batch_size, self.first - self.started, self.calls - 1, self.last - self.first)
@@ -0,0 +1,175 @@
+"""
+SLM result cache — content-addressed LRU + TTL in front of generation.
+
+Scam campaigns resend near-identical texts; a repeated context returns the
+stored _parse_output result instead of a multi-second generate(). The key is
+a digest of the normalized message (case and whitespace folded; numbers,
+UPI ids and links kept, since missed_entities and the reply quote them), the
+scam type, the conversation phase and a digest of the history window the
+prompt sees, salted with the model path and prompt template so a model or
+prompt change never serves stale output.
+
+Optional disk persistence (SLM_CACHE_PATH): entries are written through to a
+WAL-mode SQLite file, so they survive restarts and are shared by every worker
+on the host. The in-memory LRU stays the first stop.
+"""
+import copy
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from config import SLM_CACHE_SIZE, SLM_CACHE_TTL_SECONDS, SLM_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+_WS = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WS.sub(" ", text).strip().lower()
+
+
+def fingerprint(salt: str, message: str, scam_type: str, phase: str, history: List[Dict],
+                wanted: Sequence[str] = ()) -> str:
+    """Cache key for one SLM context (wanted: the missed_entities fields the prompt asks for)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (salt, _normalize(message), scam_type or "", phase, ",".join(wanted)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1f")
+    for item in history:
+        h.update(f"{item.get('sender', '')}:{_normalize(item.get('text', ''))}".encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+class SLMResultCache:
+    """LRU with per-entry expiry; optional SQLite write-through."""
+
+    def __init__(self, max_entries: int = SLM_CACHE_SIZE, ttl_seconds: float = SLM_CACHE_TTL_SECONDS,
+                 path: str = SLM_CACHE_PATH):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.path = path or None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key → (expires_at, result)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if self.path:
+            try:
+                self._open_disk()
+            except sqlite3.Error as e:
+                logger.warning(f"[SLM-CACHE] Disk cache {self.path} unavailable ({e}) — memory only")
+                self.path = None
+
+    # ── Disk ──
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _open_disk(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS slm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        conn.execute("DELETE FROM slm_cache WHERE expires_at < ?", (time.time(),))
+        rows = conn.execute(
+            "SELECT key, expires_at, data FROM slm_cache ORDER BY expires_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, expires_at, data in reversed(rows):  # oldest first → newest ends most-recent
+            self._entries[key] = (expires_at, json.loads(data))
+        logger.info(f"[SLM-CACHE] Loaded {len(rows)} entries from {self.path}")
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        try:
+            row = self._conn().execute(
+                "SELECT expires_at, data FROM slm_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"[SLM-CACHE] Disk read failed: {e}")
+            return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _disk_put(self, key: str, expires_at: float, result: dict):
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO slm_cache (key, expires_at, data) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(result)),
+            )
+        except sqlite3.Error as e:
+            logger.debug(f"[SLM-CACHE] Disk write failed: {e}")
+
+    # ── Lookup / store ──
+
+    def get(self, key: str) -> Optional[dict]:
+        """A copy of the cached result, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return copy.deepcopy(entry[1])
+        # Another worker (or an earlier run) may have stored it
+        entry = self._disk_get(key) if self.path else None
+        with self._lock:
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self.counters["disk_hits"] += 1
+            self._insert(key, entry)
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: str, result: dict):
+        entry = (time.time() + self.ttl, copy.deepcopy(result))
+        with self._lock:
+            self._insert(key, entry)
+            self.counters["stores"] += 1
+        if self.path:
+            self._disk_put(key, entry[0], entry[1])
+
+    def _insert(self, key: str, entry: tuple):
+        # Called with _lock held
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "hitRate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                "persistent": bool(self.path),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._conn().execute("DELETE FROM slm_cache")
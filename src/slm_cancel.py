@@ -0,0 +1,38 @@
+"""
+Cooperative cancellation of SLM generations.
+
+asyncio.wait_for only cancels the awaiting coroutine; the generate() call on
+the batcher's worker thread would keep decoding every token of a request
+nobody is waiting for. Each batched request therefore carries a cancellation
+token (anything with is_set(): a threading.Event in-process, a shared-memory
+flag in an SLM worker process), set when its caller gives up — SLM_TIMEOUT or
+client disconnect. CancelCriteria checks the tokens once per token step and
+marks those rows finished; generate() returns as soon as every row of the
+batch is finished or cancelled.
+"""
+from typing import List, Sequence
+
+import torch
+from transformers import StoppingCriteria
+
+
+class CancelCriteria(StoppingCriteria):
+    """generate() stopping criterion: per row, stop once its token is set."""
+
+    def __init__(self, tokens: Sequence, finished_ids: Sequence[int] = ()):
+        self.tokens = list(tokens)
+        self.finished_ids = {int(i) for i in finished_ids if i is not None}  # EOS / pad
+        self.cancelled = 0      # rows stopped while still generating
+        self._stopped = set()
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        stop: List[bool] = []
+        for i, token in enumerate(self.tokens):
+            flag = token is not None and token.is_set()
+            if flag and i not in self._stopped:
+                self._stopped.add(i)
+                # A row that already emitted EOS (then pads) finished on its own — not a cancellation
+                if int(input_ids[i, -1]) not in self.finished_ids:
+                    self.cancelled += 1
+            stop.append(flag)
+        return torch.tensor(stop, dtype=torch.bool, device=input_ids.device)
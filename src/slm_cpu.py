@@ -0,0 +1,166 @@
+"""
+CPU plan for SLM inference — torch thread count and core affinity.
+
+Left alone, torch starts an intra-op thread per core (and as many inter-op
+threads) and competes with uvicorn, the callback dispatcher and the session
+cleanup thread for every core. Instead, when the model loads:
+
+  - the cores this process may really use are counted (affinity mask, cgroup
+    CPU quota) and SLM_RESERVED_CORES of them stay with the API process
+  - worker processes (slm_worker.py) each get a disjoint slice of the rest,
+    so N workers never run more threads than there are SLM cores
+  - a short fixed-length calibration generation (SLM_AUTOTUNE_TOKENS) is timed
+    under a few thread counts — in a worker also pinned to its slice vs
+    floating over all SLM cores — and the fastest is kept; within
+    SLM_AUTOTUNE_TOLERANCE of it, fewer threads (then pinned) win, leaving
+    more headroom for the rule pipeline
+  - inter-op threads are set to 1: generation runs one op at a time
+
+In the API process (SLM_INFERENCE=local) affinity is left as it is: pinning
+would pin the event loop and the rule pipeline along with torch. SLM_THREADS
+> 0 fixes the thread count and skips the calibration.
+"""
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import SLM_THREADS, SLM_RESERVED_CORES, SLM_PIN_CORES, SLM_AUTOTUNE_TOLERANCE
+
+logger = logging.getLogger(__name__)
+
+_CALIBRATION_RUNS = 2  # per candidate, best kept (the first also warms the thread pool)
+
+
+def _cgroup_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota (v2 cpu.max or v1 cfs), None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def usable_cores() -> List[int]:
+    """Cores this process may run on, cut to the cgroup quota (os.cpu_count() counts the host's)."""
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except AttributeError:  # no affinity API (macOS)
+        cores = list(range(os.cpu_count() or 1))
+    quota = _cgroup_quota()
+    if quota:
+        cores = cores[:max(1, math.ceil(quota))]
+    return cores
+
+
+def slm_cores(cores: List[int], reserved: int = SLM_RESERVED_CORES) -> List[int]:
+    """cores minus the API process's reserve (the first ones); at least one is left."""
+    keep = min(max(0, reserved), len(cores) - 1)
+    return cores[keep:]
+
+
+def split_cores(cores: List[int], parts: int) -> List[List[int]]:
+    """cores in parts contiguous slices (sizes differ by at most one); fewer cores than parts share round-robin."""
+    if parts >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(parts)]
+    size, extra = divmod(len(cores), parts)
+    slices, start = [], 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+def thread_counts(n: int) -> List[int]:
+    """Calibration candidates: 1, 2, 4, ... below n, and n."""
+    counts, threads = [], 1
+    while threads < n:
+        counts.append(threads)
+        threads *= 2
+    return counts + [n]
+
+
+def pin(cores: List[int]):
+    """Restrict every thread of this process (torch's pool included) to cores."""
+    for tid in os.listdir("/proc/self/task"):
+        try:
+            os.sched_setaffinity(int(tid), cores)
+        except OSError:
+            pass  # thread exited meanwhile
+
+
+class CPUPlan:
+    """Threads and cores the SLM runs with in this process, and how they were chosen."""
+
+    def __init__(self, cores: List[int], floating: Optional[List[int]] = None):
+        self.cores = list(cores)           # the cores this model may use (a worker's slice)
+        self.floating = list(floating) if floating and set(floating) != set(cores) and SLM_PIN_CORES else None
+        self.pinnable = floating is not None and SLM_PIN_CORES  # own process: affinity is ours to set
+        self.threads = SLM_THREADS if SLM_THREADS > 0 else len(self.cores)
+        self.pinned = self.pinnable
+        self.source = "fixed" if SLM_THREADS > 0 else "default"  # → autotune once calibrated
+        self.calibration: List[Dict] = []  # {"threads", "pinned", "ms"} per candidate
+
+    def _set(self, threads: int, pinned: bool):
+        import torch
+
+        if self.pinnable:
+            pin(self.cores if pinned else (self.floating or self.cores))
+        torch.set_num_threads(threads)
+
+    def prepare(self):
+        """Before the model loads: one inter-op thread, the starting thread count (and cores)."""
+        import torch
+
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:  # only settable before inter-op work has started
+            pass
+        self._set(self.threads, self.pinned)
+
+    def autotune(self, calibrate: Callable[[], None]):
+        """Time calibrate() under each candidate and apply the pick (unless SLM_THREADS fixed it)."""
+        if self.source == "fixed":
+            return
+        candidates = [(threads, pinned) for threads in thread_counts(len(self.cores))
+                      for pinned in ((True, False) if self.floating else (self.pinned,))]
+        if len(candidates) > 1:
+            for threads, pinned in candidates:
+                self._set(threads, pinned)
+                seconds = []
+                for _ in range(_CALIBRATION_RUNS):
+                    started = time.perf_counter()
+                    calibrate()
+                    seconds.append(time.perf_counter() - started)
+                self.calibration.append({"threads": threads, "pinned": pinned, "ms": round(min(seconds) * 1000, 1)})
+            fastest = min(c["ms"] for c in self.calibration)
+            pick = min((c for c in self.calibration if c["ms"] <= fastest * (1 + SLM_AUTOTUNE_TOLERANCE)),
+                       key=lambda c: (c["threads"], not c["pinned"], c["ms"]))
+            self.threads, self.pinned = pick["threads"], pick["pinned"]
+        self.source = "autotune"
+        self._set(self.threads, self.pinned)
+        tried = ", ".join(f"{c['threads']}t{'/pinned' if c['pinned'] else ''} {c['ms']:.0f}ms"
+                          for c in self.calibration) or "one candidate"
+        logger.info(f"[SLM-CPU] {self.threads} thread(s) on {len(self.cores)} core(s)"
+                    f"{' (pinned)' if self.pinned else ''} — calibrated: {tried}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "threads": self.threads,
+            "interopThreads": 1,
+            "cores": self.cores,
+            "pinned": self.pinned,
+            "source": self.source,
+            "calibration": self.calibration,
+        }
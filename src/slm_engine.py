@@ -8,55 +8,288 @@ Async singleton that runs the SLM for:
 
 Toggle: USE_SLM in config.py (default false)
 Safety: 8s timeout, falls back to rule-based results on ANY failure
+Throughput: concurrent requests are micro-batched into one padded generate()
+Backends: SLM_BACKEND = torch (fp32) | int8 (dynamic quantization) | onnx (ONNX Runtime)
+Output: decoding is constrained to the expected JSON object (slm_json.py)
+Prompt: the per-turn part is held to SLM_PROMPT_TOKEN_BUDGET tokens (slm_prompt.py)
+Deadlines: each row's max_new_tokens fits the time its request has left (slm_budget.py)
+Cache: parsed results of repeated contexts are served from slm_cache.py
+Scoring: SLM_MODE = score | both reads confidence and scam type from one forward pass (slm_scoring.py)
+Inference: SLM_INFERENCE = local | workers (supervised processes, slm_worker.py) | http (an
+           OpenAI-compatible completion server) runs the batches (slm_inference.py)
+CPU: torch threads (and a worker's cores) are calibrated at load, leaving cores to the API (slm_cpu.py)
 """
 import asyncio
+import copy
+import gc
+import hashlib
 import logging
+import os
 import re
 import json
-from typing import Dict, List, Optional, Any
-
-from config import USE_SLM, SLM_MODEL_PATH, SLM_TIMEOUT
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+from config import (
+    USE_SLM, SLM_MODEL_PATH, SLM_TIMEOUT, SLM_BATCH_MAX_SIZE, SLM_BATCH_WAIT_MS, SLM_PREFIX_CACHE,
+    SLM_BACKEND, SLM_ONNX_CACHE_DIR, SLM_CONSTRAINED_JSON, SLM_CACHE_ENABLED, SLM_MODE,
+    SLM_PROMPT_TOKEN_BUDGET, SLM_DEADLINE_AWARE, SLM_MAX_NEW_TOKENS, SLM_TEMPERATURE, SLM_TOP_P,
+    SLM_AUTOTUNE_TOKENS,
+)
+from slm_budget import StepClock, TokenRate
+from slm_cache import SLMResultCache, fingerprint
+from slm_cpu import CPUPlan, slm_cores, usable_cores
+from slm_inference import SLMInference, create_inference
+from slm_prompt import ENTITY_FIELDS, HISTORY_CANDIDATES, TEMPLATE, PromptBuilder, tokenizer_offsets, wanted_entities
+from slm_scoring import SCORE_HEADER, context_block
 
 logger = logging.getLogger(__name__)
 
 # ── Structured prompt template ─────────────────────────────────────────
-_SLM_PROMPT = """You are Ramesh Kumar, a 67-year-old retired government employee from Nagpur, India.
+# Fixed part first: persona, task and JSON schema are identical on every call,
+# so their KV cache is computed once at warmup and each request only encodes
+# the per-turn suffix (slm_prompt.PromptBuilder). The prefix is plain text (not .format()ed).
+_SLM_PROMPT_PREFIX = """You are Ramesh Kumar, a 67-year-old retired government employee from Nagpur, India.
 You are on a phone call with a potential scammer. Your job is to:
 1. Keep them talking (stall with excuses, confusion, questions)
 2. Extract their personal info (UPI, phone, bank, email, links)
 3. Sound natural and human — mix English with light Hinglish
 
-SCAM TYPE: {scam_type}
-CONVERSATION PHASE: {phase}
-TURN NUMBER: {turn_count}
-
-SCAMMER'S MESSAGE: "{message}"
-
-CONVERSATION HISTORY (last 3 turns):
-{history}
-
-RULE-BASED ANALYSIS:
-- Detected scam: {rule_detected}
-- Confidence: {rule_confidence}
-- Extracted: {rule_intel_summary}
-- Rule reply: "{rule_reply}"
-
-TASK: Generate a JSON response with these exact fields:
-{{
+TASK: For the turn below, generate a JSON response with these exact fields:
+{
   "confidence": <float 0.0-1.0, your scam confidence>,
   "scam_type": "<refined scam type or same>",
-  "missed_entities": {{
+  "missed_entities": {
     "phoneNumbers": [],
     "upiIds": [],
     "bankAccounts": [],
     "emailAddresses": [],
     "phishingLinks": []
-  }},
+  },
   "reply": "<your human-like 1-2 sentence reply as Ramesh Kumar, <80 words, stall/probe for intel>",
   "insight": "<1 sentence about scammer tactics or behavioral observation>"
-}}
+}
+
+Fill only the missed_entities lists named under MISSING INTEL; leave the others empty.
+Respond ONLY with valid JSON. No explanation.
+
+"""
+
+# What unconstrained output must at least spell out to parse (remote inference)
+_OUTPUT_SKELETON = ('{"confidence": 0.5, "scam_type": "", "missed_entities": {"phoneNumbers": [], "upiIds": [], '
+                    '"bankAccounts": [], "emailAddresses": [], "phishingLinks": []}, "reply": "", "insight": ""}')
+
+_MAX_NEW_TOKENS = SLM_MAX_NEW_TOKENS
+_HISTORY_WINDOW = 6  # last 6 messages = ~3 turns (logit scoring context)
+_WARM_TOKENS = 4     # warmup generation length
+_MIN_VALUE_TOKENS = 16  # beyond the JSON skeleton: less than this is not worth generating
+_DISCONNECT_POLL_SECONDS = 0.1
+
+
+class _ClientDisconnected(Exception):
+    """The HTTP client went away while its SLM call was pending."""
+
+
+_MODES = ("generate", "score", "both")
+_MODE = SLM_MODE if SLM_MODE in _MODES else "generate"
+if SLM_MODE not in _MODES:
+    logger.warning(f"[SLM] Unknown SLM_MODE={SLM_MODE!r} — using generate")
+
+# Cached results are only valid for the model, mode, prompts and sampling that produced them
+_CACHE_SALT = hashlib.blake2b(
+    f"{SLM_MODEL_PATH}\x1f{_MODE}\x1f{_SLM_PROMPT_PREFIX}\x1f{''.join(TEMPLATE)}\x1f{SLM_PROMPT_TOKEN_BUDGET}"
+    f"\x1f{SCORE_HEADER}\x1f{_MAX_NEW_TOKENS}\x1f{SLM_TEMPERATURE}\x1f{SLM_TOP_P}".encode("utf-8"),
+    digest_size=8,
+).hexdigest()
+
+
+# ── Inference backends ─────────────────────────────────────────────────
+
+def _rss_mb() -> float:
+    """Resident memory of this process in MB (0.0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _weights_mmapped() -> bool:
+    """True if a safetensors checkpoint is mapped into this process (weights served from page cache)."""
+    try:
+        with open("/proc/self/maps") as f:
+            return any(line.rstrip().endswith(".safetensors") for line in f)
+    except OSError:
+        return False
+
+
+def _load_onnx(source: str, local_files_only: bool, threads: int):
+    """ONNX Runtime model via optimum; exports on first use, then loads the cached graph."""
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    # ORT sizes its own thread pools when the session is created
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    cache_dir = os.path.join(SLM_ONNX_CACHE_DIR, re.sub(r"[^\w.-]+", "_", source.strip("/.")))
+    if os.path.isfile(os.path.join(cache_dir, "config.json")):
+        model = ORTModelForCausalLM.from_pretrained(cache_dir, local_files_only=True, session_options=options)
+        logger.info(f"[SLM] ONNX graph loaded from cache {cache_dir}")
+    else:
+        model = ORTModelForCausalLM.from_pretrained(
+            source, export=True, use_cache=True, local_files_only=local_files_only, session_options=options,
+        )
+        model.save_pretrained(cache_dir)
+        logger.info(f"[SLM] Exported ONNX graph to {cache_dir}")
+    return model
+
+
+def _load_model(source: str, local_files_only: bool, threads: int = 1):
+    """Load the model for SLM_BACKEND. Returns (model, backend actually used)."""
+    from transformers import AutoModelForCausalLM
+
+    if SLM_BACKEND == "onnx":
+        try:
+            return _load_onnx(source, local_files_only, threads), "onnx"
+        except Exception as e:  # optimum[onnxruntime] missing, or the export failed
+            logger.warning(f"[SLM] ONNX Runtime backend unavailable ({e}) — using torch")
+
+    model = AutoModelForCausalLM.from_pretrained(source, local_files_only=local_files_only)
+    model.eval()
+    if SLM_BACKEND == "int8":
+        try:
+            import torch
+            torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            # Embeddings/norms stay fp32 but still point into the mmap-ed checkpoint,
+            # which keeps every fp32 page the quantizer touched resident — copy them out
+            for param in model.parameters():
+                param.data = param.data.clone()
+            gc.collect()
+            return model, "int8"
+        except Exception as e:
+            logger.warning(f"[SLM] int8 quantization failed ({e}) — using fp32 torch")
+    elif SLM_BACKEND not in ("torch", "onnx"):
+        logger.warning(f"[SLM] Unknown SLM_BACKEND={SLM_BACKEND!r} — using torch")
+    return model, "torch"
+
+
+# ── Micro-batching scheduler ───────────────────────────────────────────
+
+class MicroBatcher:
+    """
+    Collects prompts submitted concurrently and runs them as one batch.
+
+    The first prompt opens a window of max_wait_ms (or until max_batch prompts
+    are queued); the batch then runs on a worker thread via run_batch(prompts)
+    → outputs, up to `concurrency` batches at a time (one per SLM worker
+    process; 1 in-process). Callers that gave up (their wait_for timed out
+    and cancelled the future) before the batch starts are dropped; callers
+    that give up while it runs set their row's cancellation token, passed as
+    run_batch(prompts, cancel_tokens=...) when cancellable (slm_cancel.py).
+    Prompts submitted with a deadline (time.monotonic()) pass them along as
+    run_batch(..., deadlines=...) (slm_budget.py).
+    """
+
+    def __init__(self, run_batch: Callable[..., List[str]],
+                 max_batch: int = SLM_BATCH_MAX_SIZE, max_wait_ms: float = SLM_BATCH_WAIT_MS,
+                 concurrency: int = 1, cancellable: bool = True):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.concurrency = max(1, concurrency)
+        self.cancellable = cancellable
+        # expired: gave up before their batch started; abandoned: gave up while it was generating
+        self.stats = {"batches": 0, "requests": 0, "expired": 0, "abandoned": 0,
+                      "max_batch_seen": 0, "busy_seconds": 0.0}
+        self._loop = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight = set()
+        self._running = 0
+
+    def depth(self) -> int:
+        """Requests queued or in the batch being generated."""
+        return (self._queue.qsize() if self._queue is not None else 0) + self._running
+
+    def _bind(self, loop):
+        # Queue and task belong to one event loop; rebuild if a new loop shows up
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    async def submit(self, prompt: str, deadline: Optional[float] = None) -> str:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._bind(loop)
+        future = loop.create_future()
+        self._queue.put_nowait((prompt, future, deadline))
+        return await future
+
+    async def _collect(self) -> list:
+        queue = self._queue
+        batch = [await queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()  # the next window opens once a batch slot is free
+            batch = await self._collect()
+            live = [item for item in batch if not item[1].done()]
+            self.stats["expired"] += len(batch) - len(live)
+            if not live:
+                slots.release()
+                continue
+            task = self._loop.create_task(self._dispatch(live))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _dispatch(self, live: list):
+        started = time.perf_counter()
+        self._running += len(live)
+        prompts = [prompt for prompt, _, _ in live]
+        tokens = [threading.Event() for _ in live]
+        for (_, future, _), token in zip(live, tokens):
+            future.add_done_callback(lambda f, token=token: f.cancelled() and token.set())
+        kwargs = {}
+        if self.cancellable:
+            kwargs["cancel_tokens"] = tokens
+        if any(deadline is not None for _, _, deadline in live):
+            kwargs["deadlines"] = [deadline for _, _, deadline in live]
+        try:
+            outputs = await asyncio.to_thread(self.run_batch, prompts, **kwargs)
+        except Exception as e:
+            for _, future, _ in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._running -= len(live)
+            self.stats["busy_seconds"] += time.perf_counter() - started
+            self.stats["abandoned"] += sum(token.is_set() for token in tokens)
 
-Respond ONLY with valid JSON. No explanation."""
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(live)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(live))
+        for (_, future, _), output in zip(live, outputs):
+            if not future.done():
+                future.set_result(output)
 
 
 class SLMEngine:
@@ -74,9 +307,40 @@ class SLMEngine:
         if self._initialized:
             return
         self._initialized = True
-        self.pipeline = None
+        self.model = None
+        self.tokenizer = None
+        self.device = "cpu"
+        self._prefix_ids = None     # token ids of _SLM_PROMPT_PREFIX, shape (1, P)
+        self._prefix_cache = None   # its past_key_values, batch size 1
+        self._json_schema = None    # slm_json.JSONSchema for this tokenizer
+        self._prompts = PromptBuilder()  # token estimates until a tokenizer is loaded
+        self._scoring = None        # slm_scoring.ScoringHead for this tokenizer
+        self._score_prefix_cache = None  # past_key_values of its header, batch size 1
+        self.scoring_ready = False  # logit scoring available (here or in the worker processes)
+        self.backend = None         # backend actually loaded (see _load_model)
+        self.load_seconds = 0.0
+        self.load_phases: Dict[str, float] = {}  # imports / tokenizer / weights / device / pipeline / warm_generation
+        self.weights_mmapped = False
+        self.state = "not_started" if USE_SLM else "disabled"  # → loading → ready | failed
+        self._rss_baseline = 0.0    # process RSS just before the load
+        self.generated_tokens = 0
+        self.generate_seconds = 0.0
+        self.cancelled_generations = 0  # rows stopped early because their caller gave up
+        self.abandoned = {"timeout": 0, "disconnect": 0}  # callers that gave up on a pending SLM call
+        self.scored = 0             # messages scored by logit scoring
+        self.rate = TokenRate()     # prefill / per-token time of recent generations (a worker's or server's if remote)
+        self.deadline_rows = {"shortened": 0, "skipped": 0}  # rows sized down / not generated to meet deadlines
+        self._useful_tokens = _MIN_VALUE_TOKENS  # smallest max_new_tokens worth generating
+        self.score_seconds = 0.0
+        self._counts_lock = threading.Lock()  # batches finish on several threads (workers, http)
         self.ready = False
         self._load_attempted = False
+        self.batcher = MicroBatcher(self._generate_batch)
+        self.scorer = MicroBatcher(self._score_batch, cancellable=False)  # one forward pass: nothing to cancel
+        self.cache = SLMResultCache() if SLM_CACHE_ENABLED else None
+        self.inference: Optional[SLMInference] = None  # where batches run, once started (slm_inference.py)
+        self.pool = None            # slm_worker.SLMWorkerPool with SLM_INFERENCE=workers
+        self.cpu: Optional[Dict[str, Any]] = None  # slm_cpu.CPUPlan.to_dict() of the process running the model
 
     def warmup(self):
         """Load the model synchronously — call during app startup."""
@@ -88,43 +352,246 @@ class SLMEngine:
             return
 
         self._load_attempted = True
+        inference = create_inference(self, max_new_tokens=_MAX_NEW_TOKENS)
+        if not inference.start():
+            return
+        self.inference = inference
+        self.batcher = MicroBatcher(inference.generate, concurrency=inference.concurrency)
+        self.scorer = MicroBatcher(inference.score, concurrency=inference.concurrency, cancellable=False)
+
+    def _attach_remote(self, info: Dict[str, Any], load_seconds: float):
+        """Serve from a model in another process (SLM workers or a completion server), per its load info."""
+        self._prompts = PromptBuilder(tokenizer_offsets())  # tokenizers only: no torch in this process
+        self.backend = info["backend"]
+        self.load_phases = dict(info["loadPhases"])
+        self.weights_mmapped = info["weightsMmapped"]
+        self.scoring_ready = info["scoring"]
+        self.cpu = info.get("cpu")
+        self._useful_tokens = info["usefulTokens"] or self._prompts.count(_OUTPUT_SKELETON) + _MIN_VALUE_TOKENS
+        self.load_seconds = load_seconds
+        self.ready = True
+        self.state = "ready"
+
+    @contextmanager
+    def _load_phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.load_phases[name] = round(time.perf_counter() - started, 3)
+
+    def load(self, cores: Optional[List[int]] = None, floating: Optional[List[int]] = None):
+        """
+        Load the model into this process (the API process, or an SLM worker process).
+        cores: the cores it may use (default: this process's, less SLM_RESERVED_CORES);
+        a worker passes its slice and floating, all SLM cores (see slm_cpu.CPUPlan).
+        """
+        self.state = "loading"
+        self.load_phases = {}
         try:
-            import os
             # Leapcell: only /tmp is writable — redirect HuggingFace cache there
             os.environ.setdefault("HF_HOME", "/tmp/.cache/huggingface")
             os.environ.setdefault("TRANSFORMERS_CACHE", "/tmp/.cache/huggingface")
 
-            from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline as hf_pipeline
-            import torch
-
-            logger.info(f"[SLM] Loading SmolLM2-135M-Instruct from {SLM_MODEL_PATH}...")
+            logger.info(f"[SLM] Loading SmolLM2-135M-Instruct from {SLM_MODEL_PATH} (backend={SLM_BACKEND})...")
+            rss_before = _rss_mb()
+            started = time.perf_counter()
+            with self._load_phase("imports"):
+                from transformers import AutoTokenizer
+                import torch
+            plan = CPUPlan(cores if cores is not None else slm_cores(usable_cores()), floating)
+            plan.prepare()  # before the weights load: the load's own ops stay within the plan
 
             # Try local path first, then HuggingFace Hub
             model_source = SLM_MODEL_PATH
             try:
-                tokenizer = AutoTokenizer.from_pretrained(model_source, local_files_only=True)
-                model = AutoModelForCausalLM.from_pretrained(model_source, local_files_only=True)
+                with self._load_phase("tokenizer"):
+                    tokenizer = AutoTokenizer.from_pretrained(model_source, local_files_only=True)
+                with self._load_phase("weights"):
+                    model, backend = _load_model(model_source, local_files_only=True, threads=plan.threads)
                 logger.info("[SLM] Loaded from local path")
             except Exception:
                 model_source = "HuggingFaceTB/SmolLM2-135M-Instruct"
                 logger.info(f"[SLM] Local not found, downloading from {model_source}...")
-                tokenizer = AutoTokenizer.from_pretrained(model_source)
-                model = AutoModelForCausalLM.from_pretrained(model_source)
-
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            model.to(device)
-
-            self.pipeline = hf_pipeline(
-                "text-generation",
-                model=model,
-                tokenizer=tokenizer,
-                device=device if device == "cuda" else -1,  # -1 = CPU for pipeline
-            )
+                with self._load_phase("tokenizer"):
+                    tokenizer = AutoTokenizer.from_pretrained(model_source)
+                with self._load_phase("weights"):
+                    model, backend = _load_model(model_source, local_files_only=False, threads=plan.threads)
+            self.weights_mmapped = _weights_mmapped()
+
+            # Quantized and ONNX Runtime graphs are CPU-only
+            with self._load_phase("device"):
+                device = "cuda" if backend == "torch" and torch.cuda.is_available() else "cpu"
+                model.to(device)
+
+            # Batched generation: decoder-only models pad on the left
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+
+            self.model = model
+            self.tokenizer = tokenizer
+            self._prompts = PromptBuilder(tokenizer_offsets(tokenizer, model_source))
+            self.device = device
+            self.backend = backend
+            self._rss_baseline = rss_before
+            with self._load_phase("pipeline"):
+                if SLM_PREFIX_CACHE and backend != "onnx":  # ORT keeps its own past_key_values format
+                    self._build_prefix_cache()
+                if SLM_CONSTRAINED_JSON:
+                    self._build_json_schema()
+                self._build_scoring_head()
+            if device == "cpu" and backend != "onnx":  # ORT fixed its threads at load (plan.threads)
+                with self._load_phase("autotune"):
+                    plan.autotune(self._calibrate)
+            self.cpu = plan.to_dict()
+            # One short generation pages the weights in and warms the kernels before traffic does
+            with self._load_phase("warm_generation"):
+                self._generate_batch([self._warm_prompt()], max_new_tokens=_WARM_TOKENS)
+            self.generated_tokens, self.generate_seconds = 0, 0.0
+            self.load_seconds = time.perf_counter() - started
             self.ready = True
-            logger.info(f"[SLM] Ready on {device} ✅")
+            self.state = "ready"
+            phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.load_phases.items())
+            logger.info(
+                f"[SLM] Ready on {device} ✅ backend={backend}, load {self.load_seconds:.1f}s ({phases}), "
+                f"weights {'mmap-ed' if self.weights_mmapped else 'in private memory'}, RSS {_rss_mb():.0f}MB, "
+                f"batch ≤{self.batcher.max_batch}, window {SLM_BATCH_WAIT_MS}ms"
+            )
         except Exception as e:
             logger.error(f"[SLM] Failed to load: {e}")
             self.ready = False
+            self.state = "failed"
+
+    def _warm_prompt(self) -> str:
+        return self._build_prompt(
+            "Sir your account is blocked, verify now.", [], "BANK_FRAUD", 1, True, 0.5, {}, "Which account?",
+        )
+
+    def _calibrate(self):
+        """The CPU autotune workload: a fixed-length greedy generation (SLM_AUTOTUNE_TOKENS, no early EOS)."""
+        import torch
+
+        encoded = self.tokenizer([self._warm_prompt()], return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            self.model.generate(**encoded, max_new_tokens=SLM_AUTOTUNE_TOKENS, min_new_tokens=SLM_AUTOTUNE_TOKENS,
+                                do_sample=False, pad_token_id=self.tokenizer.pad_token_id)
+
+    def _encode_prefix(self, prefix_ids):
+        """past_key_values of a fixed prompt prefix (batch size 1)."""
+        import torch
+
+        with torch.inference_mode():
+            cache = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+        copy.deepcopy(cache).batch_repeat_interleave(1)  # fail here, not per request, if unsupported
+        return cache
+
+    def _build_prefix_cache(self):
+        """Encode the fixed prompt prefix once and keep its past_key_values."""
+        try:
+            started = time.perf_counter()
+            prefix_ids = self.tokenizer(_SLM_PROMPT_PREFIX, return_tensors="pt")["input_ids"].to(self.device)
+            cache = self._encode_prefix(prefix_ids)
+            self._prefix_ids, self._prefix_cache = prefix_ids, cache
+            logger.info(
+                f"[SLM] Prefix KV cache: {prefix_ids.shape[1]} tokens "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        except Exception as e:
+            logger.warning(f"[SLM] Prefix KV cache unavailable ({e}) — encoding full prompts")
+            self._prefix_ids = self._prefix_cache = None
+
+    def _build_json_schema(self):
+        """Token tables for constrained JSON decoding; unconstrained sampling if unsupported."""
+        try:
+            from slm_json import JSONSchema
+
+            started = time.perf_counter()
+            schema = JSONSchema(self.tokenizer)
+            if schema.min_tokens >= _MAX_NEW_TOKENS:
+                raise ValueError(f"schema needs {schema.min_tokens} tokens, budget is {_MAX_NEW_TOKENS}")
+            self._json_schema = schema
+            self._useful_tokens = schema.min_tokens + _MIN_VALUE_TOKENS
+            logger.info(
+                f"[SLM] Constrained JSON decoding: {schema.min_tokens} structural tokens, "
+                f"tables in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        except Exception as e:
+            logger.warning(f"[SLM] Constrained JSON decoding unavailable ({e}) — sampling freely")
+            self._json_schema = None
+
+    def _build_scoring_head(self):
+        """Answer-token tables (and header KV cache) for logit scoring; disabled if unsupported."""
+        try:
+            from slm_scoring import ScoringHead
+
+            started = time.perf_counter()
+            head = ScoringHead(self.tokenizer)
+            self._score_prefix_cache = None
+            if SLM_PREFIX_CACHE and self.backend != "onnx":
+                import torch
+                self._score_prefix_cache = self._encode_prefix(torch.tensor([head.header_ids], device=self.device))
+            self._scoring = head
+            self.scoring_ready = True
+            logger.info(
+                f"[SLM] Logit scoring: {len(head.labels)} scam types, header {len(head.header_ids)} tokens"
+                f"{' (KV cached)' if self._score_prefix_cache is not None else ''}, "
+                f"tables in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        except Exception as e:
+            logger.warning(f"[SLM] Logit scoring unavailable ({e}) — SLM_MODE={_MODE} generates instead")
+            self._scoring = None
+            self.scoring_ready = False
+
+    def readiness(self) -> Dict[str, Any]:
+        """SLM half of GET /ready: load state, phase timings, and whether it can serve right now."""
+        serving = self.ready and (self.inference is None or self.inference.serving())
+        return {
+            "enabled": USE_SLM,
+            "state": self.state,
+            "ready": serving,
+            "backend": self.backend,
+            "inference": self.inference.kind if self.inference is not None else None,
+            "loadSeconds": round(self.load_seconds, 2),
+            "loadPhases": dict(self.load_phases),
+            "weightsMmapped": self.weights_mmapped,
+            "cpu": self.cpu,
+            "workers": {"alive": self.pool.alive(), "size": self.pool.size} if self.pool is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend, load cost, memory and generation throughput (of every worker process, if any)."""
+        rss = _rss_mb()
+        # Weights are mmap-ed and only become resident once generation touches them
+        model_rss = max(0.0, rss - self._rss_baseline) if self.ready else 0.0
+        workers = self.pool.stats() if self.pool is not None else None
+        prefill, step = self.rate.estimate() or (0.0, 0.0)
+        if workers is not None:
+            model_rss = sum(w.get("modelRssMb", 0.0) for w in workers["workers"])
+        return {
+            "backend": self.backend,
+            "ready": self.ready,
+            "loadSeconds": round(self.load_seconds, 2),
+            "rssMb": round(rss, 1),
+            "modelRssMb": round(model_rss, 1),
+            "generatedTokens": self.generated_tokens,
+            "tokensPerSecond": round(self.generated_tokens / self.generate_seconds, 1) if self.generate_seconds else 0.0,
+            "mode": _MODE,
+            "deadline": {
+                "aware": SLM_DEADLINE_AWARE,
+                "prefillMs": round(prefill * 1000, 1),  # single-row generation
+                "msPerToken": round(step * 1000, 2),
+                **self.deadline_rows,
+            },
+            "scoring": {
+                "ready": self.scoring_ready,
+                "scored": self.scored,
+                "avgMs": round(self.score_seconds * 1000 / self.scored, 1) if self.scored else 0.0,
+            },
+            "inference": self.inference.stats() if self.inference is not None else None,
+            "cpu": self.cpu,
+            "workers": workers,
+        }
 
     async def smart_process(
         self,
@@ -136,10 +603,18 @@ class SLMEngine:
         rule_confidence: float,
         rule_intel: Dict[str, List[str]],
         rule_reply: str,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        deadline: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Run SLM inference asynchronously with timeout.
         Returns merged results dict. Falls back to empty on failure.
+        SLM_MODE picks generation, logit scoring, or both (scores win for
+        confidence and scam type); the scores' ranking is in "scam_types".
+        is_disconnected (e.g. Request.is_disconnected) is polled while waiting;
+        a timeout or disconnect cancels the generation cooperatively.
+        deadline (time.monotonic()) caps SLM_TIMEOUT; with SLM_DEADLINE_AWARE
+        the generation is sized to it, or skipped if too little time is left.
         """
         empty_result = {
             "refined_confidence": 0.0,
@@ -153,31 +628,123 @@ class SLMEngine:
         if not USE_SLM or not self.ready:
             return empty_result
 
-        try:
-            result = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self._infer,
-                    message_text,
-                    conversation_history,
-                    scam_type,
-                    turn_count,
-                    rule_detected,
-                    rule_confidence,
-                    rule_intel,
-                    rule_reply,
-                ),
-                timeout=SLM_TIMEOUT,
+        cache_key = None
+        if self.cache is not None:
+            cache_key = fingerprint(
+                _CACHE_SALT, message_text, scam_type, self._phase(turn_count),
+                conversation_history[-HISTORY_CANDIDATES:],
+                wanted=[field for field in ENTITY_FIELDS if not rule_intel.get(field)],
             )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                cached["slm_used"] = True
+                return cached
+
+        scoring = _MODE != "generate" and self.scoring_ready
+        generating = _MODE != "score" or not scoring
+        now = time.monotonic()
+        deadline = min(deadline, now + SLM_TIMEOUT) if deadline is not None else now + SLM_TIMEOUT
+        if generating and SLM_DEADLINE_AWARE and not self._fits(deadline - now):
+            self.count(skipped=1)
+            if not scoring:
+                logger.info(f"[SLM] {max(0.0, deadline - now):.2f}s left — too little to generate, rules only")
+                return empty_result
+            generating = False  # scores alone
+        context = context_block(message_text, conversation_history[-_HISTORY_WINDOW:])
+        try:
+            # Queue wait + batched generation/scoring share the caller's SLM_TIMEOUT
+            calls = []
+            if scoring:
+                calls.append(self.scorer.submit(context))
+            if generating:
+                calls.append(self.batcher.submit(self._build_prompt(
+                    message_text, conversation_history, scam_type, turn_count,
+                    rule_detected, rule_confidence, rule_intel, rule_reply,
+                ), deadline=deadline if SLM_DEADLINE_AWARE else None))
+            pending = asyncio.gather(*calls)
+            if is_disconnected is not None:
+                pending = self._unless_disconnected(pending, is_disconnected)
+            outputs = await asyncio.wait_for(pending, timeout=max(0.0, deadline - time.monotonic()))
+            skipped = generating and outputs[-1] == ""  # too little time left once its batch started
+            if skipped and not scoring:
+                return empty_result
+            generated = generating and not skipped
+            result = self._parse_output(outputs[-1], rule_reply) if generated else dict(empty_result)
+            if scoring:
+                self._apply_scores(result, outputs[0], with_insight=not generated)
+            result.pop("slm_used", None)
+            if cache_key and not skipped and (result["refined_reply"] or result["refined_confidence"]
+                                              or result["missed_entities"]):
+                self.cache.put(cache_key, result)  # unparseable output is retried, not cached
             result["slm_used"] = True
             return result
         except asyncio.TimeoutError:
-            logger.warning(f"[SLM] Timeout ({SLM_TIMEOUT}s) — falling back to rules")
+            self.abandoned["timeout"] += 1
+            logger.warning("[SLM] Deadline reached — generation cancelled, falling back to rules")
+            return empty_result
+        except _ClientDisconnected:
+            self.abandoned["disconnect"] += 1
+            logger.info("[SLM] Client disconnected — generation cancelled")
             return empty_result
         except Exception as e:
             logger.error(f"[SLM] Inference error: {e}")
             return empty_result
 
-    def _infer(
+    def _fits(self, seconds: float) -> bool:
+        """Whether a useful generation fits in seconds (assumed so until one has been timed)."""
+        tokens = self.rate.tokens_within(seconds)
+        return seconds > 0 and (tokens is None or tokens >= self._useful_tokens)
+
+    @staticmethod
+    async def _unless_disconnected(pending: Awaitable[str], is_disconnected: Callable[[], Awaitable[bool]]) -> str:
+        """Await pending; raise _ClientDisconnected (cancelling it) once the client has gone."""
+        task = asyncio.ensure_future(pending)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=_DISCONNECT_POLL_SECONDS)
+                if done:
+                    return task.result()
+                if await is_disconnected():
+                    raise _ClientDisconnected()
+        finally:
+            task.cancel()  # no-op once done; on timeout/disconnect this sets the row's cancel token
+
+    async def score(self, message_text: str, conversation_history: List[Dict]) -> Optional[Dict[str, Any]]:
+        """
+        Logit scoring on its own: {"scam_probability", "scam_types": [[label, p], ...]}
+        for one message, or None if scoring is unavailable or times out.
+        """
+        if not USE_SLM or not self.ready or not self.scoring_ready:
+            return None
+        context = context_block(message_text, conversation_history[-_HISTORY_WINDOW:])
+        try:
+            return await asyncio.wait_for(self.scorer.submit(context), timeout=SLM_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"[SLM] Scoring timeout ({SLM_TIMEOUT}s)")
+        except Exception as e:
+            logger.error(f"[SLM] Scoring error: {e}")
+        return None
+
+    @staticmethod
+    def _apply_scores(result: Dict[str, Any], scores: Dict[str, Any], with_insight: bool):
+        """Confidence and scam type from logit scores (over any generated values)."""
+        ranked = scores["scam_types"]
+        result["refined_confidence"] = scores["scam_probability"]
+        result["refined_scam_type"] = ranked[0][0]
+        result["scam_types"] = ranked
+        if with_insight:
+            likely = ", ".join(f"{label} {p:.2f}" for label, p in ranked[:2])
+            result["insight"] = f"SLM scam probability {scores['scam_probability']:.2f}; likely {likely}"
+
+    @staticmethod
+    def _phase(turn_count: int) -> str:
+        if turn_count <= 2:
+            return "early (establishing persona)"
+        if turn_count <= 6:
+            return "middle (stalling and extracting)"
+        return "late (maximum pressure, buying time)"
+
+    def _build_prompt(
         self,
         message_text: str,
         conversation_history: List[Dict],
@@ -187,55 +754,178 @@ class SLMEngine:
         rule_confidence: float,
         rule_intel: Dict[str, List[str]],
         rule_reply: str,
-    ) -> Dict[str, Any]:
-        """Synchronous inference — runs in thread pool."""
-        # Determine phase
-        if turn_count <= 2:
-            phase = "early (establishing persona)"
-        elif turn_count <= 6:
-            phase = "middle (stalling and extracting)"
-        else:
-            phase = "late (maximum pressure, buying time)"
-
-        # Build history summary (last 3 turns)
-        history_lines = []
-        for h in conversation_history[-6:]:  # last 6 messages = ~3 turns
-            role = h.get("sender", "unknown")
-            text = h.get("text", "")[:100]
-            history_lines.append(f"  [{role}]: {text}")
-        history_str = "\n".join(history_lines) if history_lines else "  (first message)"
-
-        # Intel summary
-        intel_parts = []
-        for key, vals in rule_intel.items():
-            if vals:
-                intel_parts.append(f"{key}: {vals[:3]}")
-        intel_summary = "; ".join(intel_parts) if intel_parts else "none yet"
-
-        # Build prompt
-        prompt = _SLM_PROMPT.format(
-            scam_type=scam_type or "UNKNOWN",
-            phase=phase,
-            turn_count=turn_count,
-            message=message_text[:300],
-            history=history_str,
-            rule_detected=rule_detected,
-            rule_confidence=f"{rule_confidence:.2f}",
-            rule_intel_summary=intel_summary,
-            rule_reply=rule_reply[:150],
+    ) -> str:
+        """Full prompt for one turn: the fixed prefix + the suffix, within SLM_PROMPT_TOKEN_BUDGET."""
+        return _SLM_PROMPT_PREFIX + self._prompts.build(
+            message_text, conversation_history, scam_type, self._phase(turn_count), turn_count,
+            rule_detected, rule_confidence, rule_intel, rule_reply,
         )
 
-        # Run inference
-        output = self.pipeline(
-            prompt,
-            max_new_tokens=200,
-            temperature=0.7,
-            do_sample=True,
-            return_full_text=False,
-        )
-
-        generated = output[0]["generated_text"].strip()
-        return self._parse_output(generated, rule_reply)
+    def _generate_batch(self, prompts: List[str], max_new_tokens: int = _MAX_NEW_TOKENS,
+                        use_prefix_cache: bool = True, constrained: bool = True,
+                        cancel_tokens: Optional[list] = None,
+                        deadlines: Optional[List[Optional[float]]] = None) -> List[str]:
+        """
+        Synchronous batched sampling — runs on the batcher's worker thread.
+        Prompts that start with _SLM_PROMPT_PREFIX reuse its cached KV: only the
+        suffixes are encoded, left-padded between prefix and suffix (the
+        attention mask hides the padding and position ids skip it).
+        With the JSON schema loaded, sampling is constrained to the output
+        object and each row ends (EOS) as soon as its closing brace is out;
+        missed_entities lists its prompt does not ask for are closed empty.
+        A row whose cancel token is set stops at the next token step.
+        Rows with a deadline (time.monotonic()) get the tokens that fit before
+        it at the measured rate; a row that cannot fit a useful object is not
+        generated ("" output).
+        """
+        import torch
+
+        clock = StepClock(time.perf_counter())
+        total = len(prompts)
+        rows = list(range(total))
+        limits = None
+        if deadlines is not None:
+            rows, limits = self._deadline_limits(deadlines, max_new_tokens)
+            if not rows:
+                return [""] * total
+            prompts = [prompts[i] for i in rows]
+            if cancel_tokens is not None:
+                cancel_tokens = [cancel_tokens[i] for i in rows]
+            max_new_tokens = max(limits)
+
+        n = len(prompts)
+        prefix_len = len(_SLM_PROMPT_PREFIX)
+        cache = None
+        if (use_prefix_cache and self._prefix_cache is not None
+                and all(p.startswith(_SLM_PROMPT_PREFIX) for p in prompts)):
+            encoded = self.tokenizer(
+                [p[prefix_len:] for p in prompts], return_tensors="pt", padding=True, add_special_tokens=False,
+            ).to(self.device)
+            prefix_ids = self._prefix_ids.expand(n, -1)
+            input_ids = torch.cat([prefix_ids, encoded["input_ids"]], dim=1)
+            attention_mask = torch.cat([torch.ones_like(prefix_ids), encoded["attention_mask"]], dim=1)
+            cache = copy.deepcopy(self._prefix_cache)  # generate() appends to it
+            if n > 1:
+                cache.batch_repeat_interleave(n)
+        else:
+            encoded = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+            input_ids, attention_mask = encoded["input_ids"], encoded["attention_mask"]
+
+        from transformers import LogitsProcessorList
+        processors = LogitsProcessorList([clock])
+        extra = {"logits_processor": processors}
+        if constrained and self._json_schema is not None and min(limits or [max_new_tokens]) > self._json_schema.min_tokens:
+            processors.append(self._json_schema.processor(n, input_ids.shape[1], max_new_tokens, closed=[
+                set(ENTITY_FIELDS) - (wanted_entities(p) or set(ENTITY_FIELDS)) for p in prompts
+            ], limits=limits))
+            extra["eos_token_id"] = self._json_schema.eos_id
+        elif limits is not None:
+            max_new_tokens = min(limits)  # rows can't end at their own limits without the schema
+        cancel = None
+        if cancel_tokens is not None:
+            from transformers import StoppingCriteriaList
+            from slm_cancel import CancelCriteria
+            cancel = CancelCriteria(cancel_tokens, (self.tokenizer.eos_token_id, self.tokenizer.pad_token_id))
+            extra["stopping_criteria"] = StoppingCriteriaList([cancel])
+
+        if SLM_TEMPERATURE > 0:
+            extra.update(do_sample=True, temperature=SLM_TEMPERATURE, top_p=SLM_TOP_P)
+        else:
+            extra["do_sample"] = False  # greedy
+
+        started = time.perf_counter()
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=cache,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **extra,
+            )
+        new_tokens = output[:, input_ids.shape[1]:]  # every row's prompt ends at the same column
+        self.count(tokens=int((new_tokens != self.tokenizer.pad_token_id).sum()),
+                   seconds=time.perf_counter() - started, cancelled=cancel.cancelled if cancel is not None else 0)
+        clock.report(self.rate, n)
+        texts = [self.tokenizer.decode(row, skip_special_tokens=True).strip() for row in new_tokens]
+        if len(rows) == total:
+            return texts
+        outputs = [""] * total
+        for i, text in zip(rows, texts):
+            outputs[i] = text
+        return outputs
+
+    def count(self, tokens: int = 0, seconds: float = 0.0, cancelled: int = 0, **deadline_rows: int):
+        """Add to the generation counters (and deadline_rows by outcome)."""
+        with self._counts_lock:
+            self.generated_tokens += tokens
+            self.generate_seconds += seconds
+            self.cancelled_generations += cancelled
+            for outcome, rows in deadline_rows.items():
+                self.deadline_rows[outcome] += rows
+
+    def count_scored(self, rows: int, seconds: float):
+        with self._counts_lock:
+            self.scored += rows
+            self.score_seconds += seconds
+
+    def _deadline_limits(self, deadlines: List[Optional[float]], max_new_tokens: int):
+        """(rows worth generating, their max_new_tokens) for rows due at deadlines."""
+        now = time.monotonic()
+        floor = min(self._useful_tokens, max_new_tokens)
+        rows, limits = [], []
+        for i, deadline in enumerate(deadlines):
+            fit = self.rate.tokens_within(deadline - now, len(deadlines)) if deadline is not None else None
+            limit = max_new_tokens if fit is None else min(max_new_tokens, fit)
+            if limit < floor:
+                self.count(skipped=1)
+                continue
+            if limit < max_new_tokens:
+                self.count(shortened=1)
+            rows.append(i)
+            limits.append(limit)
+        return rows, limits
+
+    def _score_batch(self, contexts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Logit scoring of a batch — runs on the scorer's worker thread. One
+        forward pass: rows are left-padded between the (KV-cached) header and
+        their context, and only the logits at the two answers are computed.
+        """
+        import torch
+
+        head = self._scoring
+        rows = [head.row(context) for context in contexts]
+        width = max(len(row) for row in rows)
+        pad = self.tokenizer.pad_token_id
+        suffix = torch.tensor([[pad] * (width - len(row)) + row for row in rows], device=self.device)
+        suffix_mask = torch.tensor([[0] * (width - len(row)) + [1] * len(row) for row in rows], device=self.device)
+        header = torch.tensor([head.header_ids], device=self.device).expand(len(rows), -1)
+        attention_mask = torch.cat([torch.ones_like(header), suffix_mask], dim=1)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        cache = None
+        if self._score_prefix_cache is not None:
+            cache = copy.deepcopy(self._score_prefix_cache)
+            if len(rows) > 1:
+                cache.batch_repeat_interleave(len(rows))
+            input_ids, position_ids = suffix, position_ids[:, header.shape[1]:]
+        else:
+            input_ids = torch.cat([header, suffix], dim=1)
+        answers = [input_ids.shape[1] - 1 - len(head.tail_ids), input_ids.shape[1] - 1]
+
+        started = time.perf_counter()
+        kwargs = {"past_key_values": cache, "use_cache": cache is not None}
+        if self.backend != "onnx":
+            kwargs["logits_to_keep"] = torch.tensor(answers, device=self.device)
+        with torch.inference_mode():
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                position_ids=position_ids, **kwargs).logits
+        if logits.shape[1] != len(answers):  # backend returned every position
+            logits = logits[:, answers]
+        outputs = [head.read(logits[i, 0], logits[i, 1]) for i in range(len(rows))]
+        self.count_scored(len(rows), time.perf_counter() - started)
+        return outputs
 
     def _parse_output(self, raw: str, fallback_reply: str) -> Dict[str, Any]:
         """Parse SLM JSON output. Returns clean dict or empty on parse failure."""
@@ -0,0 +1,96 @@
+"""
+SLM gating policy — decides per turn whether the SLM layer can still change
+the outcome, so most turns skip it and the ones that matter still get it.
+
+Checks, in order (first match wins):
+  deferred_in_flight  SLM_DEFERRED: this session's background SLM call is still running (any worker)
+  queue_busy          SLM backlog ≥ SLM_GATE_MAX_QUEUE — protect the rule path
+  cooldown            this session called the SLM < SLM_GATE_COOLDOWN_SECONDS ago
+  not_detected        rules saw no scam — the SLM merge never flips detection
+  run: uncertain      confidence < SLM_GATE_CONF_HIGH — the SLM may refine it
+  run: unclassified   scam type still unset / GENERAL_FRAUD — the SLM may name it
+  confident_complete  confident and every SLM-extractable field is already filled
+  confident_early     confident, first SLM_GATE_EARLY_TURNS turns — nothing asked for yet
+  run: missing_intel  confident, later turn, intelligence still missing
+
+Decisions are counted per reason for /metrics.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config import (
+    SLM_GATE_ENABLED, SLM_GATE_CONF_HIGH,
+    SLM_GATE_COOLDOWN_SECONDS, SLM_GATE_MAX_QUEUE, SLM_GATE_EARLY_TURNS,
+)
+
+# Intelligence fields the SLM's missed_entities can fill
+SLM_INTEL_FIELDS = ("phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks")
+
+
+class SLMGate:
+    """Per-turn run/skip decision plus counters by reason."""
+
+    def __init__(
+        self,
+        enabled: bool = SLM_GATE_ENABLED,
+        conf_high: float = SLM_GATE_CONF_HIGH,
+        cooldown_seconds: float = SLM_GATE_COOLDOWN_SECONDS,
+        max_queue: int = SLM_GATE_MAX_QUEUE,
+        early_turns: int = SLM_GATE_EARLY_TURNS,
+    ):
+        self.enabled = enabled
+        self.conf_high = conf_high
+        self.cooldown_seconds = cooldown_seconds
+        self.max_queue = max_queue
+        self.early_turns = early_turns
+        self.runs: Dict[str, int] = {}
+        self.skips: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def decide(self, session, scam_detected: bool, queue_depth: int = 0, in_flight: bool = False,
+               claim: Optional[Callable[[], bool]] = None) -> Tuple[bool, str]:
+        """
+        (run?, reason) for this turn. A run stamps session.last_slm_at.
+        claim (SLM_DEFERRED) is called once the policy says run; False means another
+        worker started this session's call meanwhile, and the turn is a deferred_in_flight skip.
+        """
+        run, reason = self._policy(session, scam_detected, queue_depth, in_flight, time.time())
+        if run and claim is not None and not claim():
+            run, reason = False, "deferred_in_flight"
+        with self._lock:
+            counts = self.runs if run else self.skips
+            counts[reason] = counts.get(reason, 0) + 1
+        if run:
+            session.last_slm_at = time.time()
+        return run, reason
+
+    def _policy(self, session, scam_detected: bool, queue_depth: int, in_flight: bool,
+                now: float) -> Tuple[bool, str]:
+        if in_flight:  # even ungated: one deferred call per session at a time
+            return False, "deferred_in_flight"
+        if not self.enabled:
+            return True, "ungated"
+        if queue_depth >= self.max_queue:
+            return False, "queue_busy"
+        if session.last_slm_at and now - session.last_slm_at < self.cooldown_seconds:
+            return False, "cooldown"
+        if not scam_detected:
+            return False, "not_detected"
+        if session.confidence_level < self.conf_high:
+            return True, "uncertain"
+        if session.scam_type in (None, "", "GENERAL_FRAUD"):
+            return True, "unclassified"
+        if all(getattr(session.intelligence, field) for field in SLM_INTEL_FIELDS):
+            return False, "confident_complete"
+        if session._turn_count <= self.early_turns:
+            return False, "confident_early"
+        return True, "missing_intel"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"runs": dict(self.runs), "skips": dict(self.skips)}
+
+
+# Global policy used by the /analyze pipeline
+slm_gate = SLMGate()
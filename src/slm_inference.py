@@ -0,0 +1,374 @@
+"""
+SLM inference — where SLMEngine's batches run.
+
+SLMEngine keeps the request path in the API process (gate, result cache,
+prompt building, micro-batching, deadlines, output parsing) and hands each
+batch to one SLMInference, picked by SLM_INFERENCE:
+
+  - local:   the model in this process (SLMEngine.load / _generate_batch)
+  - workers: the model in supervised worker processes (slm_worker.py)
+  - http:    an OpenAI-compatible completion server (llama.cpp's
+             llama-server, vLLM, ...) at SLM_HTTP_URL; rows are streamed over
+             SLM_HTTP_POOL_SIZE keep-alive connections and neither the model
+             nor torch is loaded here
+
+Each one times its batches (calls, rows, errors, p50/p95), so runtimes can be
+compared on the same traffic in stats() and /metrics. Logit scoring and
+constrained JSON decoding need the model's logits and stay local / workers
+only: over http SLM_MODE falls back to generate and the server's text is
+parsed as before.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    SLM_INFERENCE, SLM_INFERENCE_LATENCY_WINDOW, SLM_HTTP_URL, SLM_HTTP_MODEL, SLM_HTTP_API_KEY,
+    SLM_HTTP_POOL_SIZE, SLM_BACKEND, SLM_BATCH_MAX_SIZE, SLM_BATCH_WAIT_MS, SLM_MODEL_PATH, SLM_MODE,
+    SLM_TIMEOUT, SLM_WORKERS, SLM_TEMPERATURE, SLM_TOP_P,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROBE_TIMEOUT = 5.0  # seconds for the server's model list at startup
+_UNHEALTHY_AFTER = 3  # consecutive failed rows before /ready/slm reports the server down
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "p50": round(ordered[(n - 1) // 2], 1),
+        "p95": round(ordered[min(n - 1, int(n * 0.95))], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+class BatchLatency:
+    """Calls, rows, errors and recent durations of one kind of batch (generate or score)."""
+
+    def __init__(self, window: int = SLM_INFERENCE_LATENCY_WINDOW):
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self._ms: Deque[float] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def record(self, rows: int, seconds: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self.rows += rows
+            self.seconds += seconds
+            self.errors += not ok
+            self._ms.append(seconds * 1000)
+
+    def percentile(self, q: float) -> float:
+        """Seconds taken by the q-quantile of recent batches (0 before the first)."""
+        with self._lock:
+            ordered = sorted(self._ms)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] / 1000 if ordered else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "rows": self.rows, "errors": self.errors,
+                    "seconds": round(self.seconds, 3), "latencyMs": _percentiles(list(self._ms))}
+
+
+# ── Interface ──────────────────────────────────────────────────────────
+
+class SLMInference:
+    """
+    Runs the engine's batches: generate(prompts, cancel_tokens=, deadlines=)
+    and score(contexts) are the run_batch callables of its micro-batchers,
+    `concurrency` batches at a time.
+    """
+
+    kind = ""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.concurrency = 1
+        self.latency = {"generate": BatchLatency(), "score": BatchLatency()}
+
+    def start(self) -> bool:
+        """Load or connect, updating the engine's state; True once batches can be served."""
+        raise NotImplementedError
+
+    def serving(self) -> bool:
+        return True
+
+    def generate(self, prompts: List[str], cancel_tokens: Optional[list] = None,
+                 deadlines: Optional[List[Optional[float]]] = None) -> List[str]:
+        with self._timed("generate", len(prompts)):
+            return self._generate(prompts, cancel_tokens, deadlines)
+
+    def score(self, contexts: List[str]) -> List[Dict[str, Any]]:
+        with self._timed("score", len(contexts)):
+            return self._score(contexts)
+
+    def _generate(self, prompts, cancel_tokens, deadlines) -> List[str]:
+        raise NotImplementedError
+
+    def _score(self, contexts) -> List[Dict[str, Any]]:
+        raise RuntimeError(f"logit scoring is not available with SLM_INFERENCE={self.kind}")
+
+    @contextmanager
+    def _timed(self, op: str, rows: int):
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.latency[op].record(rows, time.perf_counter() - started, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "concurrency": self.concurrency,
+                **{op: latency.stats() for op, latency in self.latency.items()}}
+
+    def close(self):
+        pass
+
+
+# ── Implementations ────────────────────────────────────────────────────
+
+class LocalInference(SLMInference):
+    """The model in this process, on the batchers' worker threads."""
+
+    kind = "local"
+
+    def start(self) -> bool:
+        self.engine.load()
+        return self.engine.ready
+
+    def _generate(self, prompts, cancel_tokens, deadlines):
+        return self.engine._generate_batch(prompts, cancel_tokens=cancel_tokens, deadlines=deadlines)
+
+    def _score(self, contexts):
+        return self.engine._score_batch(contexts)
+
+
+class WorkerInference(SLMInference):
+    """The model in supervised worker processes (slm_worker.py); this process only does IPC."""
+
+    kind = "workers"
+
+    def __init__(self, engine, size: int = SLM_WORKERS):
+        super().__init__(engine)
+        self.size = max(1, size)
+        self.pool = None
+
+    def start(self) -> bool:
+        from slm_worker import SLMWorkerPool
+
+        engine = self.engine
+        logger.info(f"[SLM] Starting {self.size} worker process(es) for {SLM_MODEL_PATH} (backend={SLM_BACKEND})...")
+        engine.state = "loading"
+        started = time.perf_counter()
+        pool = SLMWorkerPool(self.size)
+        if not pool.start():
+            logger.error("[SLM] No SLM worker process loaded the model — rule-based responses only")
+            pool.close()
+            engine.state = "failed"
+            return False
+        self.pool = engine.pool = pool
+        self.concurrency = pool.size
+        engine._attach_remote(pool.info(), time.perf_counter() - started)
+        logger.info(
+            f"[SLM] Ready ✅ {pool.alive()}/{pool.size} worker process(es), backend={engine.backend}, "
+            f"load {engine.load_seconds:.1f}s, batch ≤{SLM_BATCH_MAX_SIZE}, window {SLM_BATCH_WAIT_MS}ms"
+        )
+        return True
+
+    def serving(self) -> bool:
+        return self.pool is not None and self.pool.alive() > 0
+
+    def _generate(self, prompts, cancel_tokens, deadlines):
+        engine = self.engine
+        kwargs = {"deadlines": deadlines} if deadlines is not None else {}
+        outputs, tokens, seconds, cancelled, budget = self.pool.run_batch(prompts, cancel_tokens=cancel_tokens, **kwargs)
+        engine.count(tokens=tokens, seconds=seconds, cancelled=cancelled,
+                     **{outcome: budget[outcome] for outcome in engine.deadline_rows})
+        if budget["rate"]:
+            engine.rate.adopt(budget["rate"])
+        return outputs
+
+    def _score(self, contexts):
+        started = time.perf_counter()
+        outputs, _, _, _, _ = self.pool.run_batch(contexts, op="score")
+        self.engine.count_scored(len(contexts), time.perf_counter() - started)
+        return outputs
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+
+class HTTPInference(SLMInference):
+    """
+    An OpenAI-compatible completion server (POST {url}/completions). Each row
+    is its own streamed request, up to pool_size at once over keep-alive
+    connections, so the server batches them as it sees fit. Streaming gives
+    the time to the first token and per token for the deadline rate (one
+    chunk per token, as llama.cpp sends them), and lets a cancelled row close
+    its connection, which stops the server generating it.
+    """
+
+    kind = "http"
+
+    def __init__(self, engine, url: str = SLM_HTTP_URL, model: str = SLM_HTTP_MODEL,
+                 api_key: str = SLM_HTTP_API_KEY, pool_size: int = SLM_HTTP_POOL_SIZE,
+                 max_new_tokens: int = 200):
+        super().__init__(engine)
+        self.url = url.rstrip("/")
+        self.model = model
+        self.pool_size = max(1, pool_size)
+        self.max_new_tokens = max_new_tokens
+        self.concurrency = self.pool_size
+        self.healthy = False  # probe answered and fewer than _UNHEALTHY_AFTER rows failed in a row since
+        self.counters = {"requests": 0, "errors": 0}
+        self._failures = 0  # consecutive failed rows
+        self._lock = threading.Lock()  # rows complete on the pool's threads
+
+        self.http = requests.Session()
+        self.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        self.http.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.http.headers["Authorization"] = f"Bearer {api_key}"
+        self._rows = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="slm-http")
+
+    def start(self) -> bool:
+        engine = self.engine
+        logger.info(f"[SLM] Connecting to completion server at {self.url}...")
+        engine.state = "loading"
+        started = time.perf_counter()
+        try:
+            response = self.http.get(f"{self.url}/models", timeout=_PROBE_TIMEOUT)
+            response.raise_for_status()
+            listed = [m["id"] for m in response.json().get("data", []) if isinstance(m, dict) and m.get("id")]
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"[SLM] Completion server at {self.url} unavailable ({e}) — rule-based responses only")
+            engine.state = "failed"
+            return False
+        if not self.model and listed:
+            self.model = listed[0]
+        seconds = time.perf_counter() - started
+        self.healthy = True
+        if SLM_MODE != "generate":
+            logger.warning(f"[SLM] Logit scoring needs the model's logits — SLM_MODE={SLM_MODE} generates over http")
+        engine._attach_remote({"backend": "http", "loadPhases": {"connect": round(seconds, 3)},
+                               "weightsMmapped": False, "scoring": False, "usefulTokens": None}, seconds)
+        logger.info(f"[SLM] Ready ✅ completion server {self.url}, model {self.model or '(server default)'}, "
+                    f"{self.pool_size} connection(s)")
+        return True
+
+    def serving(self) -> bool:
+        return self.healthy
+
+    def _generate(self, prompts, cancel_tokens, deadlines):
+        engine = self.engine
+        n = len(prompts)
+        rows, limits = list(range(n)), [self.max_new_tokens] * n
+        if deadlines is not None:
+            rows, limits = engine._deadline_limits(deadlines, self.max_new_tokens)
+        started = time.perf_counter()
+        pending = {
+            i: self._rows.submit(self._complete, prompts[i], limit, cancel_tokens[i] if cancel_tokens else None, n)
+            for i, limit in zip(rows, limits)
+        }
+        outputs = [""] * n
+        errors = []
+        for i, future in pending.items():
+            try:
+                outputs[i], tokens, cancelled = future.result()
+            except (requests.RequestException, ValueError) as e:
+                errors.append(e)
+                continue
+            engine.count(tokens=tokens, cancelled=cancelled)
+        engine.count(seconds=time.perf_counter() - started)
+        if errors and len(errors) == len(pending):
+            raise RuntimeError(f"completion server: {errors[0]}")
+        for e in errors:
+            logger.warning(f"[SLM-HTTP] Row failed, falling back to rules: {e}")  # "" = no SLM output
+        return outputs
+
+    def _complete(self, prompt: str, max_tokens: int, cancel, batch_size: int):
+        """One streamed completion → (text, tokens, 1 if cancelled midway else 0)."""
+        if cancel is not None and cancel.is_set():
+            return "", 0, 0
+        body = {"prompt": prompt, "max_tokens": max_tokens, "temperature": SLM_TEMPERATURE, "top_p": SLM_TOP_P,
+                "stream": True}  # same sampling as the local model
+        if self.model:
+            body["model"] = self.model
+        with self._lock:
+            self.counters["requests"] += 1
+        parts: List[str] = []
+        started = time.perf_counter()
+        first = last = None
+        cancelled = 0
+        try:
+            with self.http.post(f"{self.url}/completions", json=body, stream=True, timeout=SLM_TIMEOUT) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if cancel is not None and cancel.is_set():
+                        cancelled = 1  # leaving the block closes the connection
+                        break
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        continue  # read to the end of the body, or the connection can't go back to the pool
+                    choices = json.loads(data).get("choices") or [{}]
+                    text = choices[0].get("text") or ""
+                    if not text:
+                        continue
+                    last = time.perf_counter()
+                    first = first or last
+                    parts.append(text)
+        except (requests.RequestException, ValueError):
+            with self._lock:
+                self.counters["errors"] += 1
+                self._failures += 1
+                if self._failures >= _UNHEALTHY_AFTER:
+                    self.healthy = False
+            raise
+        with self._lock:
+            self._failures = 0
+            self.healthy = True
+        if first is not None and not cancelled:
+            self.engine.rate.observe(batch_size, first - started, len(parts) - 1, last - first)
+        return "".join(parts).strip(), len(parts), cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**super().stats(), "url": self.url, "model": self.model, "poolSize": self.pool_size,
+                "healthy": self.healthy, **counters}
+
+    def close(self):
+        self._rows.shutdown(wait=False, cancel_futures=True)
+        self.http.close()
+
+
+def create_inference(engine, kind: str = SLM_INFERENCE, max_new_tokens: int = 200) -> SLMInference:
+    """Build the configured inference for engine (not started)."""
+    kind = (kind or "local").lower()
+    if kind == "http":
+        return HTTPInference(engine, max_new_tokens=max_new_tokens)
+    if kind == "workers":
+        return WorkerInference(engine)
+    if kind != "local":
+        logger.warning(f"[SLM] Unknown SLM_INFERENCE={kind!r} — using local")
+    return LocalInference(engine)
@@ -0,0 +1,233 @@
+"""
+Constrained JSON decoding for the SLM — generate() can only produce the object
+SLMEngine._parse_output reads:
+
+  {"confidence": 0.85, "scam_type": "...", "missed_entities": {"phoneNumbers": ["..."],
+   "upiIds": [], "bankAccounts": [], "emailAddresses": [], "phishingLinks": []},
+   "reply": "...", "insight": "..."}
+
+Keys and punctuation are forced token by token; the model only picks values.
+Strings cannot contain quotes, backslashes or control characters, and only
+tokens that fit the remaining characters of their length limit are allowed; arrays hold at most MAX_ITEMS strings.
+Per row, missed_entities lists the prompt did not ask for are closed at once ([]).
+When the max_new_tokens budget (or the row's own limit, from its deadline)
+runs low the open value is closed early, so the object is always complete, and once "}" is out the row gets EOS — generate()
+stops as soon as every row in the batch has closed its object.
+
+Built once per tokenizer (JSONSchema), one JSONLogitsProcessor per generate().
+"""
+from typing import List, Optional, Sequence, Set
+
+import torch
+from transformers import LogitsProcessor
+
+ENTITY_KEYS = ("phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks")
+STRING_LIMITS = {"scam_type": 40, "reply": 400, "insight": 200}  # characters
+ENTITY_LIMIT = 64   # characters per missed entity
+MAX_ITEMS = 3       # per missed_entities list
+MAX_DIGITS = 2      # confidence fraction tokens: 0.DD
+
+
+def _segments() -> list:
+    """The object as a flat sequence of forced literals and value slots."""
+    segments = [("lit", '{"confidence": '), ("num",),
+                ("lit", ' "scam_type": "'), ("str", STRING_LIMITS["scam_type"]),
+                ("lit", ', "missed_entities": {')]
+    for i, key in enumerate(ENTITY_KEYS):
+        segments += [("lit", f'{", " if i else ""}"{key}": ['), ("arr", key)]
+    segments += [("lit", '}, "reply": "'), ("str", STRING_LIMITS["reply"]),
+                 ("lit", ', "insight": "'), ("str", STRING_LIMITS["insight"]),
+                 ("lit", "}")]
+    return segments
+
+
+class JSONSchema:
+    """Token tables for one tokenizer. Raises ValueError if the tokenizer can't express the schema."""
+
+    def __init__(self, tokenizer):
+        self.eos_id = tokenizer.eos_token_id
+        if self.eos_id is None:
+            raise ValueError("tokenizer has no EOS token")
+
+        def single(char: str) -> int:
+            ids = tokenizer.encode(char, add_special_tokens=False)
+            if len(ids) != 1:
+                raise ValueError(f"{char!r} is not a single token")
+            return ids[0]
+
+        self.quote, self.comma, self.close_bracket = single('"'), single(","), single("]")
+        self.zero, self.one, self.dot = single("0"), single("1"), single(".")
+
+        vocab = len(tokenizer)
+        texts = tokenizer.batch_decode([[i] for i in range(vocab)])
+        special = set(tokenizer.all_special_ids)
+        self.text_len = [len(t) for t in texts]
+        self.text_len_t = torch.tensor(self.text_len)
+        string_ok = torch.zeros(vocab, dtype=torch.bool)
+        digits = torch.zeros(vocab, dtype=torch.bool)
+        for i, text in enumerate(texts):
+            if not text or i in special:
+                continue
+            string_ok[i] = not any(c in '"\\' or ord(c) < 0x20 for c in text)
+            digits[i] = text.isascii() and text.isdigit()
+        self.string_ok = string_ok
+        self.digits = digits
+        self.digits_or_comma = digits.clone()
+        self.digits_or_comma[self.comma] = True
+
+        self.segments = []
+        for seg in _segments():
+            if seg[0] == "lit":
+                seg = ("lit", tokenizer.encode(seg[1], add_special_tokens=False))
+            self.segments.append(seg)
+        # Fewest tokens that finish the object from the start of segment i (incl. EOS)
+        cost = {"num": 2, "str": 1, "arr": 1}
+        self.tail_cost = [1] * (len(self.segments) + 1)
+        for i in range(len(self.segments) - 1, -1, -1):
+            seg = self.segments[i]
+            self.tail_cost[i] = self.tail_cost[i + 1] + (len(seg[1]) if seg[0] == "lit" else cost[seg[0]])
+
+    @property
+    def min_tokens(self) -> int:
+        return self.tail_cost[0]
+
+    def processor(self, batch_size: int, prompt_len: int, max_new_tokens: int,
+                  closed: Optional[Sequence[Set[str]]] = None,
+                  limits: Optional[Sequence[int]] = None) -> "JSONLogitsProcessor":
+        """closed: per row, the ENTITY_KEYS lists forced empty; limits: per row, tokens (≤ max_new_tokens)."""
+        return JSONLogitsProcessor(self, batch_size, prompt_len, max_new_tokens, closed, limits)
+
+
+class _RowState:
+    __slots__ = ("seg", "pos", "phase", "chars", "items", "closed")
+
+    def __init__(self, closed: Set[str] = frozenset()):
+        self.seg = 0      # index into JSONSchema.segments (== len → object closed)
+        self.pos = 0      # next token of a literal
+        self.phase = ""   # sub-state inside num / arr
+        self.chars = 0    # characters in the open string
+        self.items = 0    # strings in the open array
+        self.closed = closed  # missed_entities keys whose arrays stay empty
+
+
+class JSONLogitsProcessor(LogitsProcessor):
+    """Masks every token that would leave the schema; one state machine per row."""
+
+    def __init__(self, schema: JSONSchema, batch_size: int, prompt_len: int, max_new_tokens: int,
+                 closed: Optional[Sequence[Set[str]]] = None, limits: Optional[Sequence[int]] = None):
+        self.schema = schema
+        self.prompt_len = prompt_len
+        self.max_new_tokens = max_new_tokens
+        self.limits = [min(limit, max_new_tokens) for limit in limits] if limits else [max_new_tokens] * batch_size
+        self.rows: List[_RowState] = [_RowState(closed[r] if closed else frozenset()) for r in range(batch_size)]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        step = input_ids.shape[1] - self.prompt_len
+        if step > 0:
+            for state, token in zip(self.rows, input_ids[:, -1].tolist()):
+                self._advance(state, token)
+        width = min(len(self.schema.string_ok), scores.shape[1])
+        allowed = torch.zeros_like(scores, dtype=torch.bool)
+        for r, state in enumerate(self.rows):
+            choice = self._allowed(state, self.limits[r] - step)
+            if isinstance(choice, int):
+                allowed[r, choice] = True
+            else:
+                allowed[r, :width] = choice[:width]
+        return scores.masked_fill(~allowed, float("-inf"))
+
+    def _next(self, state: _RowState):
+        state.seg += 1
+        state.pos = state.chars = state.items = 0
+        kind = self.schema.segments[state.seg][0] if state.seg < len(self.schema.segments) else ""
+        state.phase = {"num": "start", "arr": "open"}.get(kind, "")
+
+    def _advance(self, state: _RowState, token: int):
+        """Move one row's state past the token it just produced."""
+        s = self.schema
+        if state.seg >= len(s.segments):
+            return
+        kind = s.segments[state.seg][0]
+        if kind == "lit":
+            state.pos += 1
+            if state.pos == len(s.segments[state.seg][1]):
+                self._next(state)
+        elif kind == "num":
+            if token == s.comma:
+                self._next(state)
+            elif state.phase == "start":
+                state.phase = "one" if token == s.one else "zero"
+            elif token == s.dot:
+                state.phase = "dot"
+            else:
+                state.phase = "frac"
+                state.items += 1
+        elif kind == "str":
+            if token == s.quote:
+                self._next(state)
+            else:
+                state.chars += s.text_len[token]
+        elif state.phase == "item":  # arr
+            if token == s.quote:
+                state.phase = "after"
+                state.items += 1
+            else:
+                state.chars += s.text_len[token]
+        elif token == s.close_bracket:
+            self._next(state)
+        elif token == s.comma:
+            state.phase = "comma"
+        elif token == s.quote:
+            state.phase = "item"
+            state.chars = 0
+
+    def _allowed(self, state: _RowState, remaining: int):
+        """Forced token id, or a vocab mask of allowed tokens."""
+        s = self.schema
+        if state.seg >= len(s.segments):
+            return s.eos_id
+        kind = s.segments[state.seg][0]
+        need = s.tail_cost[state.seg + 1]  # tokens the rest of the object needs after this value
+        if kind == "lit":
+            return s.segments[state.seg][1][state.pos]
+        if kind == "num":
+            if state.phase == "start":
+                return s.zero if remaining < need + 3 else _ids_mask(s, s.zero, s.one)
+            if state.phase == "one" or (state.phase != "dot" and remaining <= need + 1):
+                return s.comma
+            if state.phase == "zero":
+                return s.comma if remaining < need + 3 else _ids_mask(s, s.dot, s.comma)
+            if state.phase == "dot":
+                return s.digits
+            return s.comma if state.items >= MAX_DIGITS else s.digits_or_comma
+        if kind == "str":
+            if state.chars >= s.segments[state.seg][1] or remaining <= need + 1:
+                return s.quote
+            return _string_mask(s, s.segments[state.seg][1] - state.chars)
+        # arr
+        if state.phase == "open":
+            if s.segments[state.seg][1] in state.closed or remaining < need + 3:
+                return s.close_bracket
+            return _ids_mask(s, s.quote, s.close_bracket)
+        if state.phase == "item":
+            if state.chars >= ENTITY_LIMIT or remaining <= need + 2:
+                return s.quote
+            return _string_mask(s, ENTITY_LIMIT - state.chars)
+        if state.phase == "comma":
+            return s.quote
+        if state.items < MAX_ITEMS and remaining >= need + 4:
+            return _ids_mask(s, s.comma, s.close_bracket)
+        return s.close_bracket
+
+
+def _ids_mask(schema: JSONSchema, *ids: int) -> torch.Tensor:
+    mask = torch.zeros(len(schema.string_ok), dtype=torch.bool)
+    mask[list(ids)] = True
+    return mask
+
+
+def _string_mask(schema: JSONSchema, room: int) -> torch.Tensor:
+    """String tokens that fit in room characters, plus the closing quote."""
+    mask = schema.string_ok & (schema.text_len_t <= room)
+    mask[schema.quote] = True
+    return mask
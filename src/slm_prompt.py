@@ -0,0 +1,206 @@
+"""
+Token-budgeted per-turn prompt for the SLM (the part after the cached prefix).
+
+Prefill time grows with the prompt, so the suffix is measured with the model's
+own tokenizer and held to SLM_PROMPT_TOKEN_BUDGET tokens:
+
+  - empty sections are left out (no "(first message)", "none yet", UNKNOWN type)
+  - MISSING INTEL names only the missed_entities lists the rules have not
+    filled; constrained decoding closes the others at once (slm_json.py)
+  - history is condensed by relevance, not by position: scammer lines, lines
+    with numbers / UPI IDs / links, and scam keywords rank first, repeats are
+    dropped, and the kept lines stay in conversation order
+  - long fields are cut at token boundaries; over budget, history goes first,
+    then the rule reply, and the message is cut last
+
+Counting only needs a fast tokenizer's offsets, so the API process with
+remote inference (workers, http) uses the standalone `tokenizers` library
+(no torch).
+"""
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import SLM_MODEL_PATH, SLM_PROMPT_TOKEN_BUDGET
+from scam_detector import detect_scam
+
+logger = logging.getLogger(__name__)
+
+ENTITY_FIELDS = ("phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks")
+MISSING_LABEL = "MISSING INTEL: "
+HISTORY_CANDIDATES = 12  # most recent history messages considered for the condensed history
+
+_MESSAGE_TOKENS = 96   # caps per field, before the overall budget
+_REPLY_TOKENS = 40
+_INTEL_TOKENS = 48
+_LINE_TOKENS = 32
+_MIN_MESSAGE_TOKENS = 16
+
+# Section templates, in prompt order (also part of the result cache salt)
+TEMPLATE = (
+    "SCAM TYPE: {scam_type}\n",
+    "CONVERSATION PHASE: {phase}\nTURN NUMBER: {turn_count}\n\n",
+    'SCAMMER\'S MESSAGE: "{message}"\n\n',
+    "RELEVANT HISTORY:\n{history}\n\n",
+    "RULE-BASED ANALYSIS:\n- Detected scam: {rule_detected} (confidence {rule_confidence})\n",
+    "- Extracted: {intel}\n",
+    '- Rule reply: "{rule_reply}"\n',
+    MISSING_LABEL + "{missing}\n\nJSON:",
+)
+
+_INTEL_RE = re.compile(r"\d{6,}|@|https?://|www\.", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+Offsets = Callable[[str], List[Tuple[int, int]]]
+
+
+def _estimate_offsets(text: str) -> List[Tuple[int, int]]:
+    """~4 characters per token — only when no tokenizer could be loaded."""
+    return [(i, min(i + 4, len(text))) for i in range(0, len(text), 4)]
+
+
+def _backend_offsets(tokenizer) -> Offsets:
+    """Offsets from a private `tokenizers.Tokenizer` (the batch thread's one changes padding per call)."""
+    tokenizer.no_padding()
+    tokenizer.no_truncation()
+
+    def offsets(text: str) -> List[Tuple[int, int]]:
+        return tokenizer.encode(text, add_special_tokens=False).offsets
+    return offsets
+
+
+def tokenizer_offsets(tokenizer=None, model_path: str = SLM_MODEL_PATH,
+                      hub_id: str = "HuggingFaceTB/SmolLM2-135M-Instruct") -> Optional[Offsets]:
+    """
+    Offsets with the model's tokenizer: a copy of a loaded transformers fast
+    tokenizer, else tokenizer.json via `tokenizers` alone (no torch import).
+    None (token estimates) if neither is available.
+    """
+    try:
+        from tokenizers import Tokenizer
+
+        if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+            return _backend_offsets(Tokenizer.from_str(tokenizer.backend_tokenizer.to_str()))
+        path = os.path.join(model_path, "tokenizer.json")
+        return _backend_offsets(Tokenizer.from_file(path) if os.path.isfile(path) else Tokenizer.from_pretrained(hub_id))
+    except Exception as e:
+        logger.warning(f"[SLM] Tokenizer for prompt budgeting unavailable ({e}) — estimating tokens")
+        return None
+
+
+def wanted_entities(prompt: str) -> Optional[Set[str]]:
+    """missed_entities fields a prompt asks for (its MISSING INTEL line); None if it has none."""
+    at = prompt.rfind(MISSING_LABEL)
+    if at < 0:
+        return None
+    listed = prompt[at + len(MISSING_LABEL):].split("\n", 1)[0]
+    return {field for field in ENTITY_FIELDS if field in listed}
+
+
+def _normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+class PromptBuilder:
+    """Builds the per-turn suffix within a token budget, counted with offsets()."""
+
+    def __init__(self, offsets: Optional[Offsets] = None, budget: int = SLM_PROMPT_TOKEN_BUDGET):
+        self.offsets = offsets or _estimate_offsets
+        self.estimated = offsets is None
+        self.budget = budget
+
+    def count(self, text: str) -> int:
+        return len(self.offsets(text)) if text else 0
+
+    def cut(self, text: str, max_tokens: int) -> str:
+        """text shortened to at most max_tokens tokens, at a token boundary."""
+        spans = self.offsets(text)
+        if len(spans) <= max_tokens:
+            return text
+        return text[:spans[max_tokens - 1][1]].rstrip() if max_tokens > 0 else ""
+
+    @staticmethod
+    def _relevance(item: Dict, position: float) -> float:
+        text = item.get("text", "")
+        score = position  # 0 → oldest candidate, 1 → latest
+        if item.get("sender") == "scammer":
+            score += 1.0
+        if _INTEL_RE.search(text):
+            score += 1.5
+        score += 0.3 * min(len(detect_scam(text)[1]), 5)
+        return score
+
+    def _history_lines(self, message_text: str, history: Sequence[Dict]) -> List[Tuple[float, int, str]]:
+        """(relevance, position, line) for each distinct candidate history message."""
+        candidates = list(history)[-HISTORY_CANDIDATES:]
+        seen = {_normalize(message_text)}
+        lines = []
+        for i in range(len(candidates) - 1, -1, -1):  # newest first: a repeat keeps its latest position
+            item = candidates[i]
+            text = item.get("text", "")
+            key = _normalize(text)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            line = f"  [{item.get('sender', 'unknown')}]: {self.cut(text, _LINE_TOKENS)}"
+            lines.append((self._relevance(item, (i + 1) / len(candidates)), i, line))
+        return lines
+
+    def build(self, message_text: str, history: Sequence[Dict], scam_type: str, phase: str,
+              turn_count: int, rule_detected: bool, rule_confidence: float,
+              rule_intel: Dict[str, List[str]], rule_reply: str) -> str:
+        """The suffix: every section that has content, within the budget."""
+        missing = [field for field in ENTITY_FIELDS if not rule_intel.get(field)]
+        intel = self.cut("; ".join(f"{key} {', '.join(vals[:3])}" for key, vals in rule_intel.items() if vals),
+                         _INTEL_TOKENS)
+        reply = self.cut(rule_reply, _REPLY_TOKENS)
+        sections = {
+            0: TEMPLATE[0].format(scam_type=scam_type) if scam_type and scam_type != "UNKNOWN" else "",
+            1: TEMPLATE[1].format(phase=phase, turn_count=turn_count),
+            4: TEMPLATE[4].format(rule_detected=rule_detected, rule_confidence=f"{rule_confidence:.2f}"),
+            5: TEMPLATE[5].format(intel=intel) if intel else "",
+            6: TEMPLATE[6].format(rule_reply=reply) if reply else "",
+            7: TEMPLATE[7].format(missing=", ".join(missing) or "none"),
+        }
+        lines = sorted(self._history_lines(message_text, history), reverse=True)
+        history_header = self.count(TEMPLATE[3].format(history=""))
+
+        def joined() -> str:
+            return "".join(text for _, text in sorted(sections.items()))
+
+        # Sections are measured joined (separate counts overestimate). The message
+        # may use what is left after the most relevant history line.
+        sections[2] = TEMPLATE[2].format(message="")
+        room = self.budget - self.count(joined())
+        reserve = history_header + self.count(lines[0][2]) + 1 if lines else 0
+        message = self.cut(message_text, max(_MIN_MESSAGE_TOKENS, min(_MESSAGE_TOKENS, room - reserve - 1)))
+        sections[2] = TEMPLATE[2].format(message=message)
+
+        # Most relevant history lines that fit what is left, in conversation order
+        room = self.budget - self.count(joined()) - history_header
+        kept = []
+        for score, position, line in lines:
+            cost = self.count(line) + 1  # + newline
+            if cost <= room:
+                kept.append((position, line))
+                room -= cost
+        sections[3] = TEMPLATE[3].format(history="\n".join(line for _, line in sorted(kept))) if kept else ""
+
+        # Line counts can still shift once joined, and a small budget
+        # may not fit the fixed sections: drop history (least relevant first), then
+        # the rule reply, then shorten the message, until it fits
+        suffix = joined()
+        while (over := self.count(suffix) - self.budget) > 0:
+            if kept:
+                kept.pop()
+                sections[3] = TEMPLATE[3].format(history="\n".join(line for _, line in sorted(kept))) if kept else ""
+            elif sections[6]:
+                sections[6] = ""
+            elif self.count(message) > _MIN_MESSAGE_TOKENS:
+                message = self.cut(message, max(_MIN_MESSAGE_TOKENS, self.count(message) - over))
+                sections[2] = TEMPLATE[2].format(message=message)
+            else:
+                break  # the rest is the minimum prompt
+            suffix = joined()
+        return suffix
@@ -0,0 +1,109 @@
+"""
+Logit scoring for the SLM — scam confidence and scam type from one forward
+pass, no sampling. Each message is one row:
+
+    <fixed header: the get_scam_type labels as lettered options>
+    MESSAGE: "..."  (+ recent history)
+    QUESTION: Is this message part of a scam or fraud attempt? Answer yes or no.
+    ANSWER:│ yes                                       ← scam logits read here
+    QUESTION: Which kind of scam is it? Answer with the letter.
+    ANSWER:│                                           ← type logits read here
+
+  - scam probability: P(yes) / (P(yes) + P(no)) at the first answer
+  - scam types: the distribution over the option letters at the second answer
+    (conditioned on the forced " yes"), renormalised and ranked
+
+Both answers sit at fixed distances from the end of the row, so a batch needs
+only those two positions of logits. The header is identical on every call and
+comes first, so its KV cache can be computed once (SLMEngine._score_batch).
+
+Built once per tokenizer (ScoringHead).
+"""
+from typing import Dict, List, Sequence
+
+from scam_detector import SCAM_TYPES
+
+# One-line description per label, shown with the multiple-choice options
+LABEL_HINTS = {
+    "OTP_FRAUD": "asks for an OTP, PIN or CVV",
+    "LOTTERY_SCAM": "prize, lottery or reward to claim",
+    "INVESTMENT_SCAM": "investment, trading or crypto profits",
+    "JOB_SCAM": "job, part-time or work-from-home offer",
+    "INSURANCE_SCAM": "insurance policy or premium",
+    "TAX_SCAM": "income tax notice or tax refund",
+    "CUSTOMS_SCAM": "parcel held or seized by customs",
+    "ELECTRICITY_SCAM": "electricity bill or power cut",
+    "REFUND_SCAM": "refund, cashback or compensation",
+    "ACCOUNT_THREAT": "account blocked, suspended or frozen",
+    "PHISHING": "a link to click",
+    "UPI_FRAUD": "UPI payment or money transfer",
+    "KYC_FRAUD": "KYC update or verification",
+    "BANK_FRAUD": "bank account, ATM card or bank transfer",
+    "GOVT_SCAM": "government official or ministry",
+    "GENERAL_FRAUD": "other fraud",
+}
+
+_MESSAGE_LIMIT = 300   # characters of the scammer's message
+_HISTORY_LIMIT = 100   # characters per history line
+
+SCORE_HEADER = """You screen messages that strangers send to a 67-year-old retired man in India.
+Kinds of scam:
+{options}
+
+"""
+_SCAM_QUESTION = "\nQUESTION: Is this message part of a scam or fraud attempt? Answer yes or no.\nANSWER:"
+_TYPE_TAIL = " yes\nQUESTION: Which kind of scam is it? Answer with the letter.\nANSWER:"
+
+
+def context_block(message_text: str, history: Sequence[Dict]) -> str:
+    """The per-message part of a scoring row (the scorer batcher's unit of work)."""
+    lines = [f'MESSAGE: "{message_text[:_MESSAGE_LIMIT]}"']
+    if history:
+        lines.append("EARLIER IN THE CONVERSATION:")
+        lines += [f"  [{h.get('sender', 'unknown')}]: {h.get('text', '')[:_HISTORY_LIMIT]}" for h in history]
+    return "\n".join(lines)
+
+
+class ScoringHead:
+    """Prompt and answer-token tables for one tokenizer. Raises ValueError if the answers aren't distinct tokens."""
+
+    def __init__(self, tokenizer, labels: Sequence[str] = SCAM_TYPES):
+        self.tokenizer = tokenizer
+        self.labels = list(labels)
+        letters = [chr(ord("A") + i) for i in range(len(self.labels))]
+        self.header = SCORE_HEADER.format(options="\n".join(
+            f"{letter}) {label.replace('_', ' ').title()}: {LABEL_HINTS.get(label, label)}"
+            for letter, label in zip(letters, self.labels)
+        ))
+
+        def first_tokens(words: Sequence[str]) -> List[int]:
+            # Answers follow "ANSWER:", so the model's next token is " yes", " A", ...
+            ids = [tokenizer.encode(word, add_special_tokens=False)[:1] for word in words]
+            if any(not i for i in ids):
+                raise ValueError(f"answer {words} does not encode")
+            return [i[0] for i in ids]
+
+        self.yes_ids = sorted(set(first_tokens([" yes", " Yes"])))
+        self.no_ids = sorted(set(first_tokens([" no", " No"])))
+        self.letter_ids = first_tokens([f" {letter}" for letter in letters])
+        if set(self.yes_ids) & set(self.no_ids) or len(set(self.letter_ids)) != len(letters):
+            raise ValueError("answer tokens are not distinct")
+        self.header_ids = tokenizer.encode(self.header)
+        self.tail_ids = tokenizer.encode(_TYPE_TAIL, add_special_tokens=False)
+        if self.tail_ids[0] != first_tokens([" yes"])[0]:
+            raise ValueError("forced answer does not start with the yes token")
+
+    def row(self, context: str) -> List[int]:
+        """Token ids of one message's row after the header; its scam answer is read len(tail_ids) from the end."""
+        return self.tokenizer.encode(context + _SCAM_QUESTION, add_special_tokens=False) + self.tail_ids
+
+    def read(self, scam_logits, type_logits) -> Dict:
+        """Next-token logits at the two answers → scam probability and ranked scam types."""
+        scam = scam_logits.float().softmax(-1)
+        yes, no = float(scam[self.yes_ids].sum()), float(scam[self.no_ids].sum())
+        types = type_logits.float()[self.letter_ids].softmax(-1).tolist()
+        ranked = sorted(zip(self.labels, types), key=lambda item: item[1], reverse=True)
+        return {
+            "scam_probability": round(yes / (yes + no), 4) if yes + no > 0 else 0.5,
+            "scam_types": [[label, round(p, 4)] for label, p in ranked],
+        }
@@ -0,0 +1,320 @@
+"""
+SLM worker processes — the model hosted outside the uvicorn process.
+
+With SLM_INFERENCE=workers (SLM_WORKERS > 0) the API process never loads
+torch: WorkerInference (slm_inference.py) starts this pool, each worker
+process loads the model and serves _generate_batch over a pipe, one batch at
+a time. The gate, the result cache
+and the micro-batcher stay in the API process, which only does IPC, so a
+running generation no longer competes with rule-only requests for the GIL.
+
+  - weights are shared read-only: the torch backend keeps the safetensors
+    checkpoint mmap-ed, so every worker maps the same page-cache pages
+    (int8 and onnx hold private copies — size SLM_WORKERS for that)
+  - CPU cores (less SLM_RESERVED_CORES for the API process) are split into
+    disjoint slices, one per worker; each worker pins itself to its slice and
+    calibrates its torch thread count within it (slm_cpu.py), and workers run
+    at a lower scheduling priority (SLM_WORKER_NICE) so that where they share
+    cores with the API process, rule-only requests go first
+  - supervision: a worker that exits, or does not answer a batch within
+    SLM_WORKER_HANG_SECONDS, is killed and respawned with backoff; its batch
+    fails over to the rule path and /analyze keeps serving
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import SLM_BATCH_MAX_SIZE, SLM_WORKERS, SLM_WORKER_HANG_SECONDS, SLM_WORKER_NICE, SLM_TIMEOUT
+from slm_cpu import slm_cores, split_cores, usable_cores
+
+logger = logging.getLogger(__name__)
+
+# fork would copy the parent's threads and locks into the child; spawn starts clean
+_ctx = multiprocessing.get_context("spawn")
+
+_LOAD_TIMEOUT = 600.0       # seconds a worker may take to load (first start may download)
+_RESPAWN_BACKOFF_BASE = 0.5
+_RESPAWN_BACKOFF_MAX = 30.0
+_CANCEL_POLL_SECONDS = 0.05  # how often a busy batch's cancel tokens are copied to the worker
+
+
+class _SharedFlag:
+    """Cancellation token backed by one slot of a shared-memory array (set by the API process)."""
+
+    def __init__(self, flags, index: int):
+        self.flags = flags
+        self.index = index
+
+    def is_set(self) -> bool:
+        return bool(self.flags[self.index])
+
+
+def _proc_memory(pid: int) -> Dict[str, float]:
+    """Resident and shared (page cache / mmap) memory of a process in MB."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) / 1000
+    except (OSError, ValueError):
+        return {"rssMb": 0.0, "sharedMb": 0.0}
+    return {
+        "rssMb": round(fields.get("Rss", 0.0), 1),
+        "sharedMb": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+    }
+
+
+def _worker_main(index: int, conn, flags, cores: List[int], shared: List[int], nice: int):
+    """Worker process entry point: load the model on its cores, then serve batches until the pipe closes."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - slm-worker-{index} - %(levelname)s - %(message)s",
+    )
+    if nice:
+        os.nice(nice)
+
+    from slm_engine import slm_engine
+    slm_engine.load(cores=cores, floating=shared)
+    if not slm_engine.ready:
+        conn.send(("failed", "model did not load"))
+        return
+    conn.send(("ready", {
+        "pid": os.getpid(),
+        "backend": slm_engine.backend,
+        "loadSeconds": slm_engine.load_seconds,
+        "loadPhases": slm_engine.load_phases,
+        "weightsMmapped": slm_engine.weights_mmapped,
+        "scoring": slm_engine.scoring_ready,
+        "usefulTokens": slm_engine._useful_tokens,
+        "rssBaseline": slm_engine._rss_baseline,
+        "cpu": slm_engine.cpu,
+    }))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return  # API process went away
+        if message is None:
+            return
+        prompts, kwargs = message
+        tokens, seconds = slm_engine.generated_tokens, slm_engine.generate_seconds
+        cancelled = slm_engine.cancelled_generations
+        deadline_rows = dict(slm_engine.deadline_rows)
+        cancel_tokens = [_SharedFlag(flags, i) for i in range(len(prompts))]
+        try:
+            if kwargs.pop("op", "generate") == "score":
+                outputs = slm_engine._score_batch(prompts)
+            else:
+                outputs = slm_engine._generate_batch(prompts, cancel_tokens=cancel_tokens, **kwargs)
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        budget = {outcome: slm_engine.deadline_rows[outcome] - deadline_rows[outcome] for outcome in deadline_rows}
+        budget["rate"] = slm_engine.rate.snapshot()
+        conn.send(("ok", outputs, slm_engine.generated_tokens - tokens, slm_engine.generate_seconds - seconds,
+                   slm_engine.cancelled_generations - cancelled, budget))
+
+
+class _Worker:
+    """One worker process and the API-side end of its pipe."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.info: dict = {}   # set by the ready handshake
+        self.restarts = 0
+        self.busy = False
+        self.flags = _ctx.Array("b", SLM_BATCH_MAX_SIZE, lock=False)  # per-row cancel tokens
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.info) and self.process is not None and self.process.is_alive()
+
+
+class SLMWorkerPool:
+    """Fixed set of supervised SLM worker processes; run_batch() hands a batch to an idle one."""
+
+    def __init__(self, size: int = SLM_WORKERS, hang_seconds: float = SLM_WORKER_HANG_SECONDS,
+                 nice: int = SLM_WORKER_NICE, load_timeout: float = _LOAD_TIMEOUT):
+        self.size = max(1, size)
+        self.hang_seconds = hang_seconds
+        self.nice = max(0, nice)
+        self.load_timeout = load_timeout
+        self.shared = slm_cores(usable_cores())  # cores left for the SLM after the API process's reserve
+        self.cores = split_cores(self.shared, self.size)
+        self.workers = [_Worker(i) for i in range(self.size)]
+        self.counters = {"batches": 0, "errors": 0, "crashes": 0, "hangs": 0, "restarts": 0}
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = False
+
+    # ── Lifecycle ──
+
+    def _spawn(self, worker: _Worker):
+        parent_conn, child_conn = _ctx.Pipe()
+        worker.process = _ctx.Process(
+            target=_worker_main,
+            args=(worker.index, child_conn, worker.flags, self.cores[worker.index], self.shared, self.nice),
+            name=f"slm-worker-{worker.index}", daemon=True,
+        )
+        worker.info = {}
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+
+    def _handshake(self, worker: _Worker, timeout: float) -> bool:
+        """Wait for the worker's load result; an idle, serving worker on success."""
+        try:
+            if not worker.conn.poll(timeout):
+                raise TimeoutError(f"not loaded after {timeout:.0f}s")
+            status, info = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            status, info = "failed", str(e) or f"exited with code {worker.process.exitcode}"
+        if status != "ready":
+            logger.error(f"[SLM-WORKER] Worker {worker.index} failed to load: {info}")
+            self._kill(worker)
+            return False
+        worker.info = info
+        self._idle.put(worker)
+        logger.info(
+            f"[SLM-WORKER] Worker {worker.index} ready (pid {info['pid']}, backend={info['backend']}, "
+            f"{info['cpu']['threads']} thread(s) on cores {info['cpu']['cores']}, load {info['loadSeconds']:.1f}s)"
+        )
+        return True
+
+    def start(self) -> bool:
+        """Spawn every worker and wait for them to load (in parallel). True if any serves."""
+        for worker in self.workers:
+            self._spawn(worker)
+        deadline = time.monotonic() + self.load_timeout
+        loaded = [self._handshake(w, max(0.0, deadline - time.monotonic())) for w in self.workers]
+        return any(loaded)
+
+    @staticmethod
+    def _kill(worker: _Worker):
+        worker.info = {}
+        if worker.conn is not None:
+            worker.conn.close()
+        if worker.process is not None:
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join(timeout=5)
+
+    def _restart(self, worker: _Worker, reason: str):
+        pid = worker.process.pid if worker.process else None
+        logger.error(f"[SLM-WORKER] Worker {worker.index} (pid {pid}) {reason} — restarting")
+        self._kill(worker)
+        threading.Thread(target=self._respawn, args=(worker,), name=f"slm-respawn-{worker.index}",
+                         daemon=True).start()
+
+    def _respawn(self, worker: _Worker):
+        attempt = 0
+        while not self._closed:
+            time.sleep(min(_RESPAWN_BACKOFF_MAX, _RESPAWN_BACKOFF_BASE * 2 ** attempt))
+            worker.restarts += 1
+            self.counters["restarts"] += 1
+            self._spawn(worker)
+            if self._handshake(worker, self.load_timeout):
+                return
+            attempt += 1
+
+    def close(self):
+        self._closed = True
+        for worker in self.workers:
+            if worker.alive:
+                try:
+                    worker.conn.send(None)
+                    worker.process.join(timeout=2)
+                except OSError:
+                    pass
+            self._kill(worker)
+
+    # ── Work ──
+
+    def run_batch(self, prompts: List[str], cancel_tokens: Optional[list] = None,
+                  **kwargs) -> Tuple[List[str], int, float, int, dict]:
+        """
+        Generate on the next idle worker (blocking, called from the batcher's
+        thread). Returns (outputs, generated tokens, generate seconds, cancelled
+        rows, deadline sizing: shortened / skipped rows and the worker's token
+        rate); raises if no worker frees up within SLM_TIMEOUT or the worker
+        fails. Set cancel_tokens are forwarded to the worker while it decodes.
+        op="score" runs logit scoring (_score_batch) instead.
+        """
+        deadline = time.monotonic() + SLM_TIMEOUT
+        while True:
+            try:
+                worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise RuntimeError("no SLM worker available") from None
+            if worker.process.is_alive():
+                break
+            self.counters["crashes"] += 1  # died while idle — replace it, try the next one
+            self._restart(worker, f"exited with code {worker.process.exitcode} while idle")
+
+        tokens = list(cancel_tokens or [])[:len(worker.flags)]
+        for i in range(len(worker.flags)):
+            worker.flags[i] = 0
+        worker.busy = True
+        try:
+            worker.conn.send((prompts, kwargs))
+            hang_deadline = time.monotonic() + self.hang_seconds
+            while not worker.conn.poll(_CANCEL_POLL_SECONDS if tokens else self.hang_seconds):
+                for i, token in enumerate(tokens):
+                    if token is not None and token.is_set():
+                        worker.flags[i] = 1
+                if time.monotonic() < hang_deadline:
+                    continue
+                self.counters["hangs"] += 1
+                self._restart(worker, f"did not answer within {self.hang_seconds:.0f}s")
+                raise RuntimeError(f"SLM worker {worker.index} hung")
+            reply = worker.conn.recv()
+        except (EOFError, OSError):
+            self.counters["crashes"] += 1
+            worker.process.join(timeout=1)
+            self._restart(worker, f"exited with code {worker.process.exitcode}")
+            raise RuntimeError(f"SLM worker {worker.index} crashed") from None
+        finally:
+            worker.busy = False
+
+        self._idle.put(worker)
+        if reply[0] == "error":
+            self.counters["errors"] += 1
+            raise RuntimeError(f"SLM worker {worker.index}: {reply[1]}")
+        self.counters["batches"] += 1
+        return reply[1], reply[2], reply[3], reply[4], reply[5]
+
+    # ── Introspection ──
+
+    def alive(self) -> int:
+        return sum(1 for w in self.workers if w.alive)
+
+    def info(self) -> Optional[dict]:
+        """Ready-handshake details of a serving worker (backend, load time)."""
+        return next((w.info for w in self.workers if w.alive), None)
+
+    def stats(self) -> dict:
+        workers = []
+        for w in self.workers:
+            entry = {"index": w.index, "pid": w.process.pid if w.process else None,
+                     "alive": w.alive, "busy": w.busy, "restarts": w.restarts, "cores": self.cores[w.index]}
+            if entry["alive"]:
+                memory = _proc_memory(w.process.pid)
+                memory["modelRssMb"] = round(max(0.0, memory["rssMb"] - w.info["rssBaseline"]), 1)
+                entry.update(memory)
+                entry["cpu"] = w.info["cpu"]
+            workers.append(entry)
+        return {
+            "size": self.size,
+            "alive": sum(1 for w in workers if w["alive"]),
+            "slmCores": self.shared,
+            **self.counters,
+            "workers": workers,
+        }
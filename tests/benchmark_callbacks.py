@@ -0,0 +1,204 @@
+"""
+Callback dispatch benchmark — thread-per-callback requests.post (previous
+send_callback_async) vs the pooled CallbackDispatcher, against a local stub
+receiver standing in for the GUVI endpoint. Runs in-process (no server).
+
+Reports wall time, peak thread count, TCP connections opened and requests
+received for a burst of per-turn callbacks, then checks retry/backoff against a
+flaky receiver and the circuit breaker against a dead one.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from guvi_callback import CallbackDispatcher, CircuitBreaker, build_callback_payload  # noqa: E402
+from models import ExtractedIntelligence  # noqa: E402
+from session_manager import SessionData  # noqa: E402
+
+SESSIONS = 100
+TURNS = 3            # callbacks per session, submitted back to back like consecutive turns
+STUB_DELAY = 0.02    # seconds the stub takes per request (remote endpoint latency)
+
+
+class StubReceiver(ThreadingHTTPServer):
+    """Stand-in for the GUVI endpoint: counts connections/requests, optional delay and failures."""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, fail_first=0, always_fail=False):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.always_fail = always_fail
+        self.connections = 0
+        self.requests = 0
+        self.session_ids = set()
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/updateHoneyPotFinalResult"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.always_fail or server.requests <= server.fail_first
+            if not fail:
+                server.session_ids.add(json.loads(body)["sessionId"])
+        time.sleep(server.delay)
+        status = 503 if fail else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def _sessions():
+    sessions = []
+    for i in range(SESSIONS):
+        session = SessionData(f"cb-bench-{i}")
+        session.scam_detected = True
+        session.intelligence = ExtractedIntelligence(phoneNumbers=[f"+9198765{i:05d}"])
+        sessions.append(session)
+    return sessions
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _stop(server):
+    server.shutdown()
+    server.server_close()
+
+
+def legacy_burst(url, sessions):
+    """Previous send_callback_async: one OS thread + one fresh requests.post per callback."""
+    def send(session):
+        try:
+            requests.post(url, json=build_callback_payload(session), timeout=5,
+                          headers={"Content-Type": "application/json"})
+        except Exception:
+            pass
+
+    threads, peak = [], threading.active_count()
+    for _ in range(TURNS):
+        for session in sessions:
+            thread = threading.Thread(target=send, args=(session,), daemon=True)
+            thread.start()
+            threads.append(thread)
+            peak = max(peak, threading.active_count())
+    for thread in threads:
+        thread.join()
+    return peak
+
+
+def pooled_burst(dispatcher, sessions):
+    peak = threading.active_count()
+    for _ in range(TURNS):
+        for session in sessions:
+            dispatcher.submit(session)
+            peak = max(peak, threading.active_count())
+    dispatcher.flush(timeout=60)
+    return peak
+
+
+def main():
+    print("=" * 60)
+    print("  CALLBACK DISPATCH BENCHMARK")
+    print(f"  {SESSIONS} sessions x {TURNS} turns, stub latency {STUB_DELAY * 1000:.0f}ms")
+    print("=" * 60)
+    failures = []
+    sessions = _sessions()
+
+    # ── Burst: legacy vs pooled ──
+    server = _start(StubReceiver(delay=STUB_DELAY))
+    started = time.perf_counter()
+    legacy_peak = legacy_burst(server.url, sessions)
+    legacy_s = time.perf_counter() - started
+    legacy = (server.connections, server.requests, len(server.session_ids))
+    _stop(server)
+
+    server = _start(StubReceiver(delay=STUB_DELAY))
+    dispatcher = CallbackDispatcher(url=server.url, workers=4)
+    started = time.perf_counter()
+    pooled_peak = pooled_burst(dispatcher, sessions)
+    pooled_s = time.perf_counter() - started
+    pooled = (server.connections, server.requests, len(server.session_ids))
+    stats = dispatcher.stats()
+    dispatcher.close()
+    _stop(server)
+
+    print(f"  {'':18}{'wall':>9}{'threads':>9}{'conns':>7}{'reqs':>7}{'sessions':>10}")
+    print(f"  {'thread-per-call':18}{legacy_s:8.2f}s{legacy_peak:>9}{legacy[0]:>7}{legacy[1]:>7}{legacy[2]:>10}")
+    print(f"  {'pooled (4 workers)':18}{pooled_s:8.2f}s{pooled_peak:>9}{pooled[0]:>7}{pooled[1]:>7}{pooled[2]:>10}")
+    print(f"  coalesced={stats['coalesced']} sent={stats['sent']} "
+          f"send p50/p95={stats['sendLatencyMs']['p50']}/{stats['sendLatencyMs']['p95']}ms "
+          f"end-to-end p95={stats['endToEndLatencyMs']['p95']}ms")
+    if pooled[2] != SESSIONS:
+        failures.append("pooled run did not deliver every session")
+    if pooled[0] > dispatcher.workers:
+        failures.append(f"pooled run opened {pooled[0]} connections (> {dispatcher.workers} workers)")
+
+    # ── Flaky receiver: retries with backoff ──
+    server = _start(StubReceiver(fail_first=3))
+    dispatcher = CallbackDispatcher(url=server.url, workers=1, max_retries=3, backoff_base=0.05,
+                                    breaker=CircuitBreaker(threshold=10, cooldown=1))
+    ok = dispatcher.submit(sessions[0]).result(timeout=10)
+    stats = dispatcher.stats()
+    dispatcher.close()
+    _stop(server)
+    print(f"\n  flaky receiver (3x 503): delivered={ok} retries={stats['retries']}")
+    if not ok or stats["retries"] != 3:
+        failures.append("retry/backoff did not recover from 3 failures")
+
+    # ── Dead receiver: circuit breaker caps the traffic ──
+    server = _start(StubReceiver(always_fail=True))
+    dispatcher = CallbackDispatcher(url=server.url, workers=2, max_retries=2, backoff_base=0.01,
+                                    breaker=CircuitBreaker(threshold=3, cooldown=0.5))
+    futures = [dispatcher.submit(s) for s in sessions[:20]]
+    time.sleep(1.2)
+    hits = server.requests
+    stats = dispatcher.stats()
+    dispatcher.close(timeout=0)
+    for future in futures:
+        future.cancel()
+    _stop(server)
+    print(f"  dead receiver: {hits} requests in 1.2s for 20 callbacks, "
+          f"circuit={stats['circuit']} trips={stats['circuitTrips']}")
+    if stats["circuitTrips"] < 1 or hits > 12:
+        failures.append("circuit breaker did not limit requests to a dead endpoint")
+
+    print("=" * 60)
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print("  ✅ pooled dispatch delivered every session over ≤ workers connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Intelligence extraction benchmark — single-pass scan_entities() vs one regex
+sweep per pattern, on long entity-dense messages. Runs in-process (no server).
+
+Checks that both paths produce the same ExtractedIntelligence, then reports
+the per-message latency of each and the speedup.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from intelligence import (  # noqa: E402
+    extract_all_intelligence, extract_phone_numbers, extract_bank_accounts, extract_upi_ids,
+    extract_phishing_links, extract_email_addresses, extract_case_ids, extract_policy_numbers,
+    extract_order_numbers, extract_ifsc_codes,
+)
+from models import ExtractedIntelligence  # noqa: E402
+from scam_detector import extract_suspicious_keywords  # noqa: E402
+
+FRAGMENTS = [
+    "Sir your account 123456789012 is blocked,",
+    "call +91 9876543210 or 91-8765432109 now.",
+    "Pay to refund.desk@okaxis or fraud.team@sbi and email support@fake-bank.xyz,",
+    "email id: officer.k@rbidesk",
+    "visit http://sbi-kyc.xyz/verify?acct=55443322110 or www.pm-scheme.top/claim!",
+    "Case #FIR-2024-5566, REF-778812 Ticket: TK99812",
+    "policy no: LIC-778812 premium 4500, order #ORD-99812 txn: TXN883311 awb 77812345",
+    "IFSC SBIN0001234 branch, timestamp 1760000000000.",
+    "This is your final warning, kindly cooperate with the officer.",
+]
+SIZES = [10, 40, 120, 400]  # fragments per message
+
+
+def per_pattern_intelligence(text: str) -> ExtractedIntelligence:
+    """The extraction as one regex sweep per pattern (previous extract_all_intelligence)."""
+    bank_accts = list(set(extract_bank_accounts(text) + extract_ifsc_codes(text)))
+    return ExtractedIntelligence(
+        phoneNumbers=extract_phone_numbers(text),
+        bankAccounts=bank_accts,
+        upiIds=extract_upi_ids(text),
+        phishingLinks=extract_phishing_links(text),
+        emailAddresses=extract_email_addresses(text),
+        caseIds=extract_case_ids(text),
+        policyNumbers=extract_policy_numbers(text),
+        orderNumbers=extract_order_numbers(text),
+        suspiciousKeywords=extract_suspicious_keywords(text),
+    )
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    print("=" * 60)
+    print("  INTELLIGENCE EXTRACTION BENCHMARK")
+    print("  per-pattern sweeps vs single-pass scan")
+    print("=" * 60)
+
+    random.seed(42)
+    mismatches = 0
+    for size in SIZES:
+        text = " ".join(random.choice(FRAGMENTS) for _ in range(size))
+        if per_pattern_intelligence(text) != extract_all_intelligence(text):
+            mismatches += 1
+            print(f"  ❌ {size} fragments: results differ")
+            continue
+
+        repeat = max(5, 2000 // size)
+        old_ms = _time(per_pattern_intelligence, text, repeat)
+        new_ms = _time(extract_all_intelligence, text, repeat)
+        print(
+            f"  {len(text):>6} chars | per-pattern {old_ms:7.2f}ms | "
+            f"single-pass {new_ms:7.2f}ms | {old_ms / new_ms:4.1f}x"
+        )
+
+    print("=" * 60)
+    if mismatches:
+        print(f"  ❌ {mismatches} size(s) produced different intelligence")
+        sys.exit(1)
+    print("  ✅ identical ExtractedIntelligence at every size")
+
+
+if __name__ == "__main__":
+    main()
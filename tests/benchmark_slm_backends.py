@@ -0,0 +1,100 @@
+"""
+SLM backend benchmark — load time, resident memory and generation tokens/s for
+each SLM_BACKEND (fp32 torch, int8 dynamic quantization, ONNX Runtime). Each
+backend loads in a fresh process so RSS numbers don't bleed into each other.
+Runs in-process on CPU (no server); needs the model at SLM_MODEL_PATH.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_backends.py
+
+The ONNX backend needs `pip install optimum[onnxruntime]`; without it the
+engine falls back to torch and the row is reported as unavailable.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKENDS = ["torch", "int8", "onnx"]
+NEW_TOKENS = 64
+REQUESTS = 4
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Sir your electricity will be cut tonight, call 9876543210 and pay pending bill now.",
+]
+
+
+def run_backend():
+    """Child process: load SLM_BACKEND, time a few requests, print one JSON line."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    from slm_engine import slm_engine
+
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("RESULT " + json.dumps({"error": "failed to load"}))
+        return
+    prompts = [
+        slm_engine._build_prompt(m, [], "BANK_FRAUD", 1, True, 0.8, {}, "Arey, which account sir?")
+        for m in MESSAGES
+    ]
+    slm_engine._generate_batch(prompts[:1], max_new_tokens=4)  # warm the kernels
+    slm_engine.generated_tokens, slm_engine.generate_seconds = 0, 0.0
+    latencies = []
+    for i in range(REQUESTS):
+        started = time.perf_counter()
+        slm_engine._generate_batch([prompts[i % len(prompts)]], max_new_tokens=NEW_TOKENS)
+        latencies.append(time.perf_counter() - started)
+    print("RESULT " + json.dumps({**slm_engine.stats(), "p50": statistics.median(latencies)}))
+
+
+def main():
+    print("=" * 60)
+    print("  SLM BACKEND BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, "
+          f"{REQUESTS} requests x {NEW_TOKENS} new tokens, 1 thread")
+    print("=" * 60)
+
+    results = {}
+    for backend in BACKENDS:
+        env = dict(os.environ, USE_SLM="true", SLM_BACKEND=backend,
+                   SLM_THREADS="1")  # single-core CPU, like the deployed container
+        proc = subprocess.run([sys.executable, __file__, "--child"], env=env,
+                              capture_output=True, text=True, timeout=1800)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+        results[backend] = json.loads(lines[-1][7:]) if lines else {"error": proc.stderr.strip()[-300:]}
+
+    print(f"  {'backend':8}{'loaded':>8}{'load':>8}{'RSS':>9}{'model':>9}{'tok/s':>8}{'p50':>8}")
+    failures = []
+    for backend, r in results.items():
+        if "error" in r:
+            print(f"  {backend:8}  ERROR {r['error']}")
+            failures.append(f"{backend}: {r['error']}")
+            continue
+        print(f"  {backend:8}{r['backend']:>8}{r['loadSeconds']:>7.1f}s{r['rssMb']:>7.0f}MB"
+              f"{r['modelRssMb']:>7.0f}MB{r['tokensPerSecond']:>8.1f}{r['p50']:>7.2f}s")
+        if r["backend"] != backend:
+            if backend == "onnx":
+                print("           (optimum[onnxruntime] not installed — fell back to torch)")
+            else:
+                failures.append(f"{backend} backend fell back to {r['backend']}")
+
+    print("=" * 60)
+    fp32, int8 = results.get("torch", {}), results.get("int8", {})
+    if not failures and int8.get("modelRssMb", 0) >= fp32.get("modelRssMb", 0):
+        failures.append("int8 backend did not use less memory than fp32")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ int8: {fp32['modelRssMb'] / max(int8['modelRssMb'], 1):.1f}x less model memory, "
+          f"{int8['tokensPerSecond'] / max(fp32['tokensPerSecond'], 1e-9):.2f}x tokens/s vs fp32")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        run_backend()
+    else:
+        main()
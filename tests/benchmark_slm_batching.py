@@ -0,0 +1,102 @@
+"""
+SLM micro-batching benchmark — one generate() per request (batch size 1) vs
+the MicroBatcher, for N honeypot sessions hitting the SLM at the same moment.
+Runs in-process (no server); needs the model at SLM_MODEL_PATH.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_batching.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Throughput run: let every request finish instead of falling back at 8s
+os.environ["USE_SLM"] = "true"
+os.environ.setdefault("SLM_TIMEOUT", "600")
+os.environ["SLM_CACHE_ENABLED"] = "false"  # repeated prompts would be cache hits, not generations
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from slm_engine import MicroBatcher, slm_engine  # noqa: E402
+
+CONCURRENCY = [1, 4, 8]
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Sir your electricity will be cut tonight, call 9876543210 and pay pending bill now.",
+]
+
+
+def _request(i: int) -> dict:
+    return dict(
+        message_text=MESSAGES[i % len(MESSAGES)],
+        conversation_history=[],
+        scam_type="BANK_FRAUD",
+        turn_count=1 + i % 5,
+        rule_detected=True,
+        rule_confidence=0.8,
+        rule_intel={"phoneNumbers": ["+919876543210"]},
+        rule_reply="Arey, which account sir? I have two accounts.",
+    )
+
+
+async def _burst(n: int) -> tuple:
+    """n sessions call smart_process at once; returns (wall seconds, per-request latencies, used)."""
+    async def one(i):
+        started = time.perf_counter()
+        result = await slm_engine.smart_process(**_request(i))
+        return time.perf_counter() - started, result["slm_used"]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - started, sorted(r[0] for r in results), sum(r[1] for r in results)
+
+
+def main():
+    print("=" * 60)
+    print("  SLM MICRO-BATCHING BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}")
+    print("=" * 60)
+
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+
+    batched = slm_engine.batcher
+    unbatched = MicroBatcher(slm_engine._generate_batch, max_batch=1, max_wait_ms=0)
+
+    async def run():
+        await _burst(1)  # warm the kernels once
+        print(f"  {'sessions':>8} | {'batch=1 req/s':>13} {'p95':>7} | {'batched req/s':>13} {'p95':>7} | speedup")
+        speedups, fallbacks = [], 0
+        for n in CONCURRENCY:
+            row = []
+            for batcher in (unbatched, batched):
+                slm_engine.batcher = batcher
+                wall, latencies, used = await _burst(n)
+                fallbacks += n - used
+                row.append((n / wall, latencies[min(n - 1, int(n * 0.95))]))
+            speedup = row[1][0] / row[0][0]
+            speedups.append(speedup)
+            print(f"  {n:>8} | {row[0][0]:>13.2f} {row[0][1]:>6.2f}s | {row[1][0]:>13.2f} {row[1][1]:>6.2f}s | {speedup:.1f}x")
+        slm_engine.batcher = batched
+        return speedups, fallbacks
+
+    speedups, fallbacks = asyncio.run(run())
+    stats = batched.stats
+    print(f"  batcher: {stats['batches']} batches, {stats['requests']} requests, "
+          f"largest batch {stats['max_batch_seen']}")
+    print("=" * 60)
+    if fallbacks:
+        print(f"  ❌ {fallbacks} request(s) fell back to rules")
+        sys.exit(1)
+    if speedups[-1] <= 1.0:
+        print(f"  ❌ batching gave no throughput gain at {CONCURRENCY[-1]} sessions")
+        sys.exit(1)
+    print(f"  ✅ {speedups[-1]:.1f}x SLM throughput at {CONCURRENCY[-1]} concurrent sessions")
+
+
+if __name__ == "__main__":
+    main()
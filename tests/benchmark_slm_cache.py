@@ -0,0 +1,144 @@
+"""
+SLM result cache benchmark — the speed benchmark's workload (15 scenarios x
+10 turns of repeated FOLLOW_UPS) run in-process through _analyze_turn with the
+SLM on every turn (gate off): cache hit rate and turn latency for hits vs
+generated turns, cold and again after a simulated restart (new cache instance
+on the same SQLite file). Needs the model at SLM_MODEL_PATH.
+
+Checks the cache itself first (no model): key normalization, LRU eviction,
+TTL expiry, and SQLite persistence shared across instances.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_cache.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_GATE_ENABLED"] = "false"  # like benchmark.py against a server without gating
+os.environ["SLM_CACHE_ENABLED"] = "true"
+os.environ.setdefault("SLM_TIMEOUT", "600")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import FOLLOW_UPS, SCENARIOS  # noqa: E402
+from main import _analyze_turn  # noqa: E402
+from slm_cache import SLMResultCache, fingerprint  # noqa: E402
+from slm_engine import slm_engine  # noqa: E402
+
+TURNS = 10
+RESULT = {"refined_confidence": 0.9, "refined_scam_type": "BANK_FRAUD", "missed_entities": {"upiIds": ["a@ybl"]},
+          "refined_reply": "Arey sir, which branch are you calling from?", "insight": "Urgency pressure."}
+
+
+def check_cache(tmp: str) -> list:
+    failures = []
+
+    def expect(label, ok):
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+
+    history = [{"sender": "scammer", "text": "Hello sir"}]
+    key = fingerprint("salt", "Your account is BLOCKED.", "BANK_FRAUD", "early", history)
+    expect("case/whitespace-only changes share a key",
+           key == fingerprint("salt", "  your account   is blocked. ", "BANK_FRAUD", "early", history))
+    expect("different phone number → different key",
+           fingerprint("s", "call 9876543210", "", "early", []) != fingerprint("s", "call 9123456789", "", "early", []))
+    expect("different history → different key",
+           key != fingerprint("salt", "Your account is BLOCKED.", "BANK_FRAUD", "early", []))
+
+    cache = SLMResultCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    cache.get("a")
+    cache.put("c", RESULT)  # evicts b, the least recently used
+    expect("LRU evicts the least recently used entry", cache.get("b") is None and cache.get("a") == RESULT)
+    copy_ = cache.get("a")
+    copy_["missed_entities"]["upiIds"].append("mutated@ybl")
+    expect("callers get a copy", cache.get("a") == RESULT)
+
+    short = SLMResultCache(ttl_seconds=0.05)
+    short.put("k", RESULT)
+    time.sleep(0.1)
+    expect("entries expire after the TTL", short.get("k") is None)
+
+    path = os.path.join(tmp, "slm_cache.db")
+    writer = SLMResultCache(path=path)
+    writer.put("persisted", RESULT)
+    other_worker = SLMResultCache(path=path)  # same file, separate process in production
+    writer.put("written-later", RESULT)
+    expect("entries reload from disk after a restart", other_worker.get("persisted") == RESULT)
+    expect("entries written by another worker are found on disk",
+           other_worker.get("written-later") == RESULT and other_worker.counters["disk_hits"] == 1)
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        cache.get("a")
+    per_hit_us = (time.perf_counter() - started) * 1e6 / 1000
+    expect(f"memory hit in {per_hit_us:.1f}µs", per_hit_us < 500)
+    return failures
+
+
+async def replay(run: str) -> dict:
+    """benchmark.py's conversations; returns turn latencies split by cache hit / miss."""
+    latencies = {"hit": [], "miss": []}
+    for name, first in SCENARIOS:
+        sid = f"cache-bench-{run}-{name}"
+        for turn in range(TURNS):
+            text = first if turn == 0 else FOLLOW_UPS[turn % len(FOLLOW_UPS)]
+            body = {"sessionId": sid, "message": {"sender": "scammer", "text": text,
+                                                  "timestamp": 1760000000000 + turn * 30000}}
+            hits = slm_engine.cache.counters["hits"]
+            started = time.perf_counter()
+            await _analyze_turn(body, send_callback=False)
+            elapsed = time.perf_counter() - started
+            latencies["hit" if slm_engine.cache.counters["hits"] > hits else "miss"].append(elapsed)
+    return latencies
+
+
+def main():
+    print("=" * 60)
+    print("  SLM RESULT CACHE BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check_cache(tmp)
+
+        logging.disable(logging.WARNING)
+        slm_engine.warmup()
+        if not slm_engine.ready:
+            print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+            sys.exit(1)
+        path = os.path.join(tmp, "replay.db")
+        print(f"\n  {len(SCENARIOS)} scenarios x {TURNS} turns{'':12}{'hit rate':>9}{'hit p50':>10}{'generated p50':>15}")
+        rates = {}
+        for run in ("cold", "after restart"):
+            slm_engine.cache = SLMResultCache(path=path)
+            latencies = asyncio.run(replay(run))
+            stats = slm_engine.cache.stats()
+            hit_ms = statistics.median(latencies["hit"]) * 1000 if latencies["hit"] else 0.0
+            miss = f"{statistics.median(latencies['miss']) * 1000:.1f}ms" if latencies["miss"] else "-"
+            print(f"  {run:38}{stats['hitRate']:>9.0%}{hit_ms:>8.2f}ms{miss:>15}")
+            rates[run] = (stats["hitRate"], hit_ms, latencies["miss"])
+        slm_engine.cache.clear()
+
+    print("=" * 60)
+    if rates["after restart"][0] < 1.0:
+        failures.append("repeated contexts were regenerated after a restart")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    generated_ms = statistics.median(rates["cold"][2]) * 1000
+    print(f"  ✅ repeated contexts served from cache in {rates['after restart'][1]:.2f}ms "
+          f"vs {generated_ms:.0f}ms generated ({rates['cold'][0]:.0%} hits on the cold run)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+SLM cancellation benchmark — what a request that gives up costs the next one.
+A scam turn whose caller times out (short SLM_TIMEOUT) or disconnects, then a
+follow-up turn with the normal timeout, run in-process against the batcher
+without cooperative cancellation (the abandoned generation decodes to the end)
+and with it (its cancel token stops decoding at the next token step).
+Reports the follow-up's latency, how long the batcher stayed busy after the
+caller left, and the abandoned / cancelled counters. Needs the model at
+SLM_MODEL_PATH; SLM_WORKERS=2 runs the same through the worker pool.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_cancel.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_CACHE_ENABLED"] = "false"  # every call generates
+os.environ.setdefault("SLM_TIMEOUT", "600")
+os.environ.setdefault("SLM_WORKER_HANG_SECONDS", "600")
+os.environ["SLM_DEADLINE_AWARE"] = "false"  # the short timeout must abandon a running generation, not skip it
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import slm_engine as engine_module  # noqa: E402
+from slm_engine import MicroBatcher, slm_engine  # noqa: E402
+
+GIVE_UP_SECONDS = 0.3
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+]
+
+
+async def _slm_request(i: int, is_disconnected=None) -> dict:
+    return await slm_engine.smart_process(
+        MESSAGES[i % len(MESSAGES)], [], "BANK_FRAUD", 1 + i, True, 0.55,
+        {"phoneNumbers": ["+919876543210"]}, "Arey, which account sir? I have two accounts.",
+        is_disconnected=is_disconnected,
+    )
+
+
+async def _until_idle(batcher: MicroBatcher, since: float) -> float:
+    while batcher.depth():
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - since
+
+
+async def _give_up(how: str, i: int) -> dict:
+    """One request whose caller leaves after GIVE_UP_SECONDS; then a normal follow-up."""
+    timeout = engine_module.SLM_TIMEOUT
+    started = time.perf_counter()
+    if how == "timeout":
+        engine_module.SLM_TIMEOUT = GIVE_UP_SECONDS
+        try:
+            result = await _slm_request(i)
+        finally:
+            engine_module.SLM_TIMEOUT = timeout
+    else:
+        async def is_disconnected() -> bool:
+            return time.perf_counter() - started > GIVE_UP_SECONDS
+        result = await _slm_request(i, is_disconnected)
+    gone = time.perf_counter()
+    follow_up = asyncio.create_task(_slm_request(i + 1))
+    busy = await _until_idle(slm_engine.batcher, gone)
+    served = await follow_up
+    return {
+        "fell_back": not result["slm_used"],
+        "follow_up_ms": (time.perf_counter() - gone) * 1000,
+        "follow_up_served": served["slm_used"],
+        "busy_after_ms": busy * 1000,
+    }
+
+
+async def measure(cancellable: bool) -> dict:
+    run_batch = slm_engine.inference.generate
+    slm_engine.batcher = MicroBatcher(run_batch, concurrency=slm_engine.batcher.concurrency,
+                                      cancellable=cancellable)
+    abandoned = dict(slm_engine.abandoned)
+    cancelled = slm_engine.cancelled_generations
+
+    started = time.perf_counter()
+    await _slm_request(0)  # reference: one uninterrupted generation
+    full_ms = (time.perf_counter() - started) * 1000
+
+    results = {how: await _give_up(how, 2 * n) for n, how in enumerate(("timeout", "disconnect"))}
+    results.update(
+        full_ms=full_ms,
+        abandoned={k: slm_engine.abandoned[k] - abandoned[k] for k in abandoned},
+        cancelled=slm_engine.cancelled_generations - cancelled,
+        batcher_abandoned=slm_engine.batcher.stats["abandoned"],
+    )
+    return results
+
+
+def main():
+    print("=" * 60)
+    print("  SLM CANCELLATION BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, "
+          f"caller gives up after {GIVE_UP_SECONDS}s, SLM_WORKERS={os.getenv('SLM_WORKERS', '0')}")
+    print("=" * 60)
+    logging.disable(logging.WARNING)
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+
+    runs = {mode: asyncio.run(measure(mode)) for mode in (False, True)}
+    if slm_engine.pool:
+        slm_engine.pool.close()
+
+    print(f"  {'':22}{'full gen':>10}{'follow-up after':>18}{'':>4}{'batcher busy after':>20}")
+    print(f"  {'':32}{'timeout':>10}{'disconnect':>12}{'timeout':>10}{'disconnect':>12}")
+    for mode, r in runs.items():
+        label = "cooperative cancel" if mode else "run to completion"
+        print(f"  {label:22}{r['full_ms']:>8.0f}ms{r['timeout']['follow_up_ms']:>8.0f}ms"
+              f"{r['disconnect']['follow_up_ms']:>10.0f}ms{r['timeout']['busy_after_ms']:>8.0f}ms"
+              f"{r['disconnect']['busy_after_ms']:>10.0f}ms")
+
+    failures = []
+    on, off = runs[True], runs[False]
+
+    def expect(label, ok):
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+
+    print()
+    for mode, r in runs.items():
+        tag = "cancel" if mode else "no cancel"
+        expect(f"{tag}: both abandoned calls fell back to the rules",
+               r["timeout"]["fell_back"] and r["disconnect"]["fell_back"])
+        expect(f"{tag}: follow-ups served by the SLM",
+               r["timeout"]["follow_up_served"] and r["disconnect"]["follow_up_served"])
+        expect(f"{tag}: abandoned counted by reason {r['abandoned']}",
+               r["abandoned"] == {"timeout": 1, "disconnect": 1})
+    expect(f"no generation cancelled without cooperative cancel ({off['cancelled']})", off["cancelled"] == 0)
+    expect(f"both abandoned generations cancelled ({on['cancelled']})", on["cancelled"] == 2)
+    expect(f"batcher counted both as abandoned ({on['batcher_abandoned']})", on["batcher_abandoned"] == 2)
+
+    print("=" * 60)
+    off_ms = max(off["timeout"]["follow_up_ms"], off["disconnect"]["follow_up_ms"])
+    on_ms = max(on["timeout"]["follow_up_ms"], on["disconnect"]["follow_up_ms"])
+    if on_ms >= off_ms:
+        failures.append("follow-up requests did not get faster with cooperative cancellation")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ follow-up after an abandoned request: {off_ms:.0f}ms → {on_ms:.0f}ms with cooperative cancellation")
+
+
+if __name__ == "__main__":
+    main()
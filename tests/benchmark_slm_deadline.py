@@ -0,0 +1,137 @@
+"""
+SLM deadline benchmark — requests that queue behind each other under a fixed
+SLM_TIMEOUT vs with deadline-aware generation length (SLM_DEADLINE_AWARE).
+Runs in-process through smart_process with batches of one, so later requests
+spend part of their budget waiting; needs the model at SLM_MODEL_PATH.
+
+Each burst sends 3 requests at once with a budget of 1.75x one full
+generation. Fixed timeout: the second request times out mid-generation (work
+discarded) and the third never starts in time. Deadline-aware: the second
+gets a shorter, still complete JSON object and the third is skipped when its
+turn comes. Checks that no deadline-aware request overruns its deadline or
+times out, that more of them return SLM output, and that a request arriving
+with too little time left is answered without queueing.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_deadline.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_CACHE_ENABLED"] = "false"  # every call runs the model
+os.environ["SLM_BATCH_MAX_SIZE"] = "1"     # requests queue instead of sharing a batch
+os.environ["SLM_MODE"] = "generate"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import slm_engine as engine_module  # noqa: E402
+from slm_engine import slm_engine  # noqa: E402
+
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+]
+BURSTS = 2
+
+
+async def _call(i: int, deadline=None) -> dict:
+    return await slm_engine.smart_process(
+        MESSAGES[i % len(MESSAGES)], [], "BANK_FRAUD", 2, True, 0.6, {}, "Arey, which account sir?",
+        deadline=deadline,
+    )
+
+
+async def burst(budget: float, aware: bool) -> list:
+    """len(MESSAGES) requests at once; (seconds taken, result) each."""
+    async def one(i):
+        started = time.monotonic()
+        result = await _call(i, deadline=started + budget if aware else None)
+        return time.monotonic() - started, result
+    return await asyncio.gather(*(one(i) for i in range(len(MESSAGES))))
+
+
+def run(budget: float, aware: bool) -> dict:
+    engine_module.SLM_DEADLINE_AWARE = aware
+    engine_module.SLM_TIMEOUT = budget if not aware else 600
+    before = (dict(slm_engine.abandoned), dict(slm_engine.deadline_rows), slm_engine.generate_seconds)
+    calls = []
+    for _ in range(BURSTS):
+        calls += asyncio.run(burst(budget, aware))
+    return {
+        "latencies": [seconds for seconds, _ in calls],
+        "useful": sum(1 for _, r in calls if r["slm_used"] and (r["refined_reply"] or r["refined_confidence"])),
+        "timeouts": slm_engine.abandoned["timeout"] - before[0]["timeout"],
+        "shortened": slm_engine.deadline_rows["shortened"] - before[1]["shortened"],
+        "skipped": slm_engine.deadline_rows["skipped"] - before[1]["skipped"],
+        "generate_seconds": slm_engine.generate_seconds - before[2],
+    }
+
+
+def main():
+    print("=" * 60)
+    print("  SLM DEADLINE BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, "
+          f"{BURSTS} bursts x {len(MESSAGES)} queued requests")
+    print("=" * 60)
+    logging.disable(logging.WARNING)
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+
+    # One full generation (also times the model for the rate estimate)
+    engine_module.SLM_TIMEOUT = 600
+    full = []
+    for i in range(3):
+        started = time.monotonic()
+        asyncio.run(_call(i))
+        full.append(time.monotonic() - started)
+    budget = 1.75 * statistics.median(full)
+    prefill, step = slm_engine.rate.estimate()
+    print(f"  full generation {statistics.median(full):.2f}s → budget {budget:.2f}s per request; "
+          f"measured prefill {prefill * 1000:.0f}ms, {step * 1000:.1f}ms/token")
+
+    runs = {"fixed timeout": run(budget, aware=False), "deadline-aware": run(budget, aware=True)}
+    total = BURSTS * len(MESSAGES)
+    print(f"\n  {'':16}{'SLM output':>11}{'timeouts':>10}{'shortened':>11}{'skipped':>9}{'max':>9}{'generating':>12}")
+    for name, r in runs.items():
+        print(f"  {name:16}{r['useful']:>8}/{total}{r['timeouts']:>10}{r['shortened']:>11}{r['skipped']:>9}"
+              f"{max(r['latencies']):>8.2f}s{r['generate_seconds']:>11.1f}s")
+
+    failures = []
+
+    def expect(label, ok):
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+
+    print()
+    fixed, aware = runs["fixed timeout"], runs["deadline-aware"]
+    expect(f"no deadline-aware request past its deadline (max {max(aware['latencies']):.2f}s)",
+           max(aware["latencies"]) <= budget + 0.05)
+    expect("no deadline-aware request timed out", aware["timeouts"] == 0)
+    expect("late requests shortened or skipped", aware["shortened"] + aware["skipped"] > 0)
+    started = time.monotonic()
+    late = asyncio.run(_call(0, deadline=started + prefill / 2))
+    late_ms = (time.monotonic() - started) * 1000
+    expect(f"request arriving with too little time left answered by rules at once ({late_ms:.1f}ms)",
+           not late["slm_used"] and late_ms < 50)
+
+    print("=" * 60)
+    if aware["useful"] <= fixed["useful"]:
+        failures.append(f"deadline-aware returned SLM output for {aware['useful']}/{total}, fixed for {fixed['useful']}")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ SLM output for {fixed['useful']}/{total} → {aware['useful']}/{total} queued requests within "
+          f"{budget:.1f}s, {fixed['timeouts']} → 0 timeouts")
+
+
+if __name__ == "__main__":
+    main()
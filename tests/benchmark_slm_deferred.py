@@ -0,0 +1,138 @@
+"""
+Deferred SLM benchmark — the same conversations run in-process through
+_analyze_turn with the SLM awaited on every turn (SLM_DEFERRED off) and with
+the SLM deferred to a background task. The turn returns at rule speed and the
+scammer "thinks" before replying, while the background call finishes.
+
+Both runs share one SLM result cache, so the deferred run merges exactly the
+results the synchronous run used. Checks that each deferred session ends with
+the same intelligence, confidence and scam type, that every insight and SLM
+reply shows up one turn later, and that the merged insights reach the
+session notes sent in callbacks. Needs the model at SLM_MODEL_PATH.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_deferred.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_GATE_ENABLED"] = "false"  # the SLM on every turn
+os.environ["SLM_CACHE_ENABLED"] = "true"  # shared by both runs: identical SLM results
+os.environ.setdefault("SLM_TIMEOUT", "600")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import main as app  # noqa: E402
+from session_manager import session_manager  # noqa: E402
+from slm_engine import slm_engine  # noqa: E402
+
+CONVERSATIONS = {
+    "bank": [
+        "URGENT: Your SBI account will be blocked today. Share OTP to verify immediately.",
+        "Sir I am calling from SBI head office, my employee ID is 4521. Send OTP fast.",
+        "Transfer Rs 1 to verify@sbi UPI to unblock, or call 9876543210 now.",
+        "Why are you delaying? Your account will be frozen in 10 minutes.",
+    ],
+    "lottery": [
+        "Congratulations! You won Rs 25 lakh in KBC lottery. Pay 5000 processing fee to claim.",
+        "Send the fee to kbc.prize@ybl and share your bank account number.",
+        "Sir this is last chance, prize will go to next winner. Pay now.",
+        "Email your Aadhaar to claims@kbc-lottery.in for verification.",
+    ],
+}
+FIELDS = ("phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks")
+
+
+async def run(mode: str) -> dict:
+    """Every conversation once; returns turn latencies, responses and final sessions."""
+    app.SLM_DEFERRED = mode == "deferred"
+    latencies, responses, sessions = [], {}, {}
+    for name, messages in CONVERSATIONS.items():
+        sid = f"deferred-bench-{mode}-{name}"
+        history, responses[name] = [], []
+        for turn, text in enumerate(messages):
+            body = {"sessionId": sid, "conversationHistory": list(history),
+                    "message": {"sender": "scammer", "text": text, "timestamp": 1760000000000 + turn * 30000}}
+            started = time.perf_counter()
+            response = await app._analyze_turn(body, send_callback=False)
+            latencies.append(time.perf_counter() - started)
+            responses[name].append(response)
+            if app._deferred:  # the scammer types their next message meanwhile
+                await asyncio.gather(*app._deferred.values())
+            # Fixed user lines: the SLM cache key covers the history, and the replies differ by mode
+            history += [{"sender": "scammer", "text": text, "timestamp": 1760000000000 + turn * 30000},
+                        {"sender": "user", "text": "Ji, who is this?", "timestamp": 1760000000000 + turn * 30000 + 1}]
+        sessions[name] = session_manager.get(sid)
+        session_manager.apply_deferred(sessions[name])  # the last turn's result waits for a next turn
+    return {"latencies": latencies, "responses": responses, "sessions": sessions}
+
+
+def _insight(response: dict) -> str:
+    notes = response.get("agentNotes", "")
+    return notes.split(" | SLM Insight: ", 1)[1] if " | SLM Insight: " in notes else ""
+
+
+def main():
+    print("=" * 60)
+    print("  DEFERRED SLM BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, "
+          f"{len(CONVERSATIONS)} conversations x {len(CONVERSATIONS['bank'])} turns")
+    print("=" * 60)
+    logging.disable(logging.WARNING)
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+
+    runs = {mode: asyncio.run(run(mode)) for mode in ("sync", "deferred")}
+    print(f"  {'turn latency':24}{'p50':>10}{'max':>10}")
+    for mode, r in runs.items():
+        print(f"  {'SLM ' + ('awaited' if mode == 'sync' else 'deferred'):24}"
+              f"{statistics.median(r['latencies']) * 1000:>8.1f}ms{max(r['latencies']) * 1000:>8.1f}ms")
+
+    failures = []
+
+    def expect(label, ok):
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+
+    print()
+    sync, deferred = runs["sync"], runs["deferred"]
+    expect(f"every background call stored for the next turn {app._deferred_stats}",
+           app._deferred_stats["stored"] == sum(len(m) for m in CONVERSATIONS.values())
+           and not app._deferred)
+    for name in CONVERSATIONS:
+        a, b = sync["sessions"][name], deferred["sessions"][name]
+        expect(f"{name}: same intelligence, confidence and scam type after the last merge",
+               all(sorted(getattr(a.intelligence, f)) == sorted(getattr(b.intelligence, f)) for f in FIELDS)
+               and a.confidence_level == b.confidence_level and a.scam_type == b.scam_type)
+        sync_insights = [_insight(r) for r in sync["responses"][name]]
+        later = [_insight(r) for r in deferred["responses"][name]]
+        expect(f"{name}: insights shown one turn later ({sum(map(bool, later))})",
+               later[0] == "" and later[1:] == sync_insights[:-1])
+        sync_replies = [r["reply"] for r in sync["responses"][name]]
+        deferred_replies = [r["reply"] for r in deferred["responses"][name]]
+        carried = sum(1 for i in range(1, len(sync_replies)) if deferred_replies[i] == sync_replies[i - 1])
+        expect(f"{name}: SLM replies carried to the next turn ({carried})", carried > 0)
+        expect(f"{name}: insights in the callback notes",
+               sum(note.startswith("SLM (turn") for note in b.agent_notes) == sum(map(bool, sync_insights)))
+
+    print("=" * 60)
+    sync_p50 = statistics.median(sync["latencies"]) * 1000
+    deferred_p50 = statistics.median(deferred["latencies"]) * 1000
+    if deferred_p50 * 5 > sync_p50:
+        failures.append("deferred turns were not answered at rule speed")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ turn p50 {sync_p50:.0f}ms with the SLM awaited → {deferred_p50:.1f}ms deferred, same intelligence")
+
+
+if __name__ == "__main__":
+    main()
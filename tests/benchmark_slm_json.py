@@ -0,0 +1,150 @@
+"""
+Constrained JSON decoding benchmark — free sampling vs the slm_json schema
+processor: JSON parse rate, generated tokens and latency per request.
+Runs in-process on CPU (no server); needs the model at SLM_MODEL_PATH.
+
+Before touching the model, the processor is fuzzed with random logits at
+several token budgets: every run must close a valid object within budget,
+with string and list limits respected.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_json.py
+"""
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_THREADS"] = "1"  # single-core CPU, like the deployed container
+os.environ["SLM_CONSTRAINED_JSON"] = "true"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import torch  # noqa: E402
+
+import slm_json  # noqa: E402
+from slm_engine import _MAX_NEW_TOKENS, slm_engine  # noqa: E402
+
+FUZZ_RUNS = 40
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Sir your electricity will be cut tonight, call 9876543210 and pay pending bill now.",
+]
+
+
+def _valid(text: str, budget_tokens: int, used_tokens: int) -> str:
+    """'' if text is a schema-conforming object, else what is wrong with it."""
+    if used_tokens > budget_tokens:
+        return f"used {used_tokens} tokens > budget {budget_tokens}"
+    try:
+        obj = json.loads(text)
+    except ValueError as e:
+        return f"not JSON ({e}): {text[:80]!r}"
+    if list(obj) != ["confidence", "scam_type", "missed_entities", "reply", "insight"]:
+        return f"keys {list(obj)}"
+    if not isinstance(obj["confidence"], (int, float)) or not 0 <= obj["confidence"] <= 1:
+        return f"confidence {obj['confidence']!r}"
+    for key, limit in slm_json.STRING_LIMITS.items():
+        if len(obj[key]) > limit:
+            return f"{key} has {len(obj[key])} chars"
+    for key in slm_json.ENTITY_KEYS:
+        values = obj["missed_entities"][key]
+        if len(values) > slm_json.MAX_ITEMS or any(len(v) > slm_json.ENTITY_LIMIT for v in values):
+            return f"missed_entities.{key} = {values!r}"
+    return ""
+
+
+def fuzz(schema) -> list:
+    """Drive the processor with random logits (no model); returns failures."""
+    failures = []
+    vocab = len(schema.string_ok)
+    generator = torch.Generator().manual_seed(0)
+    for budget in (schema.min_tokens + 1, schema.min_tokens + 20, 120, _MAX_NEW_TOKENS):
+        for run in range(FUZZ_RUNS):
+            processor = schema.processor(1, 0, budget)
+            ids = torch.zeros((1, 0), dtype=torch.long)
+            # Skew towards quotes/brackets sometimes so short values and empty lists get covered
+            bias = torch.zeros(vocab)
+            if run % 2:
+                bias[[schema.quote, schema.close_bracket, schema.comma]] = 8.0
+            while ids.shape[1] < budget:
+                scores = processor(ids, torch.randn(1, vocab, generator=generator) * 3 + bias)
+                token = int(torch.multinomial(torch.softmax(scores[0], -1), 1, generator=generator))
+                ids = torch.cat([ids, torch.tensor([[token]])], dim=1)
+                if token == schema.eos_id:
+                    break
+            tokens = ids[0].tolist()
+            if tokens[-1] != schema.eos_id:
+                failures.append(f"budget {budget}: no EOS within budget")
+                continue
+            problem = _valid(slm_engine.tokenizer.decode(tokens[:-1]), budget, len(tokens))
+            if problem:
+                failures.append(f"budget {budget}: {problem}")
+    return failures
+
+
+def _parses(raw: str) -> bool:
+    match = re.search(r"\{[\s\S]*\}", raw)
+    try:
+        return bool(match) and isinstance(json.loads(match.group()), dict)
+    except ValueError:
+        return False
+
+
+def main():
+    print("=" * 60)
+    print("  CONSTRAINED JSON DECODING BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}")
+    print("=" * 60)
+
+    slm_engine.warmup()
+    if not slm_engine.ready or slm_engine._json_schema is None:
+        print("  ❌ SLM or its JSON schema failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+    schema = slm_engine._json_schema
+    failures = fuzz(schema)
+    print(f"  fuzz: {4 * FUZZ_RUNS} random-logit runs, budgets {schema.min_tokens + 1}..{_MAX_NEW_TOKENS} "
+          f"tokens → {4 * FUZZ_RUNS - len(failures)} valid objects")
+    for failure in failures[:5]:
+        print(f"    {failure}")
+
+    prompts = [
+        slm_engine._build_prompt(m, [], "BANK_FRAUD", 1 + i, True, 0.8, {}, "Arey, which account sir?")
+        for i, m in enumerate(MESSAGES)
+    ]
+    slm_engine._generate_batch(prompts[:1], max_new_tokens=4)  # warm the kernels
+    rows = {}
+    for constrained in (False, True):
+        parsed, tokens, latencies = 0, [], []
+        for prompt in prompts:
+            before = slm_engine.generated_tokens
+            started = time.perf_counter()
+            raw = slm_engine._generate_batch([prompt], constrained=constrained)[0]
+            latencies.append(time.perf_counter() - started)
+            tokens.append(slm_engine.generated_tokens - before)
+            parsed += _parses(raw)
+        rows[constrained] = (parsed / len(prompts), statistics.mean(tokens), statistics.mean(latencies))
+
+    print(f"\n  {'':14}{'JSON parsed':>12}{'new tokens':>12}{'latency':>10}")
+    for constrained, label in ((False, "free sampling"), (True, "constrained")):
+        rate, tokens, latency = rows[constrained]
+        print(f"  {label:14}{rate:>12.0%}{tokens:>12.1f}{latency:>9.2f}s")
+
+    print("=" * 60)
+    if failures:
+        failures = [f"{len(failures)} fuzz run(s) produced an invalid object"]
+    if rows[True][0] < 1.0:
+        failures.append("constrained output did not always parse")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ 100% parseable JSON, {rows[True][1]:.0f} vs {rows[False][1]:.0f} tokens per request")
+
+
+if __name__ == "__main__":
+    main()
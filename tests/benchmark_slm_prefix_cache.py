@@ -0,0 +1,125 @@
+"""
+SLM prefix KV-cache benchmark — time-to-first-token with the fixed persona /
+task / schema prefix encoded at warmup vs the whole prompt encoded per request.
+Runs in-process on CPU (no server); needs the model at SLM_MODEL_PATH.
+
+Also checks the cached path is a pure speed-up: prefix + suffix tokenize to the
+same ids as the full prompt, and seeded sampling gives the same text both ways.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_prefix_cache.py
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_THREADS"] = "1"  # single-core CPU, like the deployed container
+os.environ["SLM_PREFIX_CACHE"] = "true"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import torch  # noqa: E402
+
+from slm_engine import _MAX_NEW_TOKENS, _SLM_PROMPT_PREFIX, slm_engine  # noqa: E402
+
+RUNS = 5
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Sir your electricity will be cut tonight, call 9876543210 and pay pending bill now.",
+]
+HISTORY = [
+    {"sender": "scammer", "text": "Hello sir, calling from bank head office."},
+    {"sender": "user", "text": "Haan ji, which bank? I have account in two banks."},
+]
+
+
+def _prompt(i: int) -> str:
+    return slm_engine._build_prompt(
+        MESSAGES[i % len(MESSAGES)], HISTORY, "BANK_FRAUD", 2 + i, True, 0.8,
+        {"phoneNumbers": ["+919876543210"]}, "Arey, which account sir? I have two accounts.",
+    )
+
+
+def _timed(prompts, max_new_tokens, cached) -> float:
+    started = time.perf_counter()
+    slm_engine._generate_batch(prompts, max_new_tokens=max_new_tokens, use_prefix_cache=cached)
+    return time.perf_counter() - started
+
+
+def main():
+    print("=" * 60)
+    print("  SLM PREFIX KV-CACHE BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}")
+    print("=" * 60)
+
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+    if slm_engine._prefix_cache is None:
+        print("  ❌ prefix KV cache was not built (see [SLM] log above)")
+        sys.exit(1)
+
+    failures = []
+    tokenizer = slm_engine.tokenizer
+    prompts = [_prompt(i) for i in range(len(MESSAGES))]
+    prefix_tokens = slm_engine._prefix_ids.shape[1]
+    full_tokens = [len(tokenizer(p)["input_ids"]) for p in prompts]
+    print(f"  prefix {prefix_tokens} tokens, prompts {min(full_tokens)}-{max(full_tokens)} tokens "
+          f"({prefix_tokens / statistics.mean(full_tokens):.0%} cached)")
+
+    # ── Same tokens, same output ──
+    split_ok = all(
+        tokenizer(p)["input_ids"]
+        == slm_engine._prefix_ids[0].tolist()
+        + tokenizer(p[len(_SLM_PROMPT_PREFIX):], add_special_tokens=False)["input_ids"]
+        for p in prompts
+    )
+    print(f"  prefix/suffix split tokenizes like the full prompt: {split_ok}")
+    if not split_ok:
+        failures.append("prefix + suffix token ids differ from the full prompt's")
+
+    outputs = []
+    for cached in (False, True):
+        torch.manual_seed(0)
+        outputs.append(slm_engine._generate_batch(prompts, max_new_tokens=16, use_prefix_cache=cached))
+    same = sum(a == b for a, b in zip(*outputs))
+    print(f"  seeded batch of {len(prompts)}: {same}/{len(prompts)} identical outputs cached vs uncached")
+    if same != len(prompts):
+        failures.append("cached generation diverged from uncached generation")
+
+    # ── TTFT (prefill + first token), one request at a time ──
+    _timed(prompts[:1], 1, True)
+    _timed(prompts[:1], 1, False)
+    ttft = {False: [], True: []}
+    for _ in range(RUNS):
+        for prompt in prompts:
+            for cached in (False, True):
+                ttft[cached].append(_timed([prompt], 1, cached))
+    p50 = {k: statistics.median(v) * 1000 for k, v in ttft.items()}
+    p95 = {k: sorted(v)[int(len(v) * 0.95) - 1] * 1000 for k, v in ttft.items()}
+    print(f"\n  {'':14}{'TTFT p50':>10}{'TTFT p95':>10}")
+    print(f"  {'full prompt':14}{p50[False]:>8.1f}ms{p95[False]:>8.1f}ms")
+    print(f"  {'prefix cache':14}{p50[True]:>8.1f}ms{p95[True]:>8.1f}ms")
+    speedup = p50[False] / p50[True]
+
+    # ── Whole request (prefill + up to _MAX_NEW_TOKENS) ──
+    full = {cached: _timed(prompts[:1], _MAX_NEW_TOKENS, cached) for cached in (False, True)}
+    print(f"  full generate ({_MAX_NEW_TOKENS} new tokens): "
+          f"{full[False]:.2f}s → {full[True]:.2f}s")
+
+    print("=" * 60)
+    if speedup <= 1.0:
+        failures.append(f"prefix cache did not reduce TTFT ({speedup:.2f}x)")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ {speedup:.1f}x faster time-to-first-token with the prefix KV cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+SLM prompt budget benchmark — per-turn prompt size and prefill time with the
+token-budgeted PromptBuilder vs the previous fixed template (last 6 history
+messages, every section always present). Runs in-process on CPU; needs the
+model at SLM_MODEL_PATH.
+
+Over scripted conversations that grow to 12 messages, checks that every
+suffix stays within SLM_PROMPT_TOKEN_BUDGET (counted with the model's own
+tokenizer), that empty sections are left out, that history lines carrying
+numbers / UPI IDs survive condensation, and that constrained decoding keeps
+the missed_entities lists the rules already filled empty.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_prompt.py
+"""
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_THREADS"] = "1"  # single-core CPU, like the deployed container
+os.environ["SLM_PREFIX_CACHE"] = "true"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from config import SLM_PROMPT_TOKEN_BUDGET  # noqa: E402
+from slm_engine import _SLM_PROMPT_PREFIX, slm_engine  # noqa: E402
+from slm_prompt import ENTITY_FIELDS, wanted_entities  # noqa: E402
+
+# The template this replaces, for comparison
+LEGACY_SUFFIX = """SCAM TYPE: {scam_type}
+CONVERSATION PHASE: {phase}
+TURN NUMBER: {turn_count}
+
+SCAMMER'S MESSAGE: "{message}"
+
+CONVERSATION HISTORY (last 3 turns):
+{history}
+
+RULE-BASED ANALYSIS:
+- Detected scam: {rule_detected}
+- Confidence: {rule_confidence}
+- Extracted: {rule_intel_summary}
+- Rule reply: "{rule_reply}"
+
+JSON:"""
+
+CONVERSATIONS = [
+    [
+        "URGENT: Your SBI account will be blocked today. Share OTP to verify immediately.",
+        "Sir I am calling from SBI head office, my employee ID is 4521. Send OTP fast.",
+        "Transfer Rs 1 to verify@sbi UPI to unblock, or call 9876543210 now.",
+        "Why are you delaying? Your account will be frozen in 10 minutes.",
+        "Uncle please understand, this is RBI rule, every customer must do re-KYC today otherwise "
+        "all your savings, FD and pension will be seized by government and you will have to visit "
+        "the branch with documents, so better you do it now on phone only.",
+        "Ok last chance. Send OTP or I am closing the account.",
+    ],
+    [
+        "Congratulations! You won Rs 25 lakh in KBC lottery. Pay 5000 processing fee to claim.",
+        "Send the fee to kbc.prize@ybl and share your bank account number.",
+        "Sir this is last chance, prize will go to next winner. Pay now.",
+        "Email your Aadhaar to claims@kbc-lottery.in for verification.",
+        "Why no reply? Click http://kbc-claim.in/winner to fill the form.",
+        "Hello? Are you there? Pay fast.",
+    ],
+]
+REPLIES = ["Arey, which account sir? I have two accounts.", "Wait beta, let me find my glasses.",
+           "Haan ji, I am listening, speak slowly please."]
+
+
+def _turns():
+    """(message, history, rule_intel, rule_reply, turn) for every scammer turn."""
+    for messages in CONVERSATIONS:
+        history = []
+        intel = {field: [] for field in ENTITY_FIELDS}
+        for turn, text in enumerate(messages, start=1):
+            if "9876543210" in text:
+                intel["phoneNumbers"].append("+919876543210")
+            if "@ybl" in text or "@sbi" in text:
+                intel["upiIds"].append(text.split()[text.split().index("to") + 1] if " to " in text else "x@ybl")
+            reply = REPLIES[turn % len(REPLIES)]
+            yield text, list(history), {k: list(v) for k, v in intel.items()}, reply, turn
+            history += [{"sender": "scammer", "text": text}, {"sender": "user", "text": reply}]
+
+
+def _legacy_prompt(message, history, intel, reply, turn) -> str:
+    intel_parts = [f"{key}: {vals[:3]}" for key, vals in intel.items() if vals]
+    return _SLM_PROMPT_PREFIX + LEGACY_SUFFIX.format(
+        scam_type="BANK_FRAUD", phase=slm_engine._phase(turn), turn_count=turn, message=message[:300],
+        history="\n".join(f"  [{h['sender']}]: {h['text'][:100]}" for h in history[-6:]) or "  (first message)",
+        rule_detected=True, rule_confidence="0.70",
+        rule_intel_summary="; ".join(intel_parts) or "none yet", rule_reply=reply[:150],
+    )
+
+
+def _budget_prompt(message, history, intel, reply, turn) -> str:
+    return slm_engine._build_prompt(message, history, "BANK_FRAUD", turn, True, 0.7, intel, reply)
+
+
+def _prefill_ms(prompt: str, runs: int = 3) -> float:
+    """Suffix prefill on the cached prefix, plus one sampled token."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        slm_engine._generate_batch([prompt], max_new_tokens=1, constrained=False)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def main():
+    print("=" * 60)
+    print("  SLM PROMPT BUDGET BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, budget {SLM_PROMPT_TOKEN_BUDGET} tokens")
+    print("=" * 60)
+    logging.disable(logging.WARNING)
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("  ❌ SLM failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+
+    tokenizer = slm_engine.tokenizer
+
+    def suffix_tokens(prompt: str) -> int:
+        return len(tokenizer(prompt[len(_SLM_PROMPT_PREFIX):], add_special_tokens=False)["input_ids"])
+
+    turns = list(_turns())
+    legacy = [_legacy_prompt(*t) for t in turns]
+    budgeted = [_budget_prompt(*t) for t in turns]
+    started = time.perf_counter()
+    for t in turns:
+        _budget_prompt(*t)
+    build_ms = (time.perf_counter() - started) * 1000 / len(turns)
+
+    sizes = {"legacy": [suffix_tokens(p) for p in legacy], "budgeted": [suffix_tokens(p) for p in budgeted]}
+    prefill = {"legacy": [_prefill_ms(p) for p in legacy], "budgeted": [_prefill_ms(p) for p in budgeted]}
+    print(f"  {'per-turn prompt':18}{'tokens p50':>12}{'max':>6}{'prefill p50':>14}{'max':>10}")
+    for name in sizes:
+        print(f"  {name:18}{statistics.median(sizes[name]):>12.0f}{max(sizes[name]):>6}"
+              f"{statistics.median(prefill[name]):>12.1f}ms{max(prefill[name]):>8.1f}ms")
+    print(f"  prompt build {build_ms:.2f}ms per turn ({'estimated' if slm_engine._prompts.estimated else 'exact'} counts)\n")
+
+    failures = []
+
+    def expect(label, ok):
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+
+    expect(f"every suffix within the budget (max {max(sizes['budgeted'])})",
+           max(sizes["budgeted"]) <= SLM_PROMPT_TOKEN_BUDGET)
+    expect("no placeholder sections",
+           not any(marker in p for p in budgeted for marker in ("(first message)", "none yet", "UNKNOWN")))
+    expect("MISSING INTEL names exactly the unfilled fields",
+           all(wanted_entities(p) == {f for f in ENTITY_FIELDS if not t[2][f]} for p, t in zip(budgeted, turns)))
+    shown = {"legacy": 0, "budgeted": 0}
+    every_turn = True
+    for t, old, new in zip(turns, legacy, budgeted):
+        intel_lines = [h["text"][:30] for h in t[1] if any(c in h["text"] for c in ("@", "9876543210"))]
+        shown["legacy"] += sum(line in old for line in intel_lines)
+        shown["budgeted"] += sum(line in new for line in intel_lines)
+        every_turn &= not intel_lines or any(line in new for line in intel_lines)
+    expect(f"a history line with a phone number / UPI ID shown on every turn that has one "
+           f"({shown['budgeted']} shown vs {shown['legacy']} in the last-6 window)", every_turn)
+    expect("each prompt's message is shown", all(t[0][:30] in p for p, t in zip(budgeted, turns)))
+
+    # Filled fields stay empty under constrained decoding
+    schema = slm_engine._json_schema
+    if schema is not None:
+        filled = [(p, t) for p, t in zip(budgeted, turns) if any(t[2].values())][:2]
+        outputs = slm_engine._generate_batch([p for p, _ in filled], max_new_tokens=schema.min_tokens + 24)
+        parsed = [slm_engine._parse_output(o, "")["missed_entities"] for o in outputs]
+        expect("filled missed_entities lists generated empty",
+               all(not missed.get(f) for missed, (_, t) in zip(parsed, filled) for f in ENTITY_FIELDS if t[2][f]))
+
+    print("=" * 60)
+    legacy_p50, budget_p50 = statistics.median(prefill["legacy"]), statistics.median(prefill["budgeted"])
+    if statistics.median(sizes["budgeted"]) >= statistics.median(sizes["legacy"]):
+        failures.append("budgeted prompts are not smaller than the fixed template")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ per-turn prompt {statistics.median(sizes['legacy']):.0f} → {statistics.median(sizes['budgeted']):.0f} "
+          f"tokens (p50), prefill {legacy_p50:.0f}ms → {budget_p50:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+SLM logit scoring benchmark — latency of one SLM call per message with
+SLM_MODE=generate (sampled JSON), score (one forward pass over the
+get_scam_type labels) and both, run in-process through smart_process with
+the result cache off. Needs the model at SLM_MODEL_PATH.
+
+Checks that scores are well-formed (probability in [0, 1], every label ranked,
+distribution sums to 1), that batched scoring — padded rows on the cached
+header — matches scoring each message alone, and reports how often the top
+SLM scam type agrees with the rule-based get_scam_type.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_scoring.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_CACHE_ENABLED"] = "false"  # every call runs the model
+os.environ.setdefault("SLM_TIMEOUT", "600")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import slm_engine as engine_module  # noqa: E402
+from scam_detector import SCAM_TYPES, detect_scam, get_scam_type  # noqa: E402
+from slm_engine import slm_engine  # noqa: E402
+from slm_scoring import context_block  # noqa: E402
+
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Sir your electricity will be cut tonight, call 9876543210 and pay pending bill now.",
+    "Earn 5000 daily from home, part time job, just pay registration fee on UPI.",
+    "Your income tax refund of Rs 15,490 is pending, update bank details at this link.",
+]
+MODES = ("generate", "score", "both")
+
+
+async def _turn(i: int) -> dict:
+    return await slm_engine.smart_process(
+        MESSAGES[i % len(MESSAGES)], [], "BANK_FRAUD", 1 + i, True, 0.55,
+        {"phoneNumbers": ["+919876543210"]}, "Arey, which account sir? I have two accounts.",
+    )
+
+
+async def measure(mode: str) -> dict:
+    engine_module._MODE = mode
+    latencies, results = [], []
+    for i in range(len(MESSAGES)):
+        started = time.perf_counter()
+        results.append(await _turn(i))
+        latencies.append(time.perf_counter() - started)
+    return {"p50": statistics.median(latencies) * 1000, "max": max(latencies) * 1000, "results": results}
+
+
+def check_scores(failures: list):
+    def expect(label, ok):
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+
+    contexts = [context_block(m, []) for m in MESSAGES]
+    batched = slm_engine._score_batch(contexts)
+    alone = [slm_engine._score_batch([c])[0] for c in contexts]
+    expect("scam probability within [0, 1]", all(0.0 <= s["scam_probability"] <= 1.0 for s in batched))
+    expect("every scam type ranked, best first",
+           all(sorted(label for label, _ in s["scam_types"]) == sorted(SCAM_TYPES)
+               and [p for _, p in s["scam_types"]] == sorted((p for _, p in s["scam_types"]), reverse=True)
+               for s in batched))
+    expect("type distribution sums to 1", all(abs(sum(p for _, p in s["scam_types"]) - 1.0) < 1e-3 for s in batched))
+    drift = max(abs(b["scam_probability"] - a["scam_probability"]) for b, a in zip(batched, alone))
+    expect(f"batched (padded, cached header) matches one at a time (max drift {drift:.4f})",
+           drift < 1e-3 and all(b["scam_types"][0][0] == a["scam_types"][0][0] for b, a in zip(batched, alone)))
+    standalone = asyncio.run(slm_engine.score(MESSAGES[0], []))
+    expect("score() usable on its own", standalone is not None
+           and abs(standalone["scam_probability"] - batched[0]["scam_probability"]) < 1e-3)
+
+    agree = sum(scores["scam_types"][0][0] == get_scam_type(detect_scam(message)[1])
+                for message, scores in zip(MESSAGES, batched))
+    print(f"  top SLM scam type agrees with get_scam_type on {agree}/{len(MESSAGES)} messages")
+
+
+def main():
+    print("=" * 60)
+    print("  SLM LOGIT SCORING BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, {len(MESSAGES)} messages per mode")
+    print("=" * 60)
+    logging.disable(logging.WARNING)
+    slm_engine.warmup()
+    if not slm_engine.ready or not slm_engine.scoring_ready:
+        print("  ❌ SLM or logit scoring failed to load — set SLM_MODEL_PATH to a local model")
+        sys.exit(1)
+
+    failures = []
+    check_scores(failures)
+    asyncio.run(measure("score"))  # warm the scoring path
+
+    runs = {mode: asyncio.run(measure(mode)) for mode in MODES}
+    print(f"\n  {'SLM_MODE':12}{'p50':>10}{'max':>10}{'confidence':>12}{'reply':>8}")
+    for mode, r in runs.items():
+        confident = sum(1 for res in r["results"] if res["slm_used"] and res["refined_confidence"] > 0)
+        replies = sum(1 for res in r["results"] if res["refined_reply"])
+        print(f"  {mode:12}{r['p50']:>8.0f}ms{r['max']:>8.0f}ms{confident:>9}/{len(MESSAGES)}{replies:>5}/{len(MESSAGES)}")
+
+    score_run = runs["score"]["results"]
+    if not all(res["slm_used"] and "scam_types" in res and not res["refined_reply"] for res in score_run):
+        failures.append("SLM_MODE=score did not return scores alone")
+    if not all(res["slm_used"] and "scam_types" in res for res in runs["both"]["results"]):
+        failures.append("SLM_MODE=both did not return scores with the generation")
+
+    print("=" * 60)
+    speedup = runs["generate"]["p50"] / runs["score"]["p50"]
+    if speedup < 5:
+        failures.append(f"scoring only {speedup:.1f}x faster than generation")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ SLM confidence in {runs['score']['p50']:.0f}ms by logit scoring vs "
+          f"{runs['generate']['p50']:.0f}ms generated ({speedup:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
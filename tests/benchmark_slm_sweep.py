@@ -0,0 +1,312 @@
+"""
+SLM configuration sweep — replays a fixed corpus of scenario turns through
+SLMEngine.smart_process under every combination of backend, torch thread count,
+max_new_tokens, batch size and sampling settings, and writes a machine-readable
+report to pick the production setting from.
+
+For each configuration: per-turn latency p50/p95, generated tokens/s, peak RSS,
+JSON parse rate, and how often the SLM result changed the turn's confidence,
+scam type, intel or reply (as SessionManager.merge_slm_result would merge it).
+
+The corpus is the multi-scenario conversations (test_multi_scenario.SCENARIOS)
+replayed rule-only through main._analyze_turn, so every turn carries the rule
+confidence, scam type, intel and reply the SLM is asked to refine. Each
+configuration runs in a fresh process (its SLM_* settings are read at import,
+and peak RSS must not carry over). Runs on CPU (no server); needs the model at
+SLM_MODEL_PATH.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_sweep.py
+
+The grid is set with comma-separated lists (sampling as temperature:top_p,
+temperature 0 = greedy); the report goes to SWEEP_REPORT:
+
+    SWEEP_BACKENDS=torch,int8 SWEEP_THREADS=1,2 SWEEP_MAX_NEW_TOKENS=96,200 \\
+    SWEEP_BATCH_SIZES=1,4 SWEEP_SAMPLING=0.7:1.0,0:1.0 python tests/benchmark_slm_sweep.py
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _list(name: str, default: str, cast=str) -> list:
+    return [cast(v.strip()) for v in os.getenv(name, default).split(",") if v.strip()]
+
+
+BACKENDS = _list("SWEEP_BACKENDS", "torch,int8")
+THREADS = _list("SWEEP_THREADS", f"1,{os.cpu_count() or 1}", int)
+MAX_NEW_TOKENS = _list("SWEEP_MAX_NEW_TOKENS", "96,200", int)
+BATCH_SIZES = _list("SWEEP_BATCH_SIZES", "1,4", int)
+SAMPLING = [tuple(float(x) for x in v.split(":")) for v in _list("SWEEP_SAMPLING", "0.7:1.0,0:1.0")]
+PASSES = int(os.getenv("SWEEP_PASSES", "1"))  # times the corpus is replayed per configuration
+REPORT = os.getenv("SWEEP_REPORT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "slm_sweep_report.json"))
+ENTITY_FIELDS = ("phoneNumbers", "upiIds", "bankAccounts", "emailAddresses", "phishingLinks")
+
+
+def _percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50": round(statistics.median(ordered) * 1000, 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+def _parses(raw: str) -> bool:
+    match = re.search(r"\{[\s\S]*\}", raw)
+    try:
+        return bool(match) and isinstance(json.loads(match.group()), dict)
+    except ValueError:
+        return False
+
+
+# ── Corpus ─────────────────────────────────────────────────────────────
+
+def build_corpus() -> list:
+    """Every scenario turn with its rule-only results (the SLM's inputs)."""
+    os.environ["USE_SLM"] = "false"
+    logging.disable(logging.CRITICAL)
+    from main import _analyze_turn
+    from session_manager import session_manager
+    from test_multi_scenario import SCENARIOS
+
+    corpus = []
+    for name, scenario in SCENARIOS.items():
+        sid = f"sweep-{name}"
+        history = []
+        for i, text in enumerate(scenario["messages"]):
+            body = {"sessionId": sid, "message": {"sender": "scammer", "text": text,
+                                                  "timestamp": 1760000000000 + i * 30000}}
+            result = asyncio.run(_analyze_turn(body, send_callback=False))
+            intel = result["extractedIntelligence"]
+            corpus.append({
+                "scenario": name,
+                "message": text,
+                "history": list(history),
+                "scamType": result["scamType"],
+                "turn": i + 1,
+                "scamDetected": result["scamDetected"],
+                "confidence": result["confidenceLevel"],
+                "intel": {field: list(intel.get(field, [])) for field in ENTITY_FIELDS},
+                "reply": result["reply"],
+            })
+            history += [{"sender": "scammer", "text": text}, {"sender": "user", "text": result["reply"]}]
+        session_manager.remove(sid)
+    logging.disable(logging.NOTSET)
+    return corpus
+
+
+# ── One configuration (child process) ──────────────────────────────────
+
+def _changes(turn: dict, result: dict) -> dict:
+    """What merging this SLM result into the turn's session would change."""
+    from models import ExtractedIntelligence
+    from session_manager import SessionData, SessionManager
+
+    session = SessionData("sweep")
+    session.confidence_level = turn["confidence"]
+    session.scam_type = turn["scamType"]
+    session.intelligence = ExtractedIntelligence(**{field: list(vals) for field, vals in turn["intel"].items()})
+    before = sum(len(vals) for vals in turn["intel"].values())
+    type_changed = SessionManager.merge_slm_result(session, result)
+    return {
+        "confidence": session.confidence_level != turn["confidence"],
+        "scamType": type_changed,
+        "intel": sum(len(getattr(session.intelligence, field)) for field in ENTITY_FIELDS) > before,
+        "reply": len(result.get("refined_reply", "")) > 15,  # main.py's bar for using the SLM reply
+    }
+
+
+async def _replay(corpus: list, batch_size: int) -> tuple:
+    """Corpus turns submitted batch_size at a time → (per-turn latencies, results)."""
+    from slm_engine import slm_engine
+
+    async def one(turn):
+        started = time.perf_counter()
+        result = await slm_engine.smart_process(
+            turn["message"], turn["history"], turn["scamType"], turn["turn"], turn["scamDetected"],
+            turn["confidence"], turn["intel"], turn["reply"],
+        )
+        return time.perf_counter() - started, result
+
+    timed = []
+    for start in range(0, len(corpus), batch_size):
+        timed += await asyncio.gather(*(one(turn) for turn in corpus[start:start + batch_size]))
+    return [seconds for seconds, _ in timed], [result for _, result in timed]
+
+
+def run_config(corpus_path: str):
+    """Child process: load the SLM as configured by the environment, replay the corpus, print one JSON line."""
+    logging.disable(logging.WARNING)
+    import torch
+    torch.manual_seed(0)
+    from slm_engine import slm_engine
+
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        print("RESULT " + json.dumps({"error": "failed to load"}))
+        return
+
+    parsed = []
+    parse_output = slm_engine._parse_output
+
+    def counting_parse(raw, fallback_reply):
+        parsed.append(_parses(raw))
+        return parse_output(raw, fallback_reply)
+    slm_engine._parse_output = counting_parse
+
+    slm_engine.generated_tokens, slm_engine.generate_seconds = 0, 0.0
+    batch_size = int(os.environ["SLM_BATCH_MAX_SIZE"])
+    latencies, results = [], []
+    started = time.perf_counter()
+    for _ in range(PASSES):
+        seconds, outputs = asyncio.run(_replay(corpus, batch_size))
+        latencies += seconds
+        results += outputs
+    wall = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux; before main is imported
+
+    turns = corpus * PASSES
+    used = [(turn, result) for turn, result in zip(turns, results) if result.get("slm_used")]
+    changes = [_changes(turn, result) for turn, result in used]
+    stats = slm_engine.stats()
+    print("RESULT " + json.dumps({
+        "backendLoaded": stats["backend"],
+        "loadSeconds": stats["loadSeconds"],
+        "cpu": stats["cpu"],
+        "turns": len(turns),
+        "slmUsed": len(used),
+        "latencyMs": _percentiles(latencies),
+        "turnsPerSecond": round(len(turns) / wall, 2),
+        "generatedTokens": stats["generatedTokens"],
+        "tokensPerSecond": stats["tokensPerSecond"],
+        "peakRssMb": round(peak_rss, 1),
+        "modelRssMb": stats["modelRssMb"],
+        "jsonParseRate": round(sum(parsed) / len(parsed), 3) if parsed else 0.0,
+        "changeRate": {
+            key: round(sum(c[key] for c in changes) / len(turns), 3)
+            for key in ("confidence", "scamType", "intel", "reply")
+        },
+        "timeouts": slm_engine.abandoned["timeout"],
+    }))
+
+
+# ── Sweep ──────────────────────────────────────────────────────────────
+
+def _grid() -> list:
+    return [
+        {"backend": backend, "threads": threads, "maxNewTokens": tokens, "batchSize": batch,
+         "temperature": temperature, "topP": top_p}
+        for backend, threads, tokens, batch, (temperature, top_p)
+        in itertools.product(BACKENDS, THREADS, MAX_NEW_TOKENS, BATCH_SIZES, SAMPLING)
+    ]
+
+
+def _run(config: dict, corpus_path: str) -> dict:
+    env = dict(
+        os.environ, USE_SLM="true", SLM_INFERENCE="local", SLM_WORKERS="0", SLM_MODE="generate",
+        SLM_CACHE_ENABLED="false",     # every turn runs the model
+        SLM_GATE_ENABLED="false",
+        SLM_DEADLINE_AWARE="false",    # full-length generations: the configuration is what's measured
+        SLM_TIMEOUT=os.getenv("SLM_TIMEOUT", "600"),
+        SLM_BACKEND=config["backend"], SLM_MAX_NEW_TOKENS=str(config["maxNewTokens"]),
+        SLM_BATCH_MAX_SIZE=str(config["batchSize"]), SLM_TEMPERATURE=str(config["temperature"]),
+        SLM_TOP_P=str(config["topP"]), SLM_THREADS=str(config["threads"]),
+    )
+    proc = subprocess.run([sys.executable, __file__, "--child", corpus_path], env=env,
+                          capture_output=True, text=True, timeout=3600)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    return json.loads(lines[-1][7:]) if lines else {"error": proc.stderr.strip()[-300:]}
+
+
+def main():
+    grid = _grid()
+    print("=" * 60)
+    print("  SLM CONFIGURATION SWEEP")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, {len(grid)} configurations")
+    print("=" * 60)
+
+    corpus = build_corpus()
+    print(f"  corpus: {len(corpus)} turns from {len({t['scenario'] for t in corpus})} scenarios, "
+          f"{PASSES} pass(es) per configuration\n")
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(corpus, f)
+    try:
+        runs = []
+        print(f"  {'backend':8}{'thr':>4}{'tok':>5}{'bat':>4}{'temp':>6}{'top_p':>6}"
+              f"{'p50':>8}{'p95':>8}{'tok/s':>7}{'RSS':>8}{'JSON':>6}{'conf':>6}{'type':>6}{'intel':>6}")
+        for config in grid:
+            result = _run(config, f.name)
+            runs.append({"config": config, **result})
+            head = (f"  {config['backend']:8}{config['threads']:>4}{config['maxNewTokens']:>5}"
+                    f"{config['batchSize']:>4}{config['temperature']:>6.2f}{config['topP']:>6.2f}")
+            if "error" in result:
+                print(f"{head}  ERROR {result['error']}")
+                continue
+            changed = result["changeRate"]
+            print(f"{head}{result['latencyMs']['p50']:>6.0f}ms{result['latencyMs']['p95']:>6.0f}ms"
+                  f"{result['tokensPerSecond']:>7.1f}{result['peakRssMb']:>6.0f}MB{result['jsonParseRate']:>6.0%}"
+                  f"{changed['confidence']:>6.0%}{changed['scamType']:>6.0%}{changed['intel']:>6.0%}")
+    finally:
+        os.unlink(f.name)
+
+    measured = [run for run in runs if "error" not in run]
+    ranked = [run for run in measured if run["backendLoaded"] == run["config"]["backend"]]
+    report = {
+        "model": os.getenv("SLM_MODEL_PATH", "./SmolLM2-135M-Instruct"),
+        "cpuCount": os.cpu_count(),
+        "generatedAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "corpus": {"turns": len(corpus), "scenarios": sorted({t["scenario"] for t in corpus}), "passes": PASSES},
+        "grid": {"backends": BACKENDS, "threads": THREADS, "maxNewTokens": MAX_NEW_TOKENS,
+                 "batchSizes": BATCH_SIZES, "sampling": [list(s) for s in SAMPLING]},
+        "runs": runs,
+        # Candidates to compare; which one ships is a latency vs quality call
+        "best": {
+            "p95Latency": min(ranked, key=lambda r: r["latencyMs"]["p95"])["config"] if ranked else None,
+            "tokensPerSecond": max(ranked, key=lambda r: r["tokensPerSecond"])["config"] if ranked else None,
+            "jsonParseRate": max(ranked, key=lambda r: (r["jsonParseRate"], -r["latencyMs"]["p95"]))["config"]
+            if ranked else None,
+        },
+    }
+    with open(REPORT, "w") as out:
+        json.dump(report, out, indent=2)
+
+    print("=" * 60)
+    failures = [f"{run['config']}: {run['error']}" for run in runs if "error" in run]
+    for backend in BACKENDS:  # onnx without optimum falls back to torch
+        loaded = {run["backendLoaded"] for run in measured if run["config"]["backend"] == backend}
+        if loaded - {backend}:
+            print(f"  ⚠️ {backend} unavailable — its rows ran {', '.join(sorted(loaded))} (not ranked)")
+    for run in measured:
+        if not run["slmUsed"]:
+            failures.append(f"{run['config']}: no turn got an SLM result")
+    with open(REPORT) as saved:
+        written = json.load(saved)
+    ok = not failures and len(written["runs"]) == len(grid)
+    print(f"  [{'PASS' if ok else 'FAIL'}] {len(measured)}/{len(grid)} configurations measured, report → {REPORT}")
+    for failure in failures:
+        print(f"    {failure}")
+    print(f"  {'✅' if ok else '❌'} SLM sweep {'complete' if ok else 'incomplete'}")
+    print("=" * 60)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        run_config(sys.argv[sys.argv.index("--child") + 1])
+    else:
+        main()
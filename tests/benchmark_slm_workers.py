@@ -0,0 +1,247 @@
+"""
+SLM worker process benchmark — end-to-end latency of rule-only POST /analyze
+calls (the gate keeps them off the SLM) while other sessions keep the SLM
+generating, with the model in the API process (SLM_WORKERS=0) vs in worker
+processes (SLM_WORKERS=2). Starts its own uvicorn server per mode; needs the
+model at SLM_MODEL_PATH.
+
+Then, in-process, supervision: the busy worker is SIGKILLed mid-generation,
+its request falls back to the rules, the other worker keeps serving, and the
+killed one is respawned. Shared (mmap-ed) pages per worker are reported.
+
+    SLM_MODEL_PATH=./SmolLM2-135M-Instruct python tests/benchmark_slm_workers.py
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PORT = 8017
+BASE_URL = f"http://localhost:{PORT}"
+API_KEY = "sentinal-hackathon-2026"
+MODES = [0, 2]
+RULE_TURNS = 60
+SLM_CLIENTS = 2
+RULE_MESSAGES = [
+    "Hello uncle, this is Priya from the society office about the community hall booking.",
+    "Namaste, your cylinder delivery is scheduled for tomorrow morning.",
+    "Hi, are you coming to the temple committee meeting on Sunday?",
+    "Uncle the cricket match starts at 7, are you watching?",
+]
+SLM_MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Sir your electricity will be cut tonight, call 9876543210 and pay pending bill now.",
+]
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+
+def _start_server(workers: int) -> subprocess.Popen:
+    # Every detected scam turn reaches the SLM (never "confident"); benign turns still skip it
+    env = dict(os.environ, USE_SLM="true", SLM_WORKERS=str(workers), SLM_CACHE_ENABLED="false",
+               SLM_GATE_CONF_HIGH="1.1", SLM_GATE_COOLDOWN_SECONDS="0",
+               SLM_TIMEOUT="600", SLM_WORKER_HANG_SECONDS="600")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--app-dir", "src", "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    while time.perf_counter() - started < 600:
+        try:
+            if "honeypot_slm_ready 1" in requests.get(f"{BASE_URL}/metrics", timeout=2).text.splitlines():
+                return server
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("server did not report the SLM ready")
+
+
+def _post(http, sid: str, text: str) -> float:
+    body = {"sessionId": sid, "message": {"sender": "scammer", "text": text, "timestamp": 1760000000000}}
+    started = time.perf_counter()
+    http.post(f"{BASE_URL}/analyze", json=body, timeout=600).raise_for_status()
+    return time.perf_counter() - started
+
+
+def _rule_turns(http, tag: str) -> list:
+    latencies = []
+    for i in range(RULE_TURNS):
+        latencies.append(_post(http, f"workers-{tag}-{i}", RULE_MESSAGES[i % len(RULE_MESSAGES)]))
+        time.sleep(0.02)  # spread the calls over the generations
+    return latencies
+
+
+def measure(workers: int) -> dict:
+    """Rule-only latency idle, then while SLM_CLIENTS sessions keep the SLM busy."""
+    server = _start_server(workers)
+    try:
+        http = requests.Session()
+        http.headers.update({"x-api-key": API_KEY})
+        _rule_turns(http, "warm")
+        idle = _rule_turns(http, "idle")
+
+        stop = threading.Event()
+        slm_calls = [0]
+
+        def keep_slm_busy(client: int):
+            scam = requests.Session()
+            scam.headers.update({"x-api-key": API_KEY})
+            i = 0
+            while not stop.is_set():
+                _post(scam, f"workers-scam-{client}-{i}", SLM_MESSAGES[(client + i) % len(SLM_MESSAGES)])
+                slm_calls[0] += 1
+                i += 1
+
+        clients = [threading.Thread(target=keep_slm_busy, args=(c,)) for c in range(SLM_CLIENTS)]
+        for client in clients:
+            client.start()
+        time.sleep(1.0)  # generations under way
+        loaded = _rule_turns(http, "loaded")
+        stop.set()
+        for client in clients:
+            client.join()
+        metrics = requests.get(f"{BASE_URL}/metrics", timeout=5).text
+    finally:
+        server.kill()
+        server.wait()
+    tokens = next((float(line.split()[-1]) for line in metrics.splitlines()
+                   if line.startswith("honeypot_slm_generated_tokens_total")), 0.0)
+    return {
+        "idle_p50": _percentile(idle, 0.5), "idle_p95": _percentile(idle, 0.95),
+        "loaded_p50": _percentile(loaded, 0.5), "loaded_p95": _percentile(loaded, 0.95),
+        "slm_calls": slm_calls[0], "tokens": tokens,
+    }
+
+
+async def _slm_request(slm_engine, i: int) -> dict:
+    return await slm_engine.smart_process(
+        SLM_MESSAGES[i % len(SLM_MESSAGES)], [], "BANK_FRAUD", 1 + i % 9, True, 0.55,
+        {"phoneNumbers": ["+919876543210"]}, "Arey, which account sir? I have two accounts.",
+    )
+
+
+async def _supervision(slm_engine) -> dict:
+    """SIGKILL the busy worker mid-generation; the other keeps serving, the killed one comes back."""
+    pool = slm_engine.pool
+    in_flight = asyncio.create_task(_slm_request(slm_engine, 0))
+    while not any(w.busy for w in pool.workers):
+        await asyncio.sleep(0.01)
+    killed = next(w for w in pool.workers if w.busy)
+    victim = killed.process.pid
+    os.kill(victim, signal.SIGKILL)
+    results = [await in_flight]
+    during = await _slm_request(slm_engine, 7)  # served by the surviving worker
+    started = time.perf_counter()
+    while pool.alive() < pool.size and time.perf_counter() - started < 120:
+        await asyncio.sleep(0.2)
+    respawned = time.perf_counter() - started
+    after = await asyncio.gather(*(_slm_request(slm_engine, i) for i in range(2)))
+    stats = pool.stats()
+    return {
+        "fell_back": sum(not r["slm_used"] for r in results),
+        "served_during_restart": during["slm_used"],
+        "respawn_seconds": respawned,
+        "served_after": sum(r["slm_used"] for r in after),
+        "restarts": stats["restarts"],
+        "crashes": stats["crashes"],
+        "new_pid": killed.process.pid != victim,
+        "shared_mb": [w.get("sharedMb", 0.0) for w in stats["workers"]],
+        "rss_mb": [w.get("rssMb", 0.0) for w in stats["workers"]],
+    }
+
+
+def run_supervision():
+    """Child process: SLM_WORKERS=2 in-process, prints one JSON line."""
+    sys.path.insert(0, os.path.join(ROOT, "src"))
+    logging.disable(logging.WARNING)
+    from slm_engine import slm_engine
+
+    slm_engine.warmup()
+    if slm_engine.pool is None:
+        print("RESULT " + json.dumps({"error": "worker pool failed to start"}))
+        return
+    result = asyncio.run(_supervision(slm_engine))
+    result["api_torch"] = "torch" in sys.modules
+    slm_engine.pool.close()
+    print("RESULT " + json.dumps(result))
+
+
+def main():
+    print("=" * 60)
+    print("  SLM WORKER PROCESS BENCHMARK")
+    print(f"  model: {os.getenv('SLM_MODEL_PATH', './SmolLM2-135M-Instruct')}, "
+          f"{RULE_TURNS} rule-only turns, {os.cpu_count()} core(s)")
+    print("=" * 60)
+
+    results = {}
+    for workers in MODES:
+        try:
+            results[workers] = measure(workers)
+        except Exception as e:
+            print(f"  ❌ SLM_WORKERS={workers}: {e}")
+            sys.exit(1)
+
+    print(f"  {'rule-only /analyze latency':28}{'idle p50':>10}{'p95':>8}{'+SLM p50':>10}{'p95':>8}{'SLM calls':>11}")
+    for workers, r in results.items():
+        label = "in-process SLM" if workers == 0 else f"{workers} SLM worker processes"
+        print(f"  {label:28}{r['idle_p50']:>8.1f}ms{r['idle_p95']:>6.1f}ms"
+              f"{r['loaded_p50']:>8.1f}ms{r['loaded_p95']:>6.1f}ms{r['slm_calls']:>11}")
+
+    env = dict(os.environ, USE_SLM="true", SLM_WORKERS="2", SLM_CACHE_ENABLED="false",
+               SLM_TIMEOUT="600", SLM_WORKER_HANG_SECONDS="600")
+    proc = subprocess.run([sys.executable, __file__, "--child"], env=env,
+                          capture_output=True, text=True, timeout=1800)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    pooled = json.loads(lines[-1][7:]) if lines else {"error": proc.stderr.strip()[-300:]}
+    if "error" in pooled:
+        print(f"  ❌ supervision run: {pooled['error']}")
+        sys.exit(1)
+
+    failures = []
+    print("\n  Supervision (busy worker SIGKILLed mid-generation)")
+    checks = [
+        ("API process never imported torch", not pooled["api_torch"]),
+        ("its in-flight request fell back to the rules", pooled["fell_back"] == 1),
+        ("the other worker served while it restarted", pooled["served_during_restart"]),
+        (f"respawned in {pooled['respawn_seconds']:.1f}s with a new pid", pooled["new_pid"]),
+        (f"both workers serving afterwards ({pooled['served_after']}/2)", pooled["served_after"] == 2),
+        (f"counted: crashes={pooled['crashes']}, restarts={pooled['restarts']}",
+         pooled["crashes"] == 1 and pooled["restarts"] == 1),
+    ]
+    for label, ok in checks:
+        print(f"  {'[PASS]' if ok else '[FAIL]'} {label}")
+        if not ok:
+            failures.append(label)
+    print(f"  worker RSS {pooled['rss_mb']} MB, of which shared with other processes {pooled['shared_mb']} MB")
+
+    print("=" * 60)
+    inproc, workers = results[0], results[MODES[-1]]
+    if workers["loaded_p95"] >= inproc["loaded_p95"]:
+        failures.append("rule-only p95 under SLM load did not improve with worker processes")
+    if failures:
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        sys.exit(1)
+    print(f"  ✅ rule-only p95 under SLM load: {inproc['loaded_p95']:.1f}ms in-process → "
+          f"{workers['loaded_p95']:.1f}ms with worker processes")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        run_supervision()
+    else:
+        main()
@@ -355,6 +355,117 @@ def test_agent_notes_quality():
     log(f"Notes has 'Intelligence'", "Intelligence" in notes)
 
 
+# ── 12. BATCH ENDPOINT ───────────────────────────────────────────────
+
+def test_batch():
+    section("12. BATCH ENDPOINT (/analyze/batch)")
+
+    ts = int(time.time() * 1000)
+    items = []
+    for turn in range(3):
+        for sid in ("batch-a", "batch-b"):
+            items.append({
+                "sessionId": f"{sid}-{ts}",
+                "message": {"sender": "scammer", "text": f"Account blocked! Call 98765432{turn}0 now", "timestamp": ts},
+            })
+    items.append("not-an-object")
+
+    r = requests.post(f"{BASE_URL}/analyze/batch", headers=HEADERS, json=items)
+    log(f"Batch → status {r.status_code}", r.status_code == 200)
+    results = r.json().get("results", [])
+    log(f"One result per item ({len(results)}/{len(items)})", len(results) == len(items))
+    log("Results keep input order",
+        [x.get("sessionId") for x in results[:6]] == [i["sessionId"] for i in items[:6]])
+    log("Per-session turns applied in order",
+        [x.get("totalMessagesExchanged") for x in results[0:6:2]] == [2, 4, 6])
+    log("Bad item reported, batch not failed", results[-1].get("reply", "") != "")
+
+    r = requests.post(f"{BASE_URL}/analyze/batch", headers={"x-api-key": "wrong"}, json=items)
+    log(f"Batch wrong API key → {r.status_code}", r.status_code == 401)
+
+
+# ── 13. NDJSON REPLAY ENDPOINT ───────────────────────────────────────
+
+def test_replay():
+    section("13. NDJSON REPLAY (/analyze/replay)")
+
+    ts = int(time.time() * 1000)
+    live = requests.post(f"{BASE_URL}/analyze", headers=HEADERS, json={
+        "sessionId": f"replay-{ts}",
+        "message": {"sender": "scammer", "text": "Hello, is this Mr. Sharma?", "timestamp": ts},
+    })
+    log(f"Live session with the archive's id → {live.status_code}", live.status_code == 200)
+    sessions_before = _metric(requests.get(f"{BASE_URL}/metrics").text, "honeypot_active_sessions")
+    lines = []
+    for turn in range(4):
+        lines.append(json.dumps({
+            "sessionId": f"replay-{ts}",
+            "message": {"sender": "scammer", "text": f"Pay Rs 500 to fraud{turn}@ybl now", "timestamp": ts},
+            "final": turn == 3,
+        }))
+    lines.append("{not json")
+    body = ("\n".join(lines) + "\n").encode()
+
+    r = requests.post(f"{BASE_URL}/analyze/replay", headers={"x-api-key": API_KEY}, data=body, stream=True)
+    log(f"Replay → status {r.status_code}", r.status_code == 200)
+    records = [json.loads(l) for l in r.iter_lines() if l]
+    results = [x for x in records if "result" in x]
+    summary = records[-1].get("summary", {}) if records else {}
+    log(f"One result per valid line ({len(results)}/4)", len(results) == 4)
+    log("Session turns applied in order",
+        [x["result"]["totalMessagesExchanged"] for x in results] == [2, 4, 6, 8])
+    log(f"Summary reports throughput ({summary.get('turnsPerSecond')} turns/s)",
+        summary.get("turns") == 5 and summary.get("errors") == 1)
+    log("Records and results carry the archive's sessionId",
+        all(x["sessionId"] == x["result"]["sessionId"] == f"replay-{ts}" for x in results))
+
+    d = requests.post(f"{BASE_URL}/debug/session/replay-{ts}", headers=HEADERS)
+    live = d.json() if d.status_code == 200 else {}
+    log(f"Live session of the same id untouched (turns {live.get('turn_count')}, "
+        f"callback_sent {live.get('callback_sent')})",
+        live.get("turn_count") == 1 and live.get("callback_sent") is False)
+    sessions_after = _metric(requests.get(f"{BASE_URL}/metrics").text, "honeypot_active_sessions")
+    log(f"Finished replay session freed ({sessions_before} → {sessions_after} sessions)",
+        sessions_before is not None and sessions_after == sessions_before)
+
+
+def _metric(text, name):
+    """Value of an unlabeled or fully-labeled sample line in Prometheus text."""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_metrics():
+    section("14. STAGE TIMINGS (Server-Timing, /metrics)")
+
+    before = requests.get(f"{BASE_URL}/metrics").text
+    turns_before = _metric(before, "honeypot_turns_total") or 0
+
+    r = requests.post(f"{BASE_URL}/analyze", headers=HEADERS, json={
+        "sessionId": f"metrics-{int(time.time())}",
+        "message": {"sender": "scammer", "text": "Your SBI account is blocked, call 9876543210", "timestamp": 0},
+    })
+    timing = r.headers.get("Server-Timing", "")
+    stages = [part.split(";")[0].strip() for part in timing.split(",") if part]
+    expected = ["parse", "session", "detect", "intel", "derive", "fraud", "reply", "build", "finalize"]
+    log(f"Server-Timing lists pipeline stages ({len(stages)})",
+        [s for s in stages if s not in ("slm", "total")] == expected and stages[-1] == "total")
+
+    m = requests.get(f"{BASE_URL}/metrics")
+    text = m.text
+    log(f"/metrics → {m.status_code} {m.headers.get('content-type', '')}",
+        m.status_code == 200 and m.headers.get("content-type", "").startswith("text/plain"))
+    log("Turn counted", (_metric(text, "honeypot_turns_total") or 0) >= turns_before + 1)
+    for stage in ("detect", "intel", "fraud", "total"):
+        count = _metric(text, f'honeypot_stage_duration_seconds_count{{stage="{stage}"}}')
+        log(f"Histogram for stage '{stage}' ({count:.0f} samples)" if count else f"Histogram for stage '{stage}'",
+            bool(count))
+    for gauge in ("honeypot_active_sessions", "honeypot_callback_queue_depth", "honeypot_slm_ready"):
+        log(f"{gauge} = {_metric(text, gauge)}", _metric(text, gauge) is not None)
+
+
 # ── Run All ────────────────────────────────────────────────────────────
 
 def main():
@@ -384,6 +495,9 @@ def main():
     test_engagement_metrics()
     test_response_time()
     test_agent_notes_quality()
+    test_batch()
+    test_replay()
+    test_metrics()
 
     print(f"\n{'=' * 60}")
     print(f"  RESULTS: {PASS} passed, {FAIL} failed out of {PASS + FAIL}")
@@ -0,0 +1,109 @@
+"""
+Session history tests — SessionData.sync_history: the resent conversationHistory
+is absorbed incrementally while its absorbed prefix is unchanged, and rescanned
+in full when it is shorter or differs anywhere in that prefix (first, middle or
+last item). Runs in-process, no server.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from session_manager import SessionData  # noqa: E402
+
+PASS = 0
+FAIL = 0
+
+
+def log(msg, ok=True):
+    global PASS, FAIL
+    tag = "[PASS]" if ok else "[FAIL]"
+    if ok:
+        PASS += 1
+    else:
+        FAIL += 1
+    print(f"  {tag} {msg}")
+
+
+def section(title):
+    print(f"\n{'-'*60}\n  {title}\n{'-'*60}")
+
+
+def _history(n: int, start: int = 0) -> list:
+    return [
+        {"sender": "scammer" if i % 2 == 0 else "user", "text": f"message {i}",
+         "timestamp": 1760000000000 + i * 20000}
+        for i in range(start, start + n)
+    ]
+
+
+def _texts(items: list) -> list:
+    return [item["text"] for item in items]
+
+
+# ── 1. INCREMENTAL ─────────────────────────────────────────────────────
+
+def test_incremental():
+    section("1. INCREMENTAL ABSORB")
+    session = SessionData("h-incremental")
+    history = _history(4)
+    new = session.sync_history(history)
+    log("First turn returns the whole history", _texts(new) == _texts(history))
+
+    history = history + _history(2, start=4)
+    new = session.sync_history(history)
+    log("Resent history + 2 → only the 2 new items", _texts(new) == ["message 4", "message 5"])
+    log("Absorbed history holds all 6 once", _texts(session.conversation_history) == _texts(history))
+
+    log("Same history again → nothing new", session.sync_history(list(history)) == [])
+    log("Equal copies of the items still match", session.sync_history([dict(i) for i in history]) == [])
+
+    restored = SessionData.from_bytes(session.to_bytes())
+    new = restored.sync_history(history + _history(1, start=6))
+    log("Digest survives the session store round-trip", _texts(new) == ["message 6"])
+
+
+# ── 2. DIVERGED ────────────────────────────────────────────────────────
+
+def _diverged(label: str, history: list, resent: list):
+    session = SessionData(f"h-{label}")
+    session.sync_history(history)
+    new = session.sync_history(resent)
+    log(f"{label} → full rescan", _texts(new) == _texts(resent))
+    log(f"{label} → absorbed history replaced", _texts(session.conversation_history) == _texts(resent))
+
+
+def test_diverged():
+    section("2. DIVERGED HISTORY → FULL RESCAN")
+    history = _history(6)
+    _diverged("Shorter history", history, history[:3])
+    _diverged("New conversation", history, _history(8, start=100))
+
+    first = [dict(history[0], text="rewritten first")] + history[1:] + _history(1, start=6)
+    _diverged("First item rewritten", history, first)
+
+    last = history[:-1] + [dict(history[-1], text="rewritten last")] + _history(1, start=6)
+    _diverged("Last absorbed item rewritten", history, last)
+
+    middle = [dict(item) for item in history] + _history(1, start=6)
+    middle[3]["text"] = "send the OTP to fraud@okaxis"
+    _diverged("Middle item rewritten", history, middle)
+
+    dropped = history[:2] + history[3:] + _history(2, start=6)
+    _diverged("Middle item removed (same length)", history, dropped)
+
+
+def main():
+    print("=" * 60)
+    print("  SESSION HISTORY TESTS")
+    print("=" * 60)
+    test_incremental()
+    test_diverged()
+    print(f"\n{'=' * 60}")
+    print(f"  RESULTS: {PASS} passed, {FAIL} failed out of {PASS + FAIL}")
+    print(f"{'=' * 60}\n")
+    sys.exit(0 if FAIL == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
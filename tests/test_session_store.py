@@ -0,0 +1,435 @@
+"""
+Session store tests — SessionData serialization and every SessionStore backend.
+Runs in-process (no server): the Redis backend is exercised against a small
+local RESP stand-in, and the SQLite backend is shared by separate worker
+processes, the way uvicorn --workers N would use it.
+"""
+import fnmatch
+import multiprocessing
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from models import ExtractedIntelligence  # noqa: E402
+from session_manager import SessionData  # noqa: E402
+from session_store import (  # noqa: E402
+    InMemorySessionStore, RedisSessionStore, SQLiteSessionStore, create_session_store,
+)
+
+PASS = 0
+FAIL = 0
+
+
+def log(msg, ok=True):
+    global PASS, FAIL
+    tag = "[PASS]" if ok else "[FAIL]"
+    if ok:
+        PASS += 1
+    else:
+        FAIL += 1
+    print(f"  {tag} {msg}")
+
+
+def section(title):
+    print(f"\n{'-'*60}\n  {title}\n{'-'*60}")
+
+
+def _busy_session(session_id: str) -> SessionData:
+    session = SessionData(session_id)
+    session.record_turn()
+    session.scam_detected = True
+    session.scam_type = "BANK_FRAUD"
+    session.intelligence = ExtractedIntelligence(phoneNumbers=["+919876543210"], upiIds=["fraud@okaxis"])
+    session.sync_history([
+        {"sender": "scammer", "text": f"Your account is blocked, pay now {i}", "timestamp": 1760000000000 + i * 20000}
+        for i in range(20)
+    ])
+    session.track_manipulation("urgent! police will arrest you")
+    session.track_escalation("pay immediately or arrest")
+    session.add_reply("Arey, which account sir?")
+    session.fraud_analysis = {"fraudLabel": "fraudulent", "transactionRiskScore": 82}
+    return session
+
+
+def _same_state(a: SessionData, b: SessionData) -> bool:
+    for name, value in vars(a).items():
+        other = getattr(b, name, None)
+        if isinstance(value, datetime):
+            if abs((value - other).total_seconds()) > 1e-3:
+                return False
+        elif value != other:
+            return False
+    return True
+
+
+# ── 1. SERIALIZATION ───────────────────────────────────────────────────
+
+def test_serialization():
+    section("1. SESSIONDATA SERIALIZATION")
+
+    fresh = SessionData("s-fresh")
+    blob = fresh.to_bytes()
+    log(f"New session encodes to {len(blob)} bytes", len(blob) < 160)
+    log("New session round-trips", _same_state(fresh, SessionData.from_bytes(blob)))
+
+    busy = _busy_session("s-busy")
+    blob = busy.to_bytes()
+    restored = SessionData.from_bytes(blob)
+    log(f"Busy session ({len(busy.conversation_history)} history msgs) encodes to {len(blob)} bytes", len(blob) < 1500)
+    log("Busy session round-trips every attribute", _same_state(busy, restored))
+    log("Restored session keeps metrics",
+        restored.get_engagement_metrics() == busy.get_engagement_metrics())
+    log("Restored session keeps behavioral intel",
+        restored.get_behavioral_intelligence() == busy.get_behavioral_intelligence())
+
+    try:
+        SessionData.from_bytes(b"?garbage")
+        log("Unknown format rejected", False)
+    except ValueError:
+        log("Unknown format rejected")
+
+
+# ── 2. BACKEND CONTRACT ────────────────────────────────────────────────
+
+def check_backend(store):
+    busy = _busy_session("contract-busy")
+    store.save(busy)
+    loaded = store.load("contract-busy")
+    log(f"{store.name}: save → load", loaded is not None and _same_state(busy, loaded))
+    log(f"{store.name}: missing id → None", store.load("contract-missing") is None)
+
+    idle = SessionData("contract-idle")
+    idle.last_activity = datetime.now() - timedelta(seconds=600)
+    store.save(idle)
+    log(f"{store.name}: session_ids lists both",
+        {"contract-busy", "contract-idle"} <= set(store.session_ids()))
+    idle_ids = [s.session_id for s in store.idle_sessions(300)]
+    log(f"{store.name}: idle_sessions(300) → only the idle one", idle_ids == ["contract-idle"])
+
+    log(f"{store.name}: deferred claim taken once",
+        store.claim_deferred("contract-busy", 30) and not store.claim_deferred("contract-busy", 30)
+        and store.deferred_claimed("contract-busy") and not store.deferred_claimed("contract-idle"))
+    store.release_deferred("contract-busy")
+    log(f"{store.name}: released claim can be taken again",
+        not store.deferred_claimed("contract-busy") and store.claim_deferred("contract-busy", 30))
+    store.release_deferred("contract-busy")
+    store.push_deferred("contract-busy", b"turn-1")
+    store.push_deferred("contract-busy", b"turn-2")
+    log(f"{store.name}: deferred results popped once, oldest first",
+        store.pop_deferred("contract-busy") == [b"turn-1", b"turn-2"] and store.pop_deferred("contract-busy") == [])
+    store.push_deferred("contract-busy", b"turn-3")
+    log(f"{store.name}: deferred results not listed as sessions",
+        sorted(store.session_ids()) == ["contract-busy", "contract-idle"])
+
+    store.delete("contract-idle")
+    store.delete("contract-busy")
+    log(f"{store.name}: delete", store.load("contract-idle") is None and len(store) == 0)
+    log(f"{store.name}: delete drops queued deferred results", store.pop_deferred("contract-busy") == [])
+
+
+def test_memory_store():
+    section("2. IN-MEMORY STORE")
+    store = InMemorySessionStore()
+    check_backend(store)
+    session = SessionData("same-object")
+    store.save(session)
+    log("memory: load returns the live object", store.load("same-object") is session)
+
+
+def test_sqlite_store(path):
+    section("3. SQLITE (WAL) STORE")
+    store = SQLiteSessionStore(path)
+    check_backend(store)
+    mode = store._conn().execute("PRAGMA journal_mode").fetchone()[0]
+    log(f"sqlite: journal_mode={mode}", mode == "wal")
+    store.claim_deferred("expiring", 0.05)
+    time.sleep(0.1)
+    log("sqlite: expired deferred claim taken over", store.claim_deferred("expiring", 30))
+    store.release_deferred("expiring")
+
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(25):
+                session = SessionData(f"thread-{n}-{i}")
+                store.save(session)
+                store.load(session.session_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log(f"sqlite: 4 threads x 25 writes ({len(errors)} errors)", not errors and len(store) == 100)
+    for sid in store.session_ids():
+        store.delete(sid)
+    store.close()
+
+
+# ── 3. MULTI-PROCESS (uvicorn --workers) ───────────────────────────────
+
+def _worker_turn(args):
+    """Run one /analyze turn in a child process against the shared store."""
+    body, = args
+    import asyncio
+    import logging
+    logging.disable(logging.CRITICAL)
+    from main import _analyze_turn
+    return os.getpid(), asyncio.run(_analyze_turn(body, send_callback=False))
+
+
+def test_multiprocess(path):
+    section("4. TURNS OF ONE SESSION ACROSS WORKER PROCESSES")
+    os.environ["SESSION_STORE"] = "sqlite"
+    os.environ["SESSION_SQLITE_PATH"] = path
+    turns = [
+        "URGENT: your SBI account is blocked. Call +91 9876543210 immediately.",
+        "Pay the verification fee to refund.desk@okaxis right now or police will arrest you.",
+        "Send to account 123456789012, IFSC SBIN0001234, last warning!",
+    ]
+    ctx = multiprocessing.get_context("spawn")
+    pools = [ctx.Pool(1), ctx.Pool(1)]
+    try:
+        # No conversationHistory is sent, so only the shared store can carry state between turns
+        results, pids = [], set()
+        for i, text in enumerate(turns):
+            message = {"sender": "scammer", "text": text, "timestamp": 1760000000000 + i * 40000}
+            body = {"sessionId": "mp-session", "message": message}
+            pid, result = pools[i % 2].apply(_worker_turn, ((body,),))
+            pids.add(pid)
+            results.append(result)
+    finally:
+        for pool in pools:
+            pool.terminate()
+    intel = results[-1]["extractedIntelligence"]
+    log(f"Turns handled by {len(pids)} processes", len(pids) == 2)
+    log("Phone from turn 1 (worker A) survives to turn 3", "+919876543210" in intel["phoneNumbers"])
+    log("UPI from turn 2 (worker B) survives to turn 3", "refund.desk@okaxis" in intel["upiIds"])
+    log("Bank account from turn 3 extracted", "123456789012" in intel["bankAccounts"])
+    log(f"totalMessagesExchanged={results[-1]['totalMessagesExchanged']}", results[-1]["totalMessagesExchanged"] == 6)
+    log("No duplicate replies across workers", len({r["reply"] for r in results}) == len(results))
+
+
+# ── 4. REDIS PROTOCOL (local stand-in) ─────────────────────────────────
+
+class _RESPStandIn(socketserver.ThreadingTCPServer):
+    """Enough of a Redis server for the store: PING AUTH SELECT GET SET DEL SCAN EXISTS RPUSH LPOP EXPIRE."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, password=None):
+        self.data = {}
+        self.expiry = {}
+        self.password = password
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), _RESPHandler)
+
+
+class _RESPHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        server = self.server
+        authed = server.password is None
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            with server.lock:
+                if cmd == b"AUTH":
+                    authed = args[-1].decode() == server.password
+                    reply = b"+OK\r\n" if authed else b"-WRONGPASS invalid password\r\n"
+                elif not authed:
+                    reply = b"-NOAUTH Authentication required.\r\n"
+                elif cmd == b"PING":
+                    reply = b"+PONG\r\n"
+                elif cmd == b"SELECT":
+                    reply = b"+OK\r\n"
+                elif cmd == b"SET":
+                    options = [a.upper() for a in args[3:]]
+                    if b"NX" in options and args[1] in server.data:
+                        reply = self._bulk(None)
+                    else:
+                        server.data[args[1]] = args[2]
+                        if b"EX" in options:
+                            server.expiry[args[1]] = int(args[3 + options.index(b"EX") + 1])
+                        reply = b"+OK\r\n"
+                elif cmd == b"GET":
+                    reply = self._bulk(server.data.get(args[1]))
+                elif cmd == b"EXISTS":
+                    reply = b":%d\r\n" % (args[1] in server.data)
+                elif cmd == b"RPUSH":
+                    server.data.setdefault(args[1], []).append(args[2])
+                    reply = b":%d\r\n" % len(server.data[args[1]])
+                elif cmd == b"LPOP":
+                    items = server.data.get(args[1])
+                    reply = self._bulk(items.pop(0) if items else None)
+                    if items == []:
+                        del server.data[args[1]]
+                elif cmd == b"EXPIRE":
+                    server.expiry[args[1]] = int(args[2])
+                    reply = b":%d\r\n" % (args[1] in server.data)
+                elif cmd == b"DEL":
+                    reply = b":%d\r\n" % (server.data.pop(args[1], None) is not None)
+                elif cmd == b"SCAN":
+                    pattern = args[args.index(b"MATCH") + 1].decode()
+                    keys = [k for k in server.data if fnmatch.fnmatchcase(k.decode(), pattern)]
+                    reply = b"*2\r\n" + self._bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(map(self._bulk, keys))
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+            self.wfile.flush()
+
+
+def test_redis_store():
+    section("5. REDIS-PROTOCOL STORE (local stand-in)")
+    server = _RESPStandIn(password="s3cret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"redis://:s3cret@127.0.0.1:{server.server_address[1]}/2"
+    try:
+        store = RedisSessionStore(url, ttl_seconds=900)
+        check_backend(store)
+
+        store.save(SessionData("ttl-check"))
+        log("redis: keys written with EX ttl", server.expiry.get(b"sentinal:session:ttl-check") == 900)
+
+        # Drop every server-side connection — the client reconnects on the next command
+        store.conn._sock.shutdown(2)
+        log("redis: reconnects after a dropped connection", store.load("ttl-check") is not None)
+        store.delete("ttl-check")
+
+        try:
+            RedisSessionStore(url.replace("s3cret", "wrong"))
+            log("redis: wrong password rejected", False)
+        except Exception:
+            log("redis: wrong password rejected")
+
+        started = time.perf_counter()
+        for i in range(200):
+            store.save(_busy_session(f"bench-{i}"))
+            store.load(f"bench-{i}")
+        per_turn = (time.perf_counter() - started) * 1000 / 200
+        log(f"redis: save+load {per_turn:.2f}ms per turn", per_turn < 20)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    store = create_session_store("redis")  # SESSION_REDIS_URL: nothing listening here
+    log(f"Unreachable shared store falls back to {store.name}", isinstance(store, InMemorySessionStore))
+    log("Fallback flagged for /ready (sessions not shared)", store.fallback_from == "redis")
+    log("Configured memory store is not a fallback", create_session_store("memory").fallback_from is None)
+
+
+# ── 6. DEFERRED SLM RESULT → FINAL CALLBACKS ──────────────────────────
+
+def _queue_last_turn_result(sid: str):
+    """A session whose last turn's background SLM result landed after the turn (nothing merged it)."""
+    from session_manager import session_manager
+
+    session = _busy_session(sid)
+    session._last_rich_notes = "Scam Type: BANK_FRAUD | Intelligence Extracted: 1 phone"
+    session.last_activity = datetime.now() - timedelta(seconds=400)  # past the 5-minute timeout
+    session_manager.save(session)
+    session_manager.push_deferred(sid, {"turn": 3, "result": {
+        "refined_confidence": 0.93, "refined_scam_type": "BANK_FRAUD",
+        "missed_entities": {"emailAddresses": ["refund@sbi-helpdesk.in"]},
+        "insight": "Fake refund desk asking for a verification fee.",
+    }})
+
+
+def _carries_result(payload) -> bool:
+    return (payload is not None
+            and "refund@sbi-helpdesk.in" in payload["extractedIntelligence"]["emailAddresses"]
+            and "Fake refund desk" in payload["agentNotes"])
+
+
+def test_deferred_callbacks():
+    section("6. LAST TURN'S DEFERRED SLM RESULT IN FINAL CALLBACKS")
+    import asyncio
+    from concurrent.futures import Future
+
+    import guvi_callback
+    import main as app
+    from session_manager import session_manager
+
+    sent = []
+
+    def capture(session):
+        sent.append(guvi_callback.build_callback_payload(session))
+        future = Future()
+        future.set_result(True)
+        return future
+
+    _queue_last_turn_result("deferred-timeout")
+    original = guvi_callback.send_callback_async
+    guvi_callback.send_callback_async = capture
+    try:
+        session_manager._cleanup_stale_sessions()
+    finally:
+        guvi_callback.send_callback_async = original
+    payload = next((p for p in sent if p["sessionId"] == "deferred-timeout"), None)
+    log("Timeout callback carries the queued entity and insight", _carries_result(payload))
+    stored = session_manager.get("deferred-timeout")
+    log("Merged result saved along with callback_sent",
+        stored.confidence_level == 0.93 and stored.callback_sent
+        and session_manager.pop_deferred("deferred-timeout") == [])
+    session_manager.remove("deferred-timeout")
+
+    _queue_last_turn_result("deferred-force")
+    sent.clear()
+    original, app.send_callback_async, app.SLM_DEFERRED = app.send_callback_async, capture, True
+    try:
+        asyncio.run(app.force_callback("deferred-force", x_api_key=app.MY_API_KEY))
+    finally:
+        app.send_callback_async, app.SLM_DEFERRED = original, False
+    log("Forced callback carries the queued entity and insight", _carries_result(sent[0] if sent else None))
+    session_manager.remove("deferred-force")
+
+
+def main():
+    print("=" * 60)
+    print("  SESSION STORE TESTS")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_serialization()
+        test_memory_store()
+        test_sqlite_store(os.path.join(tmp, "threads.db"))
+        test_multiprocess(os.path.join(tmp, "workers.db"))
+        test_redis_store()
+        test_deferred_callbacks()
+
+    print(f"\n{'=' * 60}")
+    print(f"  RESULTS: {PASS} passed, {FAIL} failed out of {PASS + FAIL}")
+    print(f"{'=' * 60}\n")
+    sys.exit(0 if FAIL == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -159,6 +159,29 @@ def test_rubric_compliance():
     log(f"agentNotes is string", isinstance(d.get("agentNotes"), str))
 
 
+# ── 6. READINESS ────────────────────────────────────────────────────
+
+def test_readiness():
+    section("6. READINESS (/ready, /ready/slm)")
+    r = requests.get(f"{BASE_URL}/ready", timeout=10)
+    d = r.json()
+    slm = d.get("slm", {})
+    log(f"/ready HTTP {r.status_code} == 200 (rule path serves)", r.status_code == 200 and d.get("rules") is True)
+    log(f"SLM state reported ({slm.get('state')})",
+        slm.get("state") in ("disabled", "not_started", "loading", "ready", "failed"))
+
+    r = requests.get(f"{BASE_URL}/ready/slm", timeout=10)
+    log(f"/ready/slm HTTP {r.status_code} matches SLM ready={slm.get('ready')}",
+        r.status_code == (200 if slm.get("ready") else 503))
+    if slm.get("state") == "ready":
+        phases = slm.get("loadPhases", {})
+        log(f"Load phases timed: {phases}",
+            {"tokenizer", "weights", "device", "pipeline", "warm_generation"} <= set(phases))
+        log(f"Weights memory-mapped reported ({slm.get('weightsMmapped')})", isinstance(slm.get("weightsMmapped"), bool))
+    elif not slm.get("enabled"):
+        log("SLM disabled → state 'disabled'", slm.get("state") == "disabled")
+
+
 # ── MAIN ─────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
@@ -171,6 +194,7 @@ if __name__ == "__main__":
     test_latency()
     test_hinglish()
     test_rubric_compliance()
+    test_readiness()
 
     print(f"\n{'=' * 60}")
     print(f"  RESULTS: {passed} passed, {failed} failed out of {passed + failed}")
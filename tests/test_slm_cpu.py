@@ -0,0 +1,158 @@
+"""
+SLM CPU plan tests — core accounting, per-worker core slices, the autotune
+pick (with a synthetic calibration workload), pinning, and the plan an
+actually loaded engine reports. Runs in-process; the engine section needs the
+model at SLM_MODEL_PATH and is skipped without it.
+"""
+import os
+import sys
+import time
+
+os.environ["USE_SLM"] = "true"
+os.environ["SLM_INFERENCE"] = "local"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import torch  # noqa: E402
+
+import slm_cpu  # noqa: E402
+from slm_cpu import CPUPlan, pin, slm_cores, split_cores, thread_counts, usable_cores  # noqa: E402
+
+PASS = 0
+FAIL = 0
+
+
+def log(msg, ok=True):
+    global PASS, FAIL
+    tag = "[PASS]" if ok else "[FAIL]"
+    if ok:
+        PASS += 1
+    else:
+        FAIL += 1
+    print(f"  {tag} {msg}")
+
+
+def section(title):
+    print(f"\n{'-'*60}\n  {title}\n{'-'*60}")
+
+
+# ── 1. CORES ───────────────────────────────────────────────────────────
+
+def test_cores():
+    section("1. CORE ACCOUNTING")
+    cores = usable_cores()
+    log(f"usable cores {cores} within the affinity mask", bool(cores) and set(cores) <= os.sched_getaffinity(0))
+    log("Reserve leaves the first cores to the API process", slm_cores(list(range(8)), 1) == list(range(1, 8)))
+    log("One core is never reserved away", slm_cores([0], 1) == [0])
+    log("Reserve larger than the host keeps one SLM core", slm_cores([0, 1], 5) == [1])
+
+    slices = split_cores(list(range(1, 8)), 3)
+    log(f"7 cores / 3 workers → {slices}", slices == [[1, 2, 3], [4, 5], [6, 7]])
+    flat = [c for s in slices for c in s]
+    log("Worker slices are disjoint and cover every SLM core", sorted(flat) == list(range(1, 8)) and len(set(flat)) == 7)
+    log("More workers than cores share round-robin, one core each",
+        split_cores([1, 2], 3) == [[1], [2], [1]])
+    log("thread candidates 1, 2, 4 … n", thread_counts(6) == [1, 2, 4, 6] and thread_counts(1) == [1])
+
+
+# ── 2. AUTOTUNE ────────────────────────────────────────────────────────
+
+def _workload(scaling: float):
+    """Synthetic calibration: 40ms of work, sped up by threads ** scaling."""
+    def calibrate():
+        time.sleep(0.04 / torch.get_num_threads() ** scaling)
+    return calibrate
+
+
+def test_autotune():
+    section("2. AUTOTUNE PICK")
+    threads_before = torch.get_num_threads()
+
+    plan = CPUPlan(list(range(4)))  # in-process: never pinned, core ids only counted
+    plan.autotune(_workload(1.0))
+    log(f"Work that scales with threads → {plan.threads} threads", plan.threads == 4 and plan.source == "autotune")
+    log("Each candidate calibrated", [c["threads"] for c in plan.calibration] == [1, 2, 4])
+    log("Chosen thread count applied to torch", torch.get_num_threads() == 4)
+
+    plan = CPUPlan(list(range(4)))
+    plan.autotune(_workload(0.0))
+    log(f"Work that does not scale → {plan.threads} thread (headroom)", plan.threads == 1)
+
+    plan = CPUPlan(list(range(4)))
+    plan.autotune(_workload(0.05))  # 4 threads ~7% faster: within the 10% tolerance
+    log(f"Marginal gain within tolerance → {plan.threads} thread(s)", plan.threads == 1)
+
+    slm_cpu.SLM_THREADS = 3
+    try:
+        plan = CPUPlan(list(range(4)))
+        plan.autotune(_workload(1.0))
+        log("SLM_THREADS fixes the count, no calibration",
+            plan.threads == 3 and plan.source == "fixed" and not plan.calibration)
+    finally:
+        slm_cpu.SLM_THREADS = 0
+
+    d = CPUPlan([0]).to_dict()
+    log(f"Plan exposed as {sorted(d)}",
+        set(d) == {"threads", "interopThreads", "cores", "pinned", "source", "calibration"})
+    torch.set_num_threads(threads_before)
+
+
+# ── 3. PINNING ─────────────────────────────────────────────────────────
+
+def test_pinning():
+    section("3. WORKER PINNING")
+    original = sorted(os.sched_getaffinity(0))
+    own = original[-1:]
+    try:
+        plan = CPUPlan(own, floating=original)  # a worker: its slice, all SLM cores floating
+        plan.prepare()
+        log(f"Worker pinned to its slice {own}", os.sched_getaffinity(0) == set(own) and plan.pinned)
+        log("Floating candidate only offered when it differs from the slice",
+            (plan.floating is not None) == (len(original) > 1))
+        local = CPUPlan(original)
+        log("In-process plan never pins", not local.pinnable and not local.pinned)
+    finally:
+        pin(original)
+    log("Affinity restored", os.sched_getaffinity(0) == set(original))
+
+
+# ── 4. LOADED ENGINE ───────────────────────────────────────────────────
+
+def test_engine():
+    section("4. LOADED ENGINE")
+    if not os.path.isdir(os.getenv("SLM_MODEL_PATH", "./SmolLM2-135M-Instruct")):
+        print("  (skipped: no model at SLM_MODEL_PATH)")
+        return
+    from slm_engine import slm_engine
+
+    slm_engine.warmup()
+    if not slm_engine.ready:
+        log("SLM loaded", False)
+        return
+    cpu = slm_engine.stats()["cpu"]
+    print(f"  plan: {cpu}")
+    log("Plan chosen by autotune", cpu["source"] == "autotune")
+    log(f"{cpu['threads']} thread(s) within the {len(slm_cores(usable_cores()))} SLM core(s)",
+        1 <= cpu["threads"] <= len(slm_cores(usable_cores())))
+    log("torch runs the chosen thread count", torch.get_num_threads() == cpu["threads"])
+    log("One inter-op thread", torch.get_num_interop_threads() == 1)
+    log("Autotune load phase timed", "autotune" in slm_engine.load_phases)
+    log("Plan in /ready/slm", slm_engine.readiness()["cpu"] == cpu)
+
+
+def main():
+    print("=" * 60)
+    print("  SLM CPU PLAN TESTS")
+    print("=" * 60)
+    test_cores()
+    test_autotune()
+    test_pinning()
+    test_engine()
+    print(f"\n{'=' * 60}")
+    print(f"  RESULTS: {PASS} passed, {FAIL} failed out of {PASS + FAIL}")
+    print(f"{'=' * 60}\n")
+    sys.exit(0 if FAIL == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
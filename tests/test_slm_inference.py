@@ -0,0 +1,304 @@
+"""
+SLM inference tests — the engine served by SLM_INFERENCE=http against a small
+local stand-in for an OpenAI-compatible completion server (llama.cpp's
+llama-server streams /v1/completions the same way). Runs in-process (no server,
+no model): end-to-end parsing, keep-alive connection pooling, concurrent rows,
+deadline-sized max_tokens, cancellation by closing the stream, per-backend
+latency stats, and falling back to the rules while the server fails.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+PASS = 0
+FAIL = 0
+
+MODEL_ID = "smollm2-135m-instruct-q8_0"
+COMPLETION = (
+    '{"confidence": 0.91, "scam_type": "BANK_FRAUD", "missed_entities": {"phoneNumbers": [], '
+    '"upiIds": ["refund.desk@ybl"], "bankAccounts": [], "emailAddresses": [], "phishingLinks": []}, '
+    '"reply": "Arey beta, which branch are you calling from? Give me your number, I will call back.", '
+    '"insight": "Urgency and an OTP request in the first message."}'
+)
+PREFILL_SECONDS = 0.02
+TOKEN_SECONDS = 0.004
+POOL_SIZE = 4
+
+
+def log(msg, ok=True):
+    global PASS, FAIL
+    tag = "[PASS]" if ok else "[FAIL]"
+    if ok:
+        PASS += 1
+    else:
+        FAIL += 1
+    print(f"  {tag} {msg}")
+
+
+def section(title):
+    print(f"\n{'-'*60}\n  {title}\n{'-'*60}")
+
+
+# ── OpenAI-compatible completion server stand-in ───────────────────────
+
+class StandIn:
+    """Records what clients sent; streams COMPLETION in 4-character tokens."""
+
+    def __init__(self):
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.aborted = 0
+        self.failing = False
+        self.lock = threading.Lock()
+
+
+state = StandIn()
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, chunked streaming
+
+    def setup(self):
+        super().setup()
+        with state.lock:
+            state.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/v1/models":
+            self._json(200, {"object": "list", "data": [{"id": MODEL_ID, "object": "model"}]})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with state.lock:
+            state.requests.append(body)
+        if self.path != "/v1/completions" or state.failing:
+            self._json(503, {"error": {"message": "loading model"}})
+            return
+        with state.lock:
+            state.in_flight += 1
+            state.peak_in_flight = max(state.peak_in_flight, state.in_flight)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(PREFILL_SECONDS)
+            tokens = [COMPLETION[i:i + 4] for i in range(0, len(COMPLETION), 4)][:body["max_tokens"]]
+            for token in tokens:
+                event = {"object": "text_completion", "model": MODEL_ID,
+                         "choices": [{"index": 0, "text": token, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                time.sleep(TOKEN_SECONDS)
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            with state.lock:
+                state.aborted += 1
+            self.close_connection = True
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+os.environ.update(
+    USE_SLM="true", SLM_INFERENCE="http", SLM_HTTP_URL=f"http://127.0.0.1:{server.server_port}/v1",
+    SLM_HTTP_POOL_SIZE=str(POOL_SIZE), SLM_CACHE_ENABLED="false", SLM_TIMEOUT="10", SLM_MODE="generate",
+)
+os.environ.setdefault("HF_HUB_OFFLINE", "1")  # token estimates if no tokenizer is on disk
+logging.disable(logging.CRITICAL)
+
+from slm_engine import _SLM_PROMPT_PREFIX, slm_engine  # noqa: E402
+from slm_inference import _UNHEALTHY_AFTER, HTTPInference, LocalInference, WorkerInference, create_inference  # noqa: E402
+
+MESSAGES = [
+    "Your SBI account will be blocked today. Share OTP to verify immediately.",
+    "Congratulations! You won Rs 25 lakh in KBC lottery, pay 5000 processing fee to claim.",
+    "This is Mumbai police cyber cell, a parcel in your name has drugs. Pay fine to avoid arrest.",
+    "Your electricity will be disconnected tonight, call 9876543210 to update your bill.",
+]
+
+
+async def _call(i: int, **kwargs) -> dict:
+    return await slm_engine.smart_process(
+        MESSAGES[i % len(MESSAGES)] + f" ({i})", [], "BANK_FRAUD", 2, True, 0.6, {}, "Arey, which account sir?",
+        **kwargs,
+    )
+
+
+def test_startup():
+    section("Startup against the stand-in")
+    slm_engine.warmup()
+    ready = slm_engine.readiness()
+    log(f"engine ready over http ({ready['state']}, backend={ready['backend']})",
+        ready["ready"] and ready["backend"] == "http" and ready["inference"] == "http")
+    inference = slm_engine.inference
+    log(f"model taken from GET /v1/models ({inference.model})", inference.model == MODEL_ID)
+    log(f"batches run {POOL_SIZE} at a time, one per pooled connection", inference.concurrency == POOL_SIZE)
+    log("logit scoring reported unavailable", not slm_engine.scoring_ready)
+    log("connect time recorded as the load phase", "connect" in slm_engine.load_phases)
+
+
+def test_generation():
+    section("Generation end-to-end")
+    before = len(state.requests)
+    result = asyncio.run(_call(0))
+    log("SLM result used", result["slm_used"])
+    log(f"confidence / scam type parsed ({result['refined_confidence']}, {result['refined_scam_type']})",
+        result["refined_confidence"] == 0.91 and result["refined_scam_type"] == "BANK_FRAUD")
+    log("missed entity parsed", result["missed_entities"].get("upiIds") == ["refund.desk@ybl"])
+    log("reply parsed", result["refined_reply"].startswith("Arey beta, which branch"))
+    sent = state.requests[before]
+    log(f"request: model, stream, max_tokens {sent['max_tokens']}",
+        sent.get("model") == MODEL_ID and sent.get("stream") is True and sent["max_tokens"] == 200)
+    log("prompt carries the fixed prefix and the message",
+        sent["prompt"].startswith(_SLM_PROMPT_PREFIX) and MESSAGES[0][:30] in sent["prompt"])
+    log(f"tokens counted from the stream ({slm_engine.generated_tokens})",
+        slm_engine.generated_tokens == (len(COMPLETION) + 3) // 4)
+    estimate = slm_engine.rate.estimate()
+    log(f"token rate measured from the stream ({estimate[1] * 1000 if estimate else 0:.1f}ms/token)",
+        estimate is not None and estimate[1] > 0)
+
+
+def test_pooling():
+    section("Concurrent rows over pooled connections")
+    connections = state.connections
+    state.peak_in_flight = 0
+
+    async def burst():
+        return await asyncio.gather(*(_call(10 + i) for i in range(8)))
+    started = time.perf_counter()
+    results = [r for _ in range(3) for r in asyncio.run(burst())]
+    seconds = time.perf_counter() - started
+    log(f"24 requests served ({sum(r['slm_used'] for r in results)}) in {seconds:.2f}s",
+        all(r["slm_used"] and r["refined_reply"] for r in results))
+    log(f"rows streamed concurrently (peak {state.peak_in_flight} in flight, pool {POOL_SIZE})",
+        1 < state.peak_in_flight <= POOL_SIZE)
+    opened = state.connections - connections
+    log(f"keep-alive connections reused ({opened} opened for 24 requests)", opened <= POOL_SIZE)
+
+
+def test_deadline():
+    section("Deadlines")
+    before = len(state.requests)
+    prefill, step = slm_engine.rate.estimate()
+    budget = prefill + 100 * step
+    started = time.monotonic()
+    result = asyncio.run(_call(40, deadline=started + budget))
+    took = time.monotonic() - started
+    sent = state.requests[before]
+    log(f"max_tokens sized to the deadline ({sent['max_tokens']} for {budget * 1000:.0f}ms)",
+        slm_engine.deadline_rows["shortened"] >= 1 and sent["max_tokens"] < 100)
+    log(f"answered within the deadline ({took * 1000:.0f}ms)", took <= budget + 0.05 and result["slm_used"])
+    before = len(state.requests)
+    result = asyncio.run(_call(41, deadline=time.monotonic() + prefill / 2))
+    log("too little time left: rules only, nothing sent",
+        not result["slm_used"] and len(state.requests) == before)
+
+
+def test_cancellation():
+    section("Cancellation closes the stream")
+    aborted, cancelled = state.aborted, slm_engine.cancelled_generations
+    started = time.perf_counter()
+
+    async def is_disconnected():
+        return time.perf_counter() - started > 0.1
+
+    result = asyncio.run(_call(50, is_disconnected=is_disconnected))
+    log("disconnected caller falls back to the rules", not result["slm_used"])
+    waited = time.perf_counter()
+    while state.aborted == aborted and time.perf_counter() - waited < 2:
+        time.sleep(0.01)
+    log(f"stand-in saw the stream closed mid-generation ({state.aborted - aborted})", state.aborted > aborted)
+    log(f"generation counted as cancelled ({slm_engine.cancelled_generations - cancelled})",
+        slm_engine.cancelled_generations > cancelled)
+
+
+def test_stats_and_failures():
+    section("Latency stats and server failures")
+    stats = slm_engine.stats()["inference"]
+    generate = stats["generate"]
+    log(f"per-backend latency: {generate['calls']} batches, p50 {generate['latencyMs']['p50']}ms, "
+        f"p95 {generate['latencyMs']['p95']}ms", stats["kind"] == "http" and generate["calls"] > 0
+        and 0 < generate["latencyMs"]["p50"] <= generate["latencyMs"]["p95"])
+    log(f"no errors so far ({generate['errors']})", generate["errors"] == 0 and stats["errors"] == 0)
+    log(f"p95 batch seconds for /metrics ({slm_engine.inference.latency['generate'].percentile(0.95):.3f}s)",
+        slm_engine.inference.latency["generate"].percentile(0.95) > 0)
+
+    state.failing = True
+    result = asyncio.run(_call(60))
+    log("failing server: rules only", not result["slm_used"])
+    stats = slm_engine.stats()["inference"]
+    log(f"failure counted (batch errors {stats['generate']['errors']}, requests {stats['errors']})",
+        stats["generate"]["errors"] == 1 and stats["errors"] == 1)
+    log("one failed row keeps the SLM serving", slm_engine.readiness()["ready"])
+    for i in range(_UNHEALTHY_AFTER - 1):
+        asyncio.run(_call(62 + i))
+    log(f"{_UNHEALTHY_AFTER} failed rows in a row: readiness reports the SLM not serving",
+        not slm_engine.readiness()["ready"])
+    state.failing = False
+    result = asyncio.run(_call(61))
+    log("recovers once the server answers again", result["slm_used"] and slm_engine.readiness()["ready"])
+
+
+def test_factory():
+    section("SLM_INFERENCE selection")
+    log("local", isinstance(create_inference(slm_engine, "local"), LocalInference))
+    log("workers", isinstance(create_inference(slm_engine, "workers"), WorkerInference))
+    log("http", isinstance(create_inference(slm_engine, "HTTP"), HTTPInference))
+    log("unknown falls back to local", isinstance(create_inference(slm_engine, "tgi"), LocalInference))
+
+
+def main():
+    print("=" * 60)
+    print("  SLM INFERENCE TESTS (http, local stand-in server)")
+    print("=" * 60)
+    test_startup()
+    if slm_engine.ready:
+        test_generation()
+        test_pooling()
+        test_deadline()
+        test_cancellation()
+        test_stats_and_failures()
+    test_factory()
+    slm_engine.inference and slm_engine.inference.close()
+    server.shutdown()
+
+    print("\n" + "=" * 60)
+    print(f"  RESULTS: {PASS} passed, {FAIL} failed out of {PASS + FAIL}")
+    print("=" * 60)
+    sys.exit(0 if FAIL == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()